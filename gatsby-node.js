@@ -1,3 +1,4 @@
+const fs = require('fs')
 const path = require('path')
 
 exports.createSchemaCustomization = ({ actions }) => {
@@ -39,7 +40,9 @@ exports.createSchemaCustomization = ({ actions }) => {
       average_heartrate: Float
       max_heartrate: Float
       start_date: String
+      average_cadence: Float
       elevation_difference: Float
+      elevation_gain: Float
     }
 
     type MarkdownRemarkFrontmatter {
@@ -63,12 +66,39 @@ exports.createSchemaCustomization = ({ actions }) => {
       segments: [Segment]
       splits: [Split]
       laps: [Lap]
+      sidecar: String
+    }
+
+    type StravaRollups implements Node @dontInfer {
+      version: Int
+      days: JSON
+      weeks: JSON
+      months: JSON
+      years: JSON
     }
   `
 
   createTypes(typeDefs)
 }
 
+// 读取同步脚本生成的汇总数据（content/rollups.json），首页直接使用，无需遍历全部跑步记录
+exports.sourceNodes = ({ actions, createNodeId, createContentDigest }) => {
+  const { createNode } = actions
+  const rollupsPath = path.join(__dirname, 'content', 'rollups.json')
+  const rollups = fs.existsSync(rollupsPath)
+    ? JSON.parse(fs.readFileSync(rollupsPath, 'utf-8'))
+    : { version: 1, days: {}, weeks: {}, months: {}, years: {} }
+
+  createNode({
+    ...rollups,
+    id: createNodeId('strava-rollups'),
+    internal: {
+      type: 'StravaRollups',
+      contentDigest: createContentDigest(rollups)
+    }
+  })
+}
+
 exports.createPages = async ({ graphql, actions }) => {
   const { createPage } = actions
   const result = await graphql(`
@@ -0,0 +1,182 @@
+import os
+import json
+import gzip
+import zlib
+import time
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+from stream_codec import decode_streams, encode_streams
+
+# 各类缓存的文件后缀：流数据使用stream_codec的紧凑二进制格式，其余为gzip压缩的JSON
+SUFFIXES = {'activities': '.json.gz', 'streams': '.strm'}
+LEGACY_SUFFIX = '.json.gz'
+
+
+class ActivityCache:
+    """
+    Strava原始API响应的本地磁盘缓存
+
+    每条缓存以活动ID为键，按类型存放在 <cache_dir>/<kind>/ 中，
+    例如 cache/activities/123.json.gz（活动详情）和 cache/streams/123.strm（流数据）。
+    流数据按通道做差分和varint编码后压缩，体积约为gzip JSON的五分之二，解码也更快；
+    旧版本写入的 streams/<id>.json.gz 仍可读取，重新写入时替换为新格式。
+
+    新鲜度策略:
+        开始时间早于 stable_after_days 天的活动视为已定稿，缓存永不过期；
+        较新的活动仍可能在Strava上被编辑，缓存超过 max_age_hours 小时后视为过期。
+
+    淘汰策略:
+        缓存总大小超过 max_size_mb 时，按最近访问时间从旧到新删除缓存文件。
+    """
+
+    KINDS = ('activities', 'streams')
+
+    def __init__(self, cache_dir, max_age_hours=6, stable_after_days=2, max_size_mb=1024):
+        self.cache_dir = cache_dir
+        self.max_age = max_age_hours * 3600
+        self.stable_after = stable_after_days * 86400
+        self.max_size = max_size_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, kind, activity_id, suffix=None):
+        if kind not in self.KINDS:
+            raise ValueError(f'未知的缓存类型: {kind}')
+        return os.path.join(self.cache_dir, kind, f'{activity_id}{suffix or SUFFIXES[kind]}')
+
+    def _is_fresh(self, entry, now):
+        start_date = entry.get('start_date')
+        if start_date:
+            try:
+                start_time = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+                if start_time.tzinfo is None:
+                    start_time = start_time.replace(tzinfo=timezone.utc)
+                # 足够久之前的活动不会再变化，缓存始终有效
+                if now - start_time.timestamp() > self.stable_after:
+                    return True
+            except ValueError:
+                pass
+        return now - entry.get('fetched_at', 0) < self.max_age
+
+    def _record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _read(self, path):
+        try:
+            if not path.endswith(LEGACY_SUFFIX):
+                with open(path, 'rb') as f:
+                    entry, payload = decode_streams(f.read())
+                return {**entry, 'payload': payload}
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, EOFError, ValueError, zlib.error):
+            # 截断或损坏的缓存文件当作未命中，重新从API获取
+            return None
+
+    def get(self, kind, activity_id, ignore_freshness=False):
+        """读取缓存的原始响应，缓存不存在或已过期时返回None"""
+        path = self._path(kind, activity_id)
+        entry = self._read(path)
+        if entry is None and SUFFIXES[kind] != LEGACY_SUFFIX:
+            path = self._path(kind, activity_id, LEGACY_SUFFIX)
+            entry = self._read(path)
+        if entry is None:
+            self._record(False)
+            return None
+
+        if not ignore_freshness and not self._is_fresh(entry, time.time()):
+            self._record(False)
+            return None
+
+        # 更新访问时间，供淘汰时按最近使用排序
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._record(True)
+        return entry.get('payload')
+
+    def put(self, kind, activity_id, payload, start_date=None):
+        """写入原始响应，使用临时文件加重命名保证写入的原子性"""
+        path = self._path(kind, activity_id)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        entry = {
+            'fetched_at': time.time(),
+            'start_date': start_date,
+            'payload': payload
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw:
+                if kind == 'streams':
+                    raw.write(encode_streams(payload, {'fetched_at': entry['fetched_at'], 'start_date': start_date}))
+                else:
+                    with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+                        f.write(json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        # 删除旧格式的缓存文件，避免占用缓存空间
+        if SUFFIXES[kind] != LEGACY_SUFFIX:
+            try:
+                os.remove(self._path(kind, activity_id, LEGACY_SUFFIX))
+            except OSError:
+                pass
+
+    def get_start_date(self, activity_id):
+        """从缓存的活动详情中读取开始时间（UTC，ISO格式）"""
+        entry = self._read(self._path('activities', activity_id))
+        if entry and entry.get('payload'):
+            return entry['payload'].get('start_date')
+        return None
+
+    def evict(self):
+        """缓存超出大小上限时，删除最久未使用的文件，返回删除的文件数"""
+        entries = []
+        total_size = 0
+        for kind in self.KINDS:
+            directory = os.path.join(self.cache_dir, kind)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+
+        removed = 0
+        if total_size <= self.max_size:
+            return removed
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                total_size -= size
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+def get_default_cache_dir():
+    """默认缓存目录：项目根目录下的cache目录"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    return os.path.join(project_root, 'cache')
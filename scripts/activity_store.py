@@ -0,0 +1,350 @@
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+
+from stream_codec import decode_chart_data, encode_chart_data, is_encoded
+
+STORE_VERSION = 3
+
+# 活动汇总字段：与create_markdown读取的活动属性一一对应
+ACTIVITY_COLUMNS = (
+    'name', 'type', 'start_date', 'start_date_local',
+    'distance', 'moving_time', 'elapsed_time', 'total_elevation_gain',
+    'average_speed', 'max_speed', 'average_heartrate', 'max_heartrate', 'calories'
+)
+
+# 子表的列顺序与process_*函数生成的字典键顺序一致，读回时可还原出相同的JSON
+SPLIT_COLUMNS = (
+    'distance', 'elapsed_time', 'moving_time', 'average_speed', 'pace',
+    'average_heartrate', 'elevation_difference', 'split_number'
+)
+LAP_COLUMNS = (
+    'lap_number', 'name', 'distance', 'elapsed_time', 'moving_time', 'average_speed', 'pace',
+    'average_heartrate', 'max_heartrate', 'average_cadence', 'start_date', 'elevation_difference', 'elevation_gain'
+)
+SEGMENT_COLUMNS = (
+    'name', 'distance', 'elapsed_time', 'moving_time', 'average_heartrate', 'max_heartrate',
+    'average_grade', 'maximum_grade', 'elevation_difference'
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS activities (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    type TEXT,
+    start_date TEXT,
+    start_date_local TEXT,
+    distance REAL,
+    moving_time REAL,
+    elapsed_time REAL,
+    total_elevation_gain REAL,
+    average_speed REAL,
+    max_speed REAL,
+    average_heartrate REAL,
+    max_heartrate REAL,
+    calories REAL,
+    stream_data TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_activities_start_date ON activities (start_date);
+CREATE INDEX IF NOT EXISTS idx_activities_type ON activities (type, start_date);
+
+CREATE TABLE IF NOT EXISTS splits (
+    activity_id INTEGER NOT NULL REFERENCES activities (id) ON DELETE CASCADE,
+    split_number INTEGER NOT NULL,
+    distance REAL,
+    elapsed_time REAL,
+    moving_time REAL,
+    average_speed REAL,
+    pace REAL,
+    average_heartrate REAL,
+    elevation_difference REAL,
+    PRIMARY KEY (activity_id, split_number)
+);
+
+CREATE TABLE IF NOT EXISTS laps (
+    activity_id INTEGER NOT NULL REFERENCES activities (id) ON DELETE CASCADE,
+    lap_number INTEGER NOT NULL,
+    name TEXT,
+    distance REAL,
+    elapsed_time REAL,
+    moving_time REAL,
+    average_speed REAL,
+    pace REAL,
+    average_heartrate REAL,
+    max_heartrate REAL,
+    average_cadence REAL,
+    start_date TEXT,
+    elevation_difference REAL,
+    elevation_gain REAL,
+    PRIMARY KEY (activity_id, lap_number)
+);
+
+CREATE TABLE IF NOT EXISTS segment_efforts (
+    activity_id INTEGER NOT NULL REFERENCES activities (id) ON DELETE CASCADE,
+    effort_index INTEGER NOT NULL,
+    name TEXT,
+    distance REAL,
+    elapsed_time REAL,
+    moving_time REAL,
+    average_heartrate REAL,
+    max_heartrate REAL,
+    average_grade REAL,
+    maximum_grade REAL,
+    elevation_difference REAL,
+    PRIMARY KEY (activity_id, effort_index)
+);
+"""
+
+
+def get_default_store_path():
+    """默认数据库路径：项目根目录下的cache/activities.db"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    return os.path.join(project_root, 'cache', 'activities.db')
+
+
+def _seconds(value):
+    if value is None:
+        return None
+    if hasattr(value, 'total_seconds'):
+        return value.total_seconds()
+    return float(value)
+
+
+def _number(value):
+    return None if value is None else float(value)
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _load_stream_data(value):
+    """图表数据按stream_codec的二进制格式保存，版本1的数据库中为JSON文本"""
+    if not value:
+        return None
+    if is_encoded(value):
+        return decode_chart_data(value)
+    return json.loads(value)
+
+
+def snapshot_activity(activity):
+    """
+    把活动对象的汇总字段复制为普通Python对象，可以在进程之间传递
+
+    数值字段转换为float，时间字段保持datetime和timedelta，
+    与load_activity读回的对象具有相同的属性。
+    """
+    fields = {'id': activity.id}
+    for column in ACTIVITY_COLUMNS:
+        value = getattr(activity, column, None)
+        if column in ('moving_time', 'elapsed_time'):
+            if value is not None and not hasattr(value, 'total_seconds'):
+                value = timedelta(seconds=float(value))
+        elif column not in ('name', 'type', 'start_date', 'start_date_local'):
+            value = _number(value)
+        elif column == 'type' and value is not None:
+            value = str(value)
+        fields[column] = value
+    return SimpleNamespace(**fields)
+
+
+class ActivityStore:
+    """
+    本地SQLite活动数据库
+
+    保存每个已处理活动的汇总字段、公里分割、分圈、分段和图表数据，
+    按ID、开始时间和活动类型建立索引。markdown文件由数据库中的记录生成。
+
+    使用WAL模式，写入在同一个事务中累积，每batch_size个活动提交一次，
+    结束时调用close()提交剩余的写入。多个线程共用同一个连接，由锁保证串行访问。
+    """
+
+    def __init__(self, path, batch_size=50):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA foreign_keys=ON')
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.execute(f'PRAGMA user_version={STORE_VERSION}')
+        self._conn.commit()
+
+    def _migrate(self):
+        """为旧版本的数据库补上新增的列：版本3的分圈表增加了elevation_gain"""
+        lap_columns = {row[1] for row in self._conn.execute('PRAGMA table_info(laps)')}
+        if 'elevation_gain' not in lap_columns:
+            self._conn.execute('ALTER TABLE laps ADD COLUMN elevation_gain REAL')
+
+    def upsert_activity(self, activity, segments=None, splits=None, laps=None, stream_data=None):
+        """写入或更新一个活动及其子表数据，达到批量大小时提交事务"""
+        row = {
+            'name': getattr(activity, 'name', None),
+            'type': str(getattr(activity, 'type', '') or '') or None,
+            'start_date': _isoformat(getattr(activity, 'start_date', None)),
+            'start_date_local': _isoformat(getattr(activity, 'start_date_local', None)),
+            'distance': _number(getattr(activity, 'distance', None)),
+            'moving_time': _seconds(getattr(activity, 'moving_time', None)),
+            'elapsed_time': _seconds(getattr(activity, 'elapsed_time', None)),
+            'total_elevation_gain': _number(getattr(activity, 'total_elevation_gain', None)),
+            'average_speed': _number(getattr(activity, 'average_speed', None)),
+            'max_speed': _number(getattr(activity, 'max_speed', None)),
+            'average_heartrate': _number(getattr(activity, 'average_heartrate', None)),
+            'max_heartrate': _number(getattr(activity, 'max_heartrate', None)),
+            'calories': _number(getattr(activity, 'calories', None)),
+        }
+        columns = ', '.join(('id',) + ACTIVITY_COLUMNS + ('stream_data', 'updated_at'))
+        placeholders = ', '.join('?' * (len(ACTIVITY_COLUMNS) + 3))
+        updates = ', '.join(f'{column} = excluded.{column}' for column in ACTIVITY_COLUMNS + ('stream_data', 'updated_at'))
+        values = (
+            [activity.id]
+            + [row[column] for column in ACTIVITY_COLUMNS]
+            + [encode_chart_data(stream_data) if stream_data else None, time.time()]
+        )
+
+        with self._lock:
+            self._conn.execute(
+                f'INSERT INTO activities ({columns}) VALUES ({placeholders}) '
+                f'ON CONFLICT (id) DO UPDATE SET {updates}',
+                values
+            )
+            self._replace_children('splits', SPLIT_COLUMNS, activity.id, splits)
+            self._replace_children('laps', LAP_COLUMNS, activity.id, laps)
+            self._replace_children(
+                'segment_efforts', ('effort_index',) + SEGMENT_COLUMNS, activity.id,
+                [{'effort_index': i, **segment} for i, segment in enumerate(segments or [])]
+            )
+            self._pending += 1
+            if self._pending >= self.batch_size:
+                self._commit()
+
+    def _replace_children(self, table, columns, activity_id, items):
+        self._conn.execute(f'DELETE FROM {table} WHERE activity_id = ?', (activity_id,))
+        if not items:
+            return
+        self._conn.executemany(
+            f'INSERT INTO {table} (activity_id, {", ".join(columns)}) VALUES (?, {", ".join("?" * len(columns))})',
+            [[activity_id] + [item.get(column) for column in columns] for item in items]
+        )
+
+    def _load_children(self, table, columns, activity_id, order_by):
+        cursor = self._conn.execute(
+            f'SELECT {", ".join(columns)} FROM {table} WHERE activity_id = ? ORDER BY {order_by}',
+            (activity_id,)
+        )
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def load_activity(self, activity_id):
+        """
+        读取一个活动的完整记录，不存在时返回None
+
+        返回的对象包含activity（属性与stravalib活动对象相同的汇总字段）、
+        segments、splits、laps和stream_data，可直接交给create_markdown。
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT id, {", ".join(ACTIVITY_COLUMNS)}, stream_data FROM activities WHERE id = ?',
+                (activity_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            fields = dict(zip(('id',) + ACTIVITY_COLUMNS + ('stream_data',), row))
+            splits = self._load_children('splits', SPLIT_COLUMNS, activity_id, 'split_number')
+            laps = self._load_children('laps', LAP_COLUMNS, activity_id, 'lap_number')
+            segments = self._load_children('segment_efforts', SEGMENT_COLUMNS, activity_id, 'effort_index')
+
+        for column in ('start_date', 'start_date_local'):
+            if fields[column]:
+                fields[column] = datetime.fromisoformat(fields[column])
+        for column in ('moving_time', 'elapsed_time'):
+            if fields[column] is not None:
+                fields[column] = timedelta(seconds=fields[column])
+        stream_data = fields.pop('stream_data')
+
+        return SimpleNamespace(
+            activity=SimpleNamespace(**fields),
+            segments=segments or None,
+            splits=splits or None,
+            laps=laps or None,
+            stream_data=_load_stream_data(stream_data)
+        )
+
+    def activity_ids(self, activity_type=None):
+        """返回数据库中已有的活动ID集合"""
+        with self._lock:
+            if activity_type:
+                cursor = self._conn.execute('SELECT id FROM activities WHERE type = ?', (activity_type,))
+            else:
+                cursor = self._conn.execute('SELECT id FROM activities')
+            return {row[0] for row in cursor}
+
+    def totals(self, after=None, before=None, activity_type='Run'):
+        """统计开始时间在 [after, before) 范围内的活动次数、距离（米）、时长（秒）和爬升（米）"""
+        conditions = ['type = ?']
+        params = [activity_type]
+        if after is not None:
+            conditions.append('start_date >= ?')
+            params.append(after.isoformat())
+        if before is not None:
+            conditions.append('start_date < ?')
+            params.append(before.isoformat())
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(distance), 0), COALESCE(SUM(moving_time), 0), '
+                'COALESCE(SUM(total_elevation_gain), 0) FROM activities WHERE ' + ' AND '.join(conditions),
+                params
+            ).fetchone()
+        return dict(zip(('runs', 'distance', 'duration', 'elevation'), row))
+
+    def _commit(self):
+        self._conn.commit()
+        self._pending = 0
+
+    def flush(self):
+        """提交尚未提交的写入"""
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        """提交剩余的写入并关闭数据库连接"""
+        with self._lock:
+            self._commit()
+            self._conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='查询本地活动数据库中的跑步统计')
+    parser.add_argument('--db-path', default=get_default_store_path(), help='活动数据库路径')
+    parser.add_argument('--after', help='开始日期（UTC，YYYY-MM-DD），包含当天')
+    parser.add_argument('--before', help='结束日期（UTC，YYYY-MM-DD），不包含当天')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db_path):
+        parser.error(f'活动数据库不存在：{args.db_path}')
+
+    after = datetime.fromisoformat(args.after) if args.after else None
+    before = datetime.fromisoformat(args.before) if args.before else None
+    store = ActivityStore(args.db_path)
+    try:
+        totals = store.totals(after, before)
+    finally:
+        store.close()
+    print(f"跑步 {totals['runs']} 次，总距离 {totals['distance'] / 1000:.1f} 公里，"
+          f"总时长 {totals['duration'] / 3600:.1f} 小时，总爬升 {totals['elevation']:.0f} 米")
+
+
+if __name__ == '__main__':
+    main()
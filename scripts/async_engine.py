@@ -0,0 +1,308 @@
+import json
+import asyncio
+
+try:
+    import aiohttp
+except ImportError:  # 可选依赖，仅在使用 --engine async 时需要
+    aiohttp = None
+
+from stravalib import model
+
+from fetch_strava_data import (
+    STREAM_TYPES,
+    governor,
+    metrics,
+    sessions,
+    load_activity_detail,
+    load_activity_streams,
+    needs_activity_detail,
+    render_activity,
+    to_epoch,
+    write_run_file,
+    write_stats,
+    print_sync_summary,
+)
+from rate_limit import STRAVA_BASE_URL
+from stream_sidecar import get_static_dir
+from logging_setup import get_logger
+
+logger = get_logger('async')
+
+# API接口相对于服务地址的路径
+API_PATH = '/api/v3'
+
+# 活动列表每页的最大条数
+PAGE_SIZE = 200
+
+
+class AsyncStravaFetcher:
+    """
+    基于asyncio的Strava数据获取引擎
+
+    直接调用活动列表、活动详情和流数据接口，使用连接池复用HTTP连接，
+    列表翻页与详情、流数据的获取流水线并行，同时保持最多concurrency个请求在途。
+    生成的活动对象与stravalib Client返回的相同，可直接交给现有的处理函数。
+    """
+
+    def __init__(self, credentials, concurrency=32, max_retries=5, cache=None, base_url=None):
+        if aiohttp is None:
+            raise RuntimeError('使用异步引擎需要先安装aiohttp: pip install aiohttp')
+        self.credentials = credentials
+        self.api_base_url = (base_url or STRAVA_BASE_URL).rstrip('/') + API_PATH
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.cache = cache
+        self.session = None
+        self.connections = 0
+        self.reused = 0
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        # 统计新建和复用的连接，与同步客户端的连接池统计一起输出
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_create_end.append(self._on_connection_created)
+        trace.on_connection_reuseconn.append(self._on_connection_reused)
+        connect_timeout, read_timeout = sessions.timeout
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout),
+            trace_configs=[trace],
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+        sessions.record_connections(self.connections, self.connections + self.reused)
+
+    async def _on_connection_created(self, session, context, params):
+        self.connections += 1
+
+    async def _on_connection_reused(self, session, context, params):
+        self.reused += 1
+
+    async def _access_token(self):
+        """返回有效的access_token；需要刷新时在线程池中进行，不阻塞事件循环"""
+        access_token = self.credentials.cached_token()
+        if access_token is None:
+            access_token = await asyncio.get_running_loop().run_in_executor(None, self.credentials.access_token)
+        return access_token
+
+    async def _send(self, url, params=None):
+        """经过共享限流器发送一次GET请求，返回 (使用的access_token, 状态码, 响应头, 响应内容)"""
+        while True:
+            delay = governor.try_acquire()
+            if not delay:
+                break
+            logger.warning('已接近Strava API限额，等待%d秒后继续...', delay)
+            governor.record_wait(delay)
+            await asyncio.sleep(delay)
+
+        access_token = await self._access_token()
+        async with self.session.get(url, params=params,
+                                    headers={'Authorization': f'Bearer {access_token}'}) as response:
+            governor.update(response.headers)
+            body = await response.read()
+            metrics.record_request(url, response.status, len(body))
+            return access_token, response.status, response.headers, body
+
+    async def _get_json(self, path, params=None):
+        """
+        发送GET请求，处理429和5xx重试；access_token被拒绝时刷新后立即重发一次，不占用重试次数
+        """
+        url = f'{self.api_base_url}{path}'
+        reauthorized = False
+        for attempt in range(self.max_retries + 1):
+            try:
+                access_token, status, headers, body = await self._send(url, params)
+                if status == 401 and not reauthorized:
+                    logger.warning('access_token已失效，刷新后重试...')
+                    self.credentials.invalidate(access_token)
+                    reauthorized = True
+                    access_token, status, headers, body = await self._send(url, params)
+                if status == 200:
+                    return json.loads(body)
+                if status == 429:
+                    delay = governor.rate_limited_delay(headers, attempt)
+                elif status >= 500:
+                    delay = governor.backoff_delay(attempt)
+                else:
+                    text = body.decode('utf-8', errors='replace')
+                    raise RuntimeError(f'请求 {path} 失败，HTTP状态码：{status}，响应内容：{text}')
+                message = f'HTTP {status}'
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                delay = governor.backoff_delay(attempt)
+                message = str(e) or type(e).__name__
+
+            if attempt < self.max_retries:
+                logger.warning('请求 %s 失败（%s，第%d次），退避后重试...', path, message, attempt + 1)
+                governor.record_wait(delay)
+                await asyncio.sleep(delay)
+        raise RuntimeError(f'请求 {path} 失败，重试次数已用完：{message}')
+
+    async def iter_activities(self, after=None, before=None, journal=None):
+        """按页异步遍历活动列表；传入进度日志时先重放已获取的页，再从下一页继续"""
+        params = {'per_page': PAGE_SIZE}
+        if after is not None:
+            params['after'] = to_epoch(after)
+        if before is not None:
+            params['before'] = to_epoch(before)
+
+        page = 1
+        if journal is not None:
+            for _, raw_activities in journal.replay_pages():
+                for raw in raw_activities:
+                    yield model.Activity.parse_obj(raw)
+            if journal.listed:
+                return
+            page = journal.next_page()
+
+        while True:
+            with metrics.stage('list_activities'):
+                raw_activities = await self._get_json('/athlete/activities', {**params, 'page': page})
+            if journal is not None:
+                journal.record_page(page, raw_activities)
+            for raw in raw_activities:
+                yield model.Activity.parse_obj(raw)
+            if len(raw_activities) < PAGE_SIZE:
+                break
+            page += 1
+        if journal is not None:
+            journal.record_listed()
+
+    async def get_activity_detail(self, activity_id, prefer_cache=False, refresh=False):
+        with metrics.stage('fetch_detail'):
+            return await self._get_activity_detail(activity_id, prefer_cache, refresh)
+
+    async def _get_activity_detail(self, activity_id, prefer_cache=False, refresh=False):
+        if self.cache and not refresh:
+            raw = self.cache.get('activities', activity_id, ignore_freshness=prefer_cache)
+            if raw is not None:
+                return load_activity_detail(None, raw)
+        raw = await self._get_json(f'/activities/{activity_id}', {'include_all_efforts': 'true'})
+        if self.cache:
+            self.cache.put('activities', activity_id, raw, start_date=raw.get('start_date'))
+        return load_activity_detail(None, raw)
+
+    async def get_activity_streams(self, activity_id, prefer_cache=False, refresh=False):
+        with metrics.stage('fetch_streams'):
+            return await self._get_activity_streams(activity_id, prefer_cache, refresh)
+
+    async def _get_activity_streams(self, activity_id, prefer_cache=False, refresh=False):
+        if self.cache and not refresh:
+            raw = self.cache.get('streams', activity_id, ignore_freshness=prefer_cache)
+            if raw is not None:
+                return load_activity_streams(raw)
+        raw = await self._get_json(
+            f'/activities/{activity_id}/streams',
+            {'keys': ','.join(STREAM_TYPES), 'key_by_type': 'true'}
+        )
+        if self.cache:
+            self.cache.put('streams', activity_id, raw, start_date=self.cache.get_start_date(activity_id))
+        return load_activity_streams(raw)
+
+
+def _render_and_write(activity, activity_detail, streams, runs_dir, args, manifest, store):
+    content, sidecar = render_activity(activity, activity_detail, streams, args, store)
+    return write_run_file(runs_dir, activity, content, manifest, sidecar)
+
+
+async def _process_activity(fetcher, activity, runs_dir, args, manifest=None, store=None, journal=None):
+    """并发获取单个活动的详情和流数据，生成并保存markdown文件"""
+    # 中断前已获取过详情和流数据的活动直接使用缓存
+    enriched = journal is not None and journal.was_enriched(activity.id)
+    # 在Strava上被编辑过的活动，缓存中的详情和流数据已经过时
+    refresh = not enriched and manifest is not None and manifest.is_changed(activity)
+    if refresh:
+        logger.info('活动 %s 的汇总数据已变化，重新获取详情和流数据', activity.id)
+    detail_task = None
+    streams_task = None
+    if needs_activity_detail(args):
+        detail_task = asyncio.ensure_future(fetcher.get_activity_detail(activity.id, enriched, refresh))
+    if not args.no_streams:
+        streams_task = asyncio.ensure_future(fetcher.get_activity_streams(activity.id, enriched, refresh))
+
+    activity_detail = None
+    streams = None
+    if detail_task:
+        try:
+            activity_detail = await detail_task
+        except Exception as e:
+            logger.warning('获取活动 %s 详情失败: %s', activity.id, e)
+    if streams_task:
+        try:
+            streams = await streams_task
+        except Exception as e:
+            logger.warning('获取活动 %s 流数据失败: %s', activity.id, e)
+
+    if journal is not None and fetcher.cache and not enriched:
+        journal.record_enriched(activity.id)
+
+    # 流数据处理、编码和文件、SQLite写入都是同步操作，放到线程池中执行，不阻塞其他活动的请求
+    file_name = await asyncio.get_running_loop().run_in_executor(
+        None, _render_and_write, activity, activity_detail, streams, runs_dir, args, manifest, store
+    )
+    if journal is not None:
+        journal.record_written(activity.id)
+    return file_name
+
+
+async def sync_activities_async(credentials, runs_dir, args, cache=None, manifest=None, store=None, after=None, before=None,
+                                journal=None):
+    """
+    使用异步引擎同步活动数据
+
+    一个协程负责翻页获取活动列表，并把跑步活动放入有界队列；
+    concurrency个工作协程从队列中取出活动，获取详情和流数据后立即写入文件。
+    汇总指纹没有变化的已同步活动不放入队列。
+    """
+    failures = []
+    queue = asyncio.Queue(maxsize=args.concurrency * 2)
+    fingerprints = None if args.ignore_fingerprints else manifest
+    static_dir = get_static_dir(runs_dir)
+
+    async with AsyncStravaFetcher(credentials, concurrency=args.concurrency, cache=cache,
+                                  base_url=args.base_url) as fetcher:
+        async def producer():
+            count = 0
+            unchanged = 0
+            try:
+                async for activity in fetcher.iter_activities(after=after, before=before, journal=journal):
+                    if activity.type != 'Run':
+                        continue
+                    if journal is not None and journal.was_written(activity.id):
+                        continue
+                    if fingerprints is not None and fingerprints.is_unchanged(activity, runs_dir, static_dir):
+                        unchanged += 1
+                        write_stats.add('unchanged')
+                        continue
+                    count += 1
+                    await queue.put(activity)
+            finally:
+                logger.info('已获取%d条跑步记录', count)
+                if unchanged:
+                    logger.info('汇总数据未变化，跳过 %d 条已同步的跑步记录', unchanged)
+                for _ in range(args.concurrency):
+                    await queue.put(None)
+
+        async def worker():
+            while True:
+                activity = await queue.get()
+                if activity is None:
+                    return
+                try:
+                    await _process_activity(fetcher, activity, runs_dir, args, manifest, store, journal)
+                except Exception as e:
+                    logger.error('保存活动 %s 失败: %s', activity.id, e)
+                    failures.append((activity.id, str(e)))
+                    write_stats.add('skipped')
+                    if manifest is not None:
+                        manifest.record_failure(activity)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(args.concurrency)]
+        try:
+            await producer()
+        finally:
+            await asyncio.gather(*workers)
+
+    print_sync_summary(failures, cache)
+    return failures
@@ -0,0 +1,239 @@
+import os
+import sys
+import json
+import math
+import timeit
+import argparse
+import platform
+import tracemalloc
+from types import SimpleNamespace
+
+from fetch_strava_data import (
+    create_markdown,
+    load_activity_detail,
+    load_activity_streams,
+    load_activity_summary,
+    process_segment_efforts,
+    process_splits,
+)
+from process_laps_with_streams import process_laps, process_laps_with_streams
+from stream_processing import DEFAULT_MAX_POINTS, process_stream_data, process_stream_data_lttb
+from synthetic_activities import PROFILES, generate_activity
+
+BASELINE_VERSION = 1
+
+# 耗时或内存峰值超过基线的这个倍数时视为性能退化
+DEFAULT_THRESHOLD = 1.3
+
+# 分圈数扩展曲线：同一场马拉松分别按整场、5公里、1公里和400米跑道切分分圈
+LAP_PROFILE = 'marathon'
+LAP_DISTANCES = (42200, 5000, 1000, 400)
+
+# 按采样点数测试的处理函数，参数为合成活动，与同步脚本中的调用方式一致
+SAMPLE_BENCHMARKS = {
+    'process_stream_data': lambda f: process_stream_data(f.streams),
+    'process_stream_data_lttb': lambda f: process_stream_data_lttb(f.streams, DEFAULT_MAX_POINTS),
+    'process_splits': lambda f: process_splits(f.detail),
+    'process_segment_efforts': lambda f: process_segment_efforts(f.detail.segment_efforts),
+    'process_laps': lambda f: process_laps(f.detail),
+    'process_laps_with_streams': lambda f: process_laps_with_streams(f.detail, f.streams),
+    'create_markdown': lambda f: create_markdown(f.activity, f.segments, f.stream_data, f.splits, f.laps),
+}
+
+# 按分圈数测试的处理函数
+LAP_BENCHMARKS = ('process_laps', 'process_laps_with_streams', 'create_markdown')
+
+
+def get_default_baseline_path():
+    """默认基线文件：项目根目录下的cache/benchmark_baseline.json，基线与机器相关，不提交到仓库"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    return os.path.join(project_root, 'cache', 'benchmark_baseline.json')
+
+
+def build_fixture(distance_km, lap_distance=1000, seed=0):
+    """生成一条合成活动，并按同步脚本的方式解析为stravalib对象和处理结果"""
+    raw_detail, raw_streams = generate_activity(1, distance_km, seed=seed, lap_distance=lap_distance)
+    detail = load_activity_detail(None, raw_detail)
+    streams = load_activity_streams(raw_streams)
+    return SimpleNamespace(
+        samples=len(raw_streams['time']['data']),
+        laps_count=len(raw_detail['laps']),
+        activity=load_activity_summary(raw_detail),
+        detail=detail,
+        streams=streams,
+        segments=process_segment_efforts(detail.segment_efforts),
+        splits=process_splits(detail),
+        laps=process_laps_with_streams(detail, streams),
+        stream_data=process_stream_data_lttb(streams, DEFAULT_MAX_POINTS),
+    )
+
+
+def measure(func, repeat):
+    """返回单次调用的最短耗时（秒）和内存分配峰值（字节）"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    seconds = min(timer.repeat(repeat=repeat, number=number)) / number
+
+    # 内存峰值单独测一次，避免tracemalloc的开销影响计时
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def collect_cases(profiles, name_filter=None):
+    """生成全部测试用例：(用例名, 函数名, 分组, 合成活动参数)"""
+    cases = []
+    for profile in profiles:
+        for name in SAMPLE_BENCHMARKS:
+            cases.append((f'{name}[{profile}]', name, 'samples', (PROFILES[profile], 1000)))
+    for lap_distance in LAP_DISTANCES:
+        for name in LAP_BENCHMARKS:
+            cases.append((f'{name}[{LAP_PROFILE}/{lap_distance}m]', name, 'laps',
+                          (PROFILES[LAP_PROFILE], lap_distance)))
+    if name_filter:
+        cases = [case for case in cases if name_filter in case[0]]
+    return cases
+
+
+def run_benchmarks(cases, repeat, seed=0):
+    results = {}
+    fixtures = {}
+    for key, name, group, fixture_args in cases:
+        if fixture_args not in fixtures:
+            fixtures[fixture_args] = build_fixture(*fixture_args, seed=seed)
+        fixture = fixtures[fixture_args]
+        seconds, peak = measure(lambda: SAMPLE_BENCHMARKS[name](fixture), repeat)
+        results[key] = {
+            'function': name,
+            'group': group,
+            'samples': fixture.samples,
+            'laps': fixture.laps_count,
+            'seconds': seconds,
+            'peak_bytes': peak,
+        }
+        print(f'{key:<55} {seconds * 1000:>10.3f} ms {peak / 1024:>10.1f} KiB')
+    return results
+
+
+def print_scaling(results):
+    """
+    按函数打印耗时随采样点数和分圈数的变化曲线
+
+    指数由最小和最大输入估算：1表示线性增长，明显大于1说明存在超线性的算法。
+    """
+    for group, size_key in (('samples', 'samples'), ('laps', 'laps')):
+        by_function = {}
+        for result in results.values():
+            if result['group'] == group:
+                by_function.setdefault(result['function'], []).append(result)
+        if not by_function:
+            continue
+        print(f'\n按{"采样点数" if group == "samples" else "分圈数"}的扩展曲线:')
+        for name, rows in by_function.items():
+            rows.sort(key=lambda row: row[size_key])
+            curve = '  '.join(f'{row[size_key]}:{row["seconds"] * 1000:.2f}ms' for row in rows)
+            first, last = rows[0], rows[-1]
+            exponent = ''
+            if last[size_key] > first[size_key] and first['seconds'] > 0:
+                value = math.log(last['seconds'] / first['seconds']) / math.log(last[size_key] / first[size_key])
+                exponent = f'  (指数 {value:.2f})'
+            print(f'- {name}: {curve}{exponent}')
+
+
+def environment():
+    import numpy
+    return {
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+    }
+
+
+def load_baseline(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get('version') != BASELINE_VERSION:
+        return None
+    return data
+
+
+def save_baseline(path, results):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    data = {'version': BASELINE_VERSION, 'environment': environment(), 'results': results}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare_baseline(baseline, results, threshold):
+    """与基线逐项比较耗时和内存峰值，返回退化的用例列表"""
+    if baseline['environment'] != environment():
+        print(f'\n警告: 基线在不同的环境中生成 ({baseline["environment"]})，耗时对比可能不准确')
+
+    regressions = []
+    print(f'\n与基线对比（阈值 {threshold:.2f} 倍）:')
+    for key, result in results.items():
+        previous = baseline['results'].get(key)
+        if not previous:
+            print(f'- {key}: 基线中没有该用例')
+            continue
+        time_ratio = result['seconds'] / previous['seconds'] if previous['seconds'] else 1
+        memory_ratio = result['peak_bytes'] / previous['peak_bytes'] if previous['peak_bytes'] else 1
+        regressed = time_ratio > threshold or memory_ratio > threshold
+        if regressed:
+            regressions.append(key)
+        print(f'- {key}: 耗时 {time_ratio:.2f}x，内存 {memory_ratio:.2f}x{"  <-- 退化" if regressed else ""}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='在合成的跑步活动上测试数据处理函数的耗时和内存峰值')
+    parser.add_argument('--profiles', nargs='+', choices=list(PROFILES), default=list(PROFILES),
+                        help='测试的活动距离，默认从5公里到100英里全部测试')
+    parser.add_argument('--filter', help='只运行名称包含该字符串的用例')
+    parser.add_argument('--repeat', type=int, default=3, help='每个用例重复计时的轮数，取最短耗时')
+    parser.add_argument('--seed', type=int, default=0, help='合成数据的随机种子，与基线对比时需保持一致')
+    parser.add_argument('--baseline', default=get_default_baseline_path(), help='基线文件路径')
+    parser.add_argument('--save-baseline', action='store_true', help='将本次结果保存为新的基线')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'超过基线多少倍视为退化，默认 {DEFAULT_THRESHOLD}')
+    args = parser.parse_args()
+
+    cases = collect_cases(args.profiles, args.filter)
+    if not cases:
+        print('没有匹配的测试用例')
+        sys.exit(1)
+
+    print(f'{"用例":<55} {"耗时":>13} {"内存峰值":>14}')
+    results = run_benchmarks(cases, args.repeat, args.seed)
+    print_scaling(results)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f'\n基线已保存到 {args.baseline}')
+        return
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f'\n没有找到基线文件 {args.baseline}，可使用 --save-baseline 生成')
+        return
+    regressions = compare_baseline(baseline, results, args.threshold)
+    if regressions:
+        print(f'\n共有 {len(regressions)} 个用例性能退化')
+        sys.exit(1)
+    print('\n没有发现性能退化')
+
+
+if __name__ == '__main__':
+    main()
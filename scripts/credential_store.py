@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+
+from logging_setup import get_logger
+
+logger = get_logger('credentials')
+
+CREDENTIALS_VERSION = 1
+
+# access_token在过期前这么多秒就提前刷新，避免请求发出时恰好过期
+REFRESH_MARGIN = 600
+
+
+def get_default_credentials_path():
+    """
+    默认凭据文件：项目根目录下的.credentials/strava.json
+
+    不放在cache目录中：CI会把cache目录上传到GitHub Actions缓存，其中的令牌可能被其他工作流读取。
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    return os.path.join(project_root, '.credentials', 'strava.json')
+
+
+def _fingerprint(refresh_token):
+    return hashlib.sha256(refresh_token.encode('utf-8')).hexdigest()[:16]
+
+
+class CredentialStore:
+    """
+    缓存access_token并自动轮换refresh_token的凭据存储
+
+    access_token连同过期时间保存在本地文件中，过期前直接复用，不必每次运行都请求/oauth/token；
+    刷新时Strava返回的新refresh_token同样写回文件，下次运行使用最新的refresh_token。
+    文件中记录最初传入的refresh_token的指纹，命令行传入的refresh_token变化（重新授权）时
+    丢弃缓存的凭据。client_secret不写入文件。
+
+    所有线程共享同一个实例：多个线程同时发现令牌过期时只有一个线程发起刷新，
+    其他线程等待并使用刷新后的令牌。path为None时只在内存中缓存。
+    """
+
+    def __init__(self, client_id, client_secret, refresh_token, refresh, path=None, margin=REFRESH_MARGIN):
+        self.client_id = str(client_id)
+        self.client_secret = client_secret
+        self.path = path
+        self.margin = margin
+        # refresh(client_id, client_secret, refresh_token) 返回/oauth/token的响应数据
+        self._refresh = refresh
+        self._seed = _fingerprint(refresh_token)
+        self.refresh_token = refresh_token
+        self._access_token = None
+        self._expires_at = 0
+        self.refreshes = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') != CREDENTIALS_VERSION or data.get('client_id') != self.client_id:
+            return
+        # 命令行传入的refresh_token既不是最初的也不是最新的，说明重新授权过，缓存作废
+        if data.get('seed') != self._seed and data.get('refresh_token') != self.refresh_token:
+            logger.info('refresh_token已变化，不使用缓存的凭据')
+            return
+        self.refresh_token = data.get('refresh_token') or self.refresh_token
+        self._access_token = data.get('access_token')
+        self._expires_at = data.get('expires_at') or 0
+
+    def _save(self):
+        if not self.path:
+            return
+        data = {
+            'version': CREDENTIALS_VERSION,
+            'client_id': self.client_id,
+            'seed': self._seed,
+            'refresh_token': self.refresh_token,
+            'access_token': self._access_token,
+            'expires_at': self._expires_at,
+        }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 凭据文件保持mkstemp创建时的600权限，只有当前用户可读
+        fd, tmp_path = tempfile.mkstemp(dir=directory or None, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _is_valid(self):
+        return self._access_token is not None and time.time() < self._expires_at - self.margin
+
+    def cached_token(self):
+        """返回仍然有效的access_token，需要刷新时返回None（不会发起请求）"""
+        with self._lock:
+            return self._access_token if self._is_valid() else None
+
+    def access_token(self):
+        """返回有效的access_token，缓存的令牌即将过期时先刷新"""
+        with self._lock:
+            if not self._is_valid():
+                self._refresh_locked()
+            return self._access_token
+
+    def invalidate(self, access_token):
+        """
+        服务端拒绝了access_token（HTTP 401）时调用
+
+        只有令牌仍是当前令牌时才作废，多个线程先后报告同一个失效令牌时只会刷新一次。
+        """
+        with self._lock:
+            if access_token == self._access_token:
+                self._expires_at = 0
+
+    def _refresh_locked(self):
+        token_data = self._refresh(self.client_id, self.client_secret, self.refresh_token)
+        self._access_token = token_data['access_token']
+        self._expires_at = token_data.get('expires_at') or time.time() + token_data.get('expires_in', 0)
+        if token_data.get('refresh_token') and token_data['refresh_token'] != self.refresh_token:
+            logger.info('refresh_token已轮换')
+            self.refresh_token = token_data['refresh_token']
+        self.refreshes += 1
+        try:
+            self._save()
+        except OSError as e:
+            logger.warning('保存凭据失败: %s', e)
+        logger.debug('已刷新access_token，有效期至 %s', time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self._expires_at)))
@@ -1,72 +1,82 @@
 import os
 import argparse
+from stravalib import model
 from stravalib.client import Client
-from datetime import date, datetime, timedelta
+from datetime import timedelta, timezone
 from dateutil.relativedelta import relativedelta
 import json
-import time
 import requests
 from dotenv import load_dotenv
-import glob
-import re
 import sys
+import threading
+import asyncio
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 from process_laps_with_streams import process_laps, process_laps_with_streams
+from stream_processing import (DEFAULT_MAX_POINTS, LOD_TIERS, parse_stream_tiers, process_stream_data,
+                               process_stream_data_lttb, process_stream_tiers)
+from activity_cache import ActivityCache, get_default_cache_dir
+from rate_limit import STRAVA_BASE_URL, RateLimitGovernor
+from http_session import DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT, SessionFactory
+from sync_manifest import SyncManifest
+from rollups import activity_summary
+from activity_store import ActivityStore, get_default_store_path
+from run_writer import WriteStats, write_if_changed
+from credential_store import CredentialStore, get_default_credentials_path
+from sync_journal import SyncJournal, get_default_journal_path
+from sync_metrics import SyncMetrics, get_default_metrics_path, write_json_report, write_prometheus_report
+from logging_setup import add_logging_arguments, get_logger, setup_logging
+from stream_sidecar import (build_sidecar, get_sidecar_dir, get_sidecar_files, get_sidecar_url, get_static_dir,
+                            remove_sidecar_files, write_sidecar)
 
 
-def get_latest_activity_time(runs_dir):
-    try:
-        if not os.path.exists(runs_dir):
-            return None
-        
-        files = glob.glob(os.path.join(runs_dir, '*_*.md'))
-        if not files:
-            return None
-        
-        latest_time = None
-        for file in files:
-            # 从文件名中提取时间戳
-            match = re.search(r'\d+_(\d{4}-\d{2}-\d{2}T\d{2}-\d{2}-\d{2})\.md$', file)
-            if match:
-                time_str = match.group(1)
-                # 将第二个和第三个连字符替换为冒号
-                parts = time_str.split('T')
-                if len(parts) == 2:
-                    date_part = parts[0]  # 保持日期部分不变
-                    time_part = parts[1].replace('-', ':')  # 只替换时间部分的连字符
-                    time_str = f"{date_part} {time_part}"
-                    activity_time = datetime.fromisoformat(time_str)
-                    if latest_time is None or activity_time > latest_time:
-                        latest_time = activity_time
-        
-        return latest_time
-    except Exception as e:
-        print(f'获取最新活动时间失败: {str(e)}')
-        return None
+logger = get_logger('fetch')
+
+# 所有线程、所有API请求共享的限流器
+governor = RateLimitGovernor()
+
+# 本次同步的文件写入统计
+write_stats = WriteStats()
+
+# 本次同步各阶段的耗时和各接口的请求统计
+metrics = SyncMetrics()
+
+# 令牌刷新和所有API请求共用的HTTP连接池
+sessions = SessionFactory(governor, metrics=metrics)
 
-def refresh_access_token(client_id, client_secret, refresh_token, max_retries=3, initial_delay=1):
+def create_client(credentials, base_url=None):
+    """创建请求经过共享限流器的Strava客户端，base_url可指向本地的模拟服务"""
+    # 关闭stravalib自带的限流，统一由governor根据响应头控制请求速率；
+    # 每次请求都从凭据存储中取当前有效的access_token
+    session = sessions.create(base_url=base_url, credentials=credentials)
+    return Client(access_token=credentials.access_token(), rate_limit_requests=False, requests_session=session)
+
+@metrics.stage('oauth_refresh')
+def refresh_access_token(client_id, client_secret, refresh_token, max_retries=3, base_url=None):
+    """用refresh_token换取新的access_token，返回/oauth/token的响应数据（包括过期时间和轮换后的refresh_token）"""
     # 验证参数
     if not all([client_id, client_secret, refresh_token]):
         raise ValueError('client_id、client_secret和refresh_token都不能为空')
 
-    current_delay = initial_delay
     last_exception = None
+    # 与之后的API请求共用连接池，刷新令牌时建立的连接可以直接用于获取活动；
+    # 会话本身不重试，重试次数只由下面的循环控制
+    session = sessions.create(base_url=base_url, max_retries=0)
 
     for attempt in range(max_retries):
         try:
-            response = requests.post(
-                'https://www.strava.com/oauth/token',
+            response = session.post(
+                f'{STRAVA_BASE_URL}/oauth/token',
                 data={
                     'client_id': client_id,
                     'client_secret': client_secret,
                     'refresh_token': refresh_token,
                     'grant_type': 'refresh_token'
-                },
-                timeout=10  # 设置10秒超时
+                }
             )
             
             if response.status_code == 200:
-                token_data = response.json()
-                return token_data['access_token'], token_data['refresh_token']
+                return response.json()
             else:
                 error_msg = f'刷新access_token失败，HTTP状态码：{response.status_code}'
                 if response.text:
@@ -85,80 +95,194 @@ def refresh_access_token(client_id, client_secret, refresh_token, max_retries=3,
             last_exception = e
         
         if attempt < max_retries - 1:
-            print(f'第{attempt + 1}次请求失败，{current_delay}秒后重试...')
-            time.sleep(current_delay)
-            current_delay *= 2  # 指数退避
+            logger.warning('第%d次请求失败，等待重试...', attempt + 1)
+            governor.backoff(attempt)  # 带随机抖动的指数退避
         
     raise last_exception or Exception('刷新access_token失败，重试次数已用完')
 
-def fetch_strava_activities(client_id, client_secret, refresh_token, fetch_all=False, max_retries=3):
-    access_token, new_refresh_token = refresh_access_token(client_id, client_secret, refresh_token)
-    client = Client(access_token=access_token)
+def fetch_strava_activities(credentials, fetch_all=False, after=None, max_retries=3, base_url=None, journal=None):
+    client = get_thread_client(credentials, base_url)
     
     # 验证token
     try:
         athlete = client.get_athlete()
-        print(f'认证成功，当前用户: {athlete.firstname} {athlete.lastname}')
+        logger.info('认证成功，当前用户: %s %s', athlete.firstname, athlete.lastname)
     except Exception as e:
-        print(f'认证失败: {str(e)}')
+        logger.error('认证失败: %s', e)
         raise
     
+    if fetch_all:
+        logger.info('获取所有历史数据')
+        after = None
+    else:
+        # 获取同步清单中最新活动之后的活动
+        logger.info('获取最新活动数据')
+    
+    # 返回的是生成器，活动列表在处理过程中逐页获取
+    return iter_activities(client, after=after, max_retries=max_retries, journal=journal)
+
+# 活动列表每页的最大条数
+PAGE_SIZE = 200
+
+# 增量同步时重新检查最近同步时间之前多少天的活动，活动通常在上传后不久被改名或裁剪
+DEFAULT_RECHECK_DAYS = 14
+
+def to_epoch(value):
+    """将datetime转换为Unix时间戳，不带时区的按UTC处理（与stravalib一致）"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+def get_activity_page(client, params, max_retries=3):
+    """获取一页活动列表的原始响应，失败时只重试这一页"""
     for attempt in range(max_retries):
         try:
-            # 获取最新活动时间
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            project_root = os.path.dirname(script_dir)
-            runs_dir = os.path.join(project_root, 'content', 'runs')
-            
-            if fetch_all:
-                print('获取所有历史数据')
-                # 获取所有活动
-                all_activities = list(client.get_activities())
-            else:
-                latest_time = get_latest_activity_time(runs_dir)
-                # 获取最新活动
-                print(f'获取最新活动数据')
-                all_activities = list(client.get_activities(after=latest_time))
-                print(f'已获取{len(all_activities)}条新记录')
-            
-            return all_activities, new_refresh_token, access_token
+            with metrics.stage('list_activities'):
+                return client.protocol.get('/athlete/activities', **params)
         except Exception as e:
             if attempt == max_retries - 1:
-                raise e
-            print(f'第{attempt + 1}次获取数据失败，等待重试...')
-            time.sleep(5)
+                raise
+            logger.warning('获取第%d页活动列表失败（第%d次）: %s，等待重试...', params['page'], attempt + 1, e)
+            governor.backoff(attempt)
+
+def iter_activities(client, after=None, before=None, max_retries=3, journal=None):
+    """
+    按页遍历活动列表，逐条产出活动汇总对象
+
+    同一时间只持有一页数据，调用方边获取边处理，已处理的活动随即释放，
+    内存占用不随历史活动数增长，第一页返回后就开始写入文件。
+    传入进度日志时，先重放日志中已获取的页，再从下一页继续获取，并把新获取的页写入日志。
+    """
+    params = {'per_page': PAGE_SIZE}
+    if after is not None:
+        params['after'] = to_epoch(after)
+    if before is not None:
+        params['before'] = to_epoch(before)
+    
+    page = 1
+    if journal is not None:
+        for _, raw_activities in journal.replay_pages():
+            for raw in raw_activities:
+                yield model.Activity.parse_obj({**raw, 'bound_client': client})
+        if journal.listed:
+            return
+        page = journal.next_page()
+    
+    while True:
+        raw_activities = get_activity_page(client, {**params, 'page': page}, max_retries)
+        logger.debug('已获取第%d页活动列表，共%d条', page, len(raw_activities))
+        if journal is not None:
+            journal.record_page(page, raw_activities)
+        for raw in raw_activities:
+            yield model.Activity.parse_obj({**raw, 'bound_client': client})
+        if len(raw_activities) < PAGE_SIZE:
+            break
+        page += 1
+    if journal is not None:
+        journal.record_listed()
+
+def select_runs(activities, journal=None, manifest=None, runs_dir=None):
+    """
+    只处理跑步活动；从进度日志恢复时跳过已写入文件的活动
+
+    传入同步清单时跳过汇总指纹和生成选项都没有变化、markdown和sidecar文件仍然存在的已同步活动，
+    只有新活动、在Strava上被编辑过的活动和需要重新生成的活动才会获取详情和流数据。
+    """
+    static_dir = get_static_dir(runs_dir) if runs_dir else None
+    unchanged = 0
+    for activity in activities:
+        if activity.type != 'Run':
+            continue
+        if journal is not None and journal.was_written(activity.id):
+            continue
+        if manifest is not None and manifest.is_unchanged(activity, runs_dir, static_dir):
+            unchanged += 1
+            write_stats.add('unchanged')
+            continue
+        yield activity
+    if unchanged:
+        logger.info('汇总数据未变化，跳过 %d 条已同步的跑步记录', unchanged)
+
+# 流数据的类型
+STREAM_TYPES = ['time', 'distance', 'heartrate', 'altitude', 'velocity_smooth', 'cadence']
+
+def load_activity_detail(client, raw):
+    """将活动详情的原始响应转换为stravalib的Activity对象"""
+    return model.Activity.parse_obj({**raw, 'bound_client': client})
+
+# 活动列表接口返回的汇总数据中没有这些字段，从详情中恢复汇总数据时去掉，
+# 保证离线重新生成的内容与同步时一致
+DETAIL_ONLY_FIELDS = ('calories',)
 
-def get_activity_details(client, activity_id, max_retries=3):
-    """获取活动的详细信息，包括分段数据"""
+def load_activity_summary(raw):
+    """从缓存的活动详情原始响应中恢复活动列表接口返回的汇总对象"""
+    return model.Activity.parse_obj({key: value for key, value in raw.items() if key not in DETAIL_ONLY_FIELDS})
+
+def load_activity_streams(raw):
+    """将流数据的原始响应转换为以类型为键的Stream对象字典"""
+    # 按key_by_type返回时为字典，否则为带type字段的列表
+    if isinstance(raw, dict):
+        raw = [{**stream, 'type': stream_type} for stream_type, stream in raw.items()]
+    # 流数据每个通道有数千个点，逐个校验的开销远大于后续处理，直接构造对象
+    return {stream['type']: model.Stream.construct(**stream) for stream in raw}
+
+@metrics.stage('fetch_detail')
+def get_activity_details(client, activity_id, max_retries=3, cache=None, prefer_cache=False, refresh=False):
+    """
+    获取活动的详细信息，包括分段数据
+
+    prefer_cache为True时使用缓存而不检查是否过期；refresh为True时（活动在Strava上被编辑过）
+    忽略缓存，重新请求并更新缓存。
+    """
+    if cache and not refresh:
+        raw = cache.get('activities', activity_id, ignore_freshness=prefer_cache)
+        if raw is not None:
+            return load_activity_detail(client, raw)
+    
     for attempt in range(max_retries):
         try:
             # 获取活动详情，包括分段数据
-            activity_detail = client.get_activity(activity_id, include_all_efforts=True)
-            return activity_detail
+            raw = client.protocol.get('/activities/{id}', id=activity_id, include_all_efforts=True)
+            if cache:
+                cache.put('activities', activity_id, raw, start_date=raw.get('start_date'))
+            return load_activity_detail(client, raw)
         except Exception as e:
             if attempt == max_retries - 1:
-                print(f'获取活动 {activity_id} 详情失败: {str(e)}')
+                logger.warning('获取活动 %s 详情失败: %s', activity_id, e)
                 raise e
-            print(f'第{attempt + 1}次获取活动详情失败，等待重试...')
-            time.sleep(5)
+            logger.warning('第%d次获取活动详情失败，等待重试...', attempt + 1)
+            governor.backoff(attempt)
+
+@metrics.stage('fetch_streams')
+def get_activity_streams(client, activity_id, max_retries=3, cache=None, prefer_cache=False, refresh=False):
+    """
+    获取活动的流数据，包括心率、配速和海拔数据
 
-def get_activity_streams(client, activity_id, max_retries=3):
-    """获取活动的流数据，包括心率、配速和海拔数据"""
+    prefer_cache和refresh的含义与get_activity_details相同。
+    """
+    if cache and not refresh:
+        raw = cache.get('streams', activity_id, ignore_freshness=prefer_cache)
+        if raw is not None:
+            return load_activity_streams(raw)
+    
     for attempt in range(max_retries):
         try:
-            # 获取活动流数据
-            streams = client.get_activity_streams(
-                activity_id, 
-                types=['time', 'distance', 'heartrate', 'altitude', 'velocity_smooth', 'cadence'],
-                resolution='medium'
+            # 获取完整分辨率的活动流数据，分圈统计直接使用原始采样点，图表数据再单独降采样
+            raw = client.protocol.get(
+                '/activities/{id}/streams',
+                id=activity_id,
+                keys=','.join(STREAM_TYPES),
+                key_by_type=True
             )
-            return streams
+            if cache:
+                cache.put('streams', activity_id, raw, start_date=cache.get_start_date(activity_id))
+            return load_activity_streams(raw)
         except Exception as e:
             if attempt == max_retries - 1:
-                print(f'获取活动 {activity_id} 流数据失败: {str(e)}')
+                logger.warning('获取活动 %s 流数据失败: %s', activity_id, e)
                 return None  # 返回None而不是抛出异常，因为流数据不是必需的
-            print(f'第{attempt + 1}次获取活动流数据失败，等待重试...')
-            time.sleep(5)
+            logger.warning('第%d次获取活动流数据失败，等待重试...', attempt + 1)
+            governor.backoff(attempt)
 
 def process_segment_efforts(segment_efforts):
     """处理分段数据，提取关键信息"""
@@ -186,68 +310,6 @@ def process_segment_efforts(segment_efforts):
     
     return processed_segments
 
-def process_stream_data(streams):
-    """处理流数据，生成图表数据"""
-    if not streams:
-        return {
-            'heartrate_data': [],
-            'pace_data': [],
-            'elevation_data': []
-        }
-    
-    heartrate_data = []
-    pace_data = []
-    elevation_data = []
-    
-    # 处理心率数据
-    if 'heartrate' in streams and 'time' in streams:
-        times = streams['time'].data
-        heartrates = streams['heartrate'].data
-        
-        for i in range(0, len(times), 10):  # 每10个数据点取一个，减少数据量
-            heartrate_data.append({
-                'x': times[i],  # 时间（秒）
-                'y': heartrates[i]  # 心率
-            })
-    
-    # 处理配速数据（从速度计算）
-    if 'velocity_smooth' in streams and 'time' in streams:
-        times = streams['time'].data
-        velocities = streams['velocity_smooth'].data
-        
-        for i in range(0, len(times), 10):  # 每10个数据点取一个
-            if velocities[i] > 0:
-                # 计算配速（分钟/公里）
-                pace_min_per_km = 16.6667 / velocities[i]  # 1000 / 60 / velocity
-                
-                pace_data.append({
-                    'x': times[i],  # 时间（秒）
-                    'y': pace_min_per_km  # 配速（分钟/公里）
-                })
-    
-    # 处理海拔数据
-    if 'altitude' in streams and 'time' in streams:
-        times = streams['time'].data
-        altitudes = streams['altitude'].data
-        
-        for i in range(0, len(times), 10):  # 每10个数据点取一个
-            elevation_data.append({
-                'x': times[i],  # 时间（秒）
-                'y': altitudes[i]  # 海拔（米）
-            })
-    
-    return {
-        'heartrate_data': heartrate_data,
-        'pace_data': pace_data,
-        'elevation_data': elevation_data
-    }
-
-def get_activity_splits(client, activity_id):
-    """获取活动的公里分割数据"""
-    # 获取完整的活动详情，包括分割数据
-    activity_detail = client.get_activity(activity_id=activity_id, include_all_efforts=True)
-    return activity_detail
-
 def process_splits(activity):
     """处理公里分割数据"""
     splits = []
@@ -278,7 +340,7 @@ def process_splits(activity):
     
     return splits
 
-def create_markdown(activity, segments=None, stream_data=None, splits=None, laps=None):
+def create_markdown(activity, segments=None, stream_data=None, splits=None, laps=None, sidecar_url=None):
     try:
         start_time = activity.start_date_local
         if not start_time:
@@ -325,20 +387,24 @@ def create_markdown(activity, segments=None, stream_data=None, splits=None, laps
             f"calories: {calories:.1f}"
         ]
         
+        # 图表和表格数据保存在sidecar文件中时，frontmatter只记录文件地址
+        if sidecar_url:
+            frontmatter_lines.append(f"sidecar: {sidecar_url}")
+        
         # 添加分段数据
-        if segments:
+        if segments and not sidecar_url:
             frontmatter_lines.append(f"segments: {json.dumps(segments)}")
             
         # 添加公里分割数据
-        if splits:
+        if splits and not sidecar_url:
             frontmatter_lines.append(f"splits: {json.dumps(splits)}")
             
         # 添加分圈数据
-        if laps:
+        if laps and not sidecar_url:
             frontmatter_lines.append(f"laps: {json.dumps(laps)}")
         
         # 添加流数据
-        if stream_data:
+        if stream_data and not sidecar_url:
             if stream_data.get('heartrate_data'):
                 frontmatter_lines.append(f"heartrate_data: {json.dumps(stream_data['heartrate_data'])}")
             if stream_data.get('pace_data'):
@@ -402,141 +468,525 @@ def create_markdown(activity, segments=None, stream_data=None, splits=None, laps
         
         return frontmatter + content
     except Exception as e:
-        print(f'处理活动数据时出错: {str(e)}')
+        logger.error('处理活动数据时出错: %s', e)
         raise
 
+def process_activity_data(activity, activity_detail, streams, args):
+    """处理活动详情和流数据，返回包含分段、图表、公里分割和分圈数据的活动记录"""
+    segments = None
+    stream_data = None
+    stream_tiers = None
+    
+    if not args.no_segments and activity_detail:
+        try:
+            with metrics.stage('process_segments'):
+                segments = process_segment_efforts(activity_detail.segment_efforts)
+            logger.debug('已获取活动 %s 的分段数据，共 %d 个分段', activity.id, len(segments))
+        except Exception as e:
+            logger.warning('获取活动 %s 分段数据失败: %s', activity.id, e)
+    
+    if not args.no_streams and streams:
+        try:
+            with metrics.stage('process_streams'):
+                if args.max_points > 0:
+                    stream_data = process_stream_data_lttb(streams, args.max_points)
+                else:
+                    stream_data = process_stream_data(streams)
+                # sidecar模式下从同一份完整流数据额外生成更精细的层级，详情页放大图表时按需加载
+                if args.stream_output == 'sidecar' and args.stream_tiers:
+                    stream_tiers = process_stream_tiers(streams, args.stream_tiers, args.max_points or DEFAULT_MAX_POINTS)
+            logger.debug('已获取活动 %s 的流数据', activity.id)
+        except Exception as e:
+            logger.warning('获取活动 %s 流数据失败: %s', activity.id, e)
+    
+    # 处理公里分割数据
+    splits = None
+    if not args.no_splits and activity_detail:
+        try:
+            with metrics.stage('process_splits'):
+                splits = process_splits(activity_detail)
+            if splits:
+                logger.debug('已获取活动 %s 的公里分割数据，共 %d 个分割', activity.id, len(splits))
+        except Exception as e:
+            logger.warning('获取活动 %s 公里分割数据失败: %s', activity.id, e)
+    
+    # 处理分圈数据
+    laps = None
+    if not args.no_laps and activity_detail:
+        try:
+            with metrics.stage('process_laps'):
+                # 如果有流数据，直接在原始流数据上计算每个分圈的心率、步频和海拔
+                if streams:
+                    laps = process_laps_with_streams(activity_detail, streams)
+                else:
+                    # 如果没有流数据，使用普通方法
+                    laps = process_laps(activity_detail)
+                
+            if laps:
+                logger.debug('已获取活动 %s 的分圈数据，共 %d 个分圈', activity.id, len(laps))
+        except Exception as e:
+            logger.warning('获取活动 %s 分圈数据失败: %s', activity.id, e)
+    
+    return SimpleNamespace(activity=activity, segments=segments, splits=splits, laps=laps, stream_data=stream_data,
+                           stream_tiers=stream_tiers)
+
+def render_activity(activity, activity_detail, streams, args, store=None):
+    """
+    根据活动详情和流数据生成markdown内容
+
+    使用本地活动数据库时，处理结果先写入数据库，markdown由读回的记录生成。
+    返回 (markdown内容, sidecar数据)，--stream-output为frontmatter时sidecar数据为None。
+    """
+    return render_processed(process_activity_data(activity, activity_detail, streams, args), args, store)
+
+def render_processed(record, args, store=None):
+    """把处理好的活动记录写入数据库（如果使用），再投影为markdown内容和sidecar数据"""
+    if store is not None:
+        with metrics.stage('store'):
+            store.upsert_activity(record.activity, record.segments, record.splits, record.laps, record.stream_data)
+            # 数据库只保存概览图表数据，细节层级可由缓存的流数据重新生成，不写入数据库
+            stream_tiers = record.stream_tiers
+            record = store.load_activity(record.activity.id)
+            record.stream_tiers = stream_tiers
+    
+    return render_record(record, args)
+
+@metrics.stage('render')
+def render_record(record, args):
+    """把一条活动记录（数据库中读出或刚处理完的数据）投影为 (markdown内容, sidecar数据)"""
+    # sidecar模式下图表和表格数据写入单独的文件，frontmatter只保留汇总字段
+    sidecar = None
+    sidecar_url = None
+    if args.stream_output == 'sidecar':
+        sidecar = build_sidecar(record.stream_data, record.segments, record.splits, record.laps,
+                                getattr(record, 'stream_tiers', None), record.activity.id)
+        sidecar_url = get_sidecar_url(record.activity.id)
+    
+    content = create_markdown(record.activity, record.segments, record.stream_data, record.splits, record.laps, sidecar_url=sidecar_url)
+    return content, sidecar
+
+@metrics.stage('write')
+def write_run_file(runs_dir, activity, content, manifest=None, sidecar=None):
+    """将markdown内容和sidecar数据保存到磁盘（内容未变化时不重写），返回文件名"""
+    # 先写sidecar文件，保证markdown引用的文件已经存在；
+    # frontmatter模式下删除以前用sidecar模式生成的文件，markdown不再引用它们
+    if sidecar is not None:
+        write_sidecar(get_sidecar_dir(runs_dir), activity.id, sidecar)
+    else:
+        remove_sidecar_files(get_sidecar_dir(runs_dir), activity.id)
+    
+    start_time = activity.start_date_local
+    file_name = f"{activity.id}_{start_time.strftime('%Y-%m-%dT%H-%M-%S')}.md"
+    file_path = os.path.join(runs_dir, file_name)
+    
+    entry = manifest.get(activity.id) if manifest is not None else None
+    known_hash = entry['hash'] if entry and entry.get('file') == file_name else None
+    written, digest = write_if_changed(file_path, content, known_hash)
+    
+    # 活动开始时间被修改后文件名会变化，删除旧文件
+    if entry and entry.get('file') and entry['file'] != file_name:
+        old_path = os.path.join(runs_dir, entry['file'])
+        if os.path.exists(old_path):
+            os.remove(old_path)
+            logger.info('已删除旧文件：%s', entry['file'])
+    
+    if manifest is not None:
+        sidecar_files = get_sidecar_files(activity.id, sidecar) if sidecar is not None else None
+        manifest.record(activity, file_name, digest, activity_summary(activity), sidecar_files)
+    
+    if written:
+        write_stats.add('written')
+        logger.info('已保存活动数据：%s', file_name)
+    else:
+        write_stats.add('unchanged')
+        logger.debug('活动数据未变化：%s', file_name)
+    return file_name
+
+def needs_activity_detail(args):
+    """分段、公里分割和分圈数据都来自活动详情"""
+    return not (args.no_segments and args.no_splits and args.no_laps)
+
+def process_activity(client, activity, runs_dir, args, cache=None, manifest=None, store=None, journal=None):
+    """获取单个活动的详细数据并保存为markdown文件，返回生成的文件名"""
+    # 获取详细数据（分段、公里分割和分圈共用同一个活动详情）
+    activity_detail = None
+    streams = None
+    # 中断前已获取过详情和流数据的活动直接使用缓存，恢复时不重复请求
+    enriched = journal is not None and journal.was_enriched(activity.id)
+    # 在Strava上被编辑过的活动，缓存中的详情和流数据已经过时
+    refresh = not enriched and manifest is not None and manifest.is_changed(activity)
+    if refresh:
+        logger.info('活动 %s 的汇总数据已变化，重新获取详情和流数据', activity.id)
+    
+    if needs_activity_detail(args):
+        try:
+            activity_detail = get_activity_details(client, activity.id, cache=cache, prefer_cache=enriched,
+                                                   refresh=refresh)
+        except Exception as e:
+            logger.warning('获取活动 %s 详情失败: %s', activity.id, e)
+    
+    if not args.no_streams:
+        try:
+            # 获取活动流数据
+            streams = get_activity_streams(client, activity.id, cache=cache, prefer_cache=enriched, refresh=refresh)
+        except Exception as e:
+            logger.warning('获取活动 %s 流数据失败: %s', activity.id, e)
+    
+    if journal is not None and cache and not enriched:
+        journal.record_enriched(activity.id)
+    
+    # 生成markdown内容并保存
+    content, sidecar = render_activity(activity, activity_detail, streams, args, store)
+    file_name = write_run_file(runs_dir, activity, content, manifest, sidecar)
+    if journal is not None:
+        journal.record_written(activity.id)
+    return file_name
+
+# 每个线程持有自己的Client和HTTP会话，所有会话共享同一个连接池
+_thread_local = threading.local()
+
+def get_thread_client(credentials, base_url=None):
+    """获取当前线程专用的Strava客户端，同一线程中获取列表和处理活动使用同一个客户端"""
+    client = getattr(_thread_local, 'client', None)
+    if client is None:
+        client = create_client(credentials, base_url)
+        _thread_local.client = client
+    return client
+
+def process_activities_concurrently(activities, credentials, runs_dir, args, cache=None, manifest=None, store=None,
+                                    journal=None):
+    """
+    使用线程池并发处理活动，返回处理失败的活动列表
+
+    活动从可迭代对象中逐个取出提交，同时在途的活动不超过线程数的两倍，
+    活动列表可以是边获取边产出的生成器。
+    """
+    failures = []
+    pending = {}
+    
+    def worker(activity):
+        client = get_thread_client(credentials, args.base_url)
+        return process_activity(client, activity, runs_dir, args, cache, manifest, store, journal)
+    
+    def collect(done):
+        for future in done:
+            activity = pending.pop(future)
+            try:
+                future.result()
+            except Exception as e:
+                logger.error('保存活动 %s 失败: %s', activity.id, e)
+                failures.append((activity.id, str(e)))
+                write_stats.add('skipped')
+                if manifest is not None:
+                    manifest.record_failure(activity)
+    
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for activity in activities:
+            if len(pending) >= args.workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending[executor.submit(worker, activity)] = activity
+        collect(as_completed(list(pending)))
+    
+    return failures
+
+def get_render_options(args):
+    """
+    影响生成文件内容的命令行参数，记录在同步清单中
+
+    与上次同步时不同的活动不会因为汇总指纹未变化而被跳过。细节层级只在sidecar模式下生成，
+    其他模式下不参与比较。
+    """
+    sidecar = args.stream_output == 'sidecar'
+    return {
+        'stream_output': args.stream_output,
+        'max_points': args.max_points,
+        'stream_tiers': [list(tier) for tier in args.stream_tiers] if sidecar else [],
+        'no_segments': args.no_segments,
+        'no_splits': args.no_splits,
+        'no_laps': args.no_laps,
+        'no_streams': args.no_streams,
+    }
+
+def add_processing_arguments(parser):
+    """添加数据处理相关的命令行参数"""
+    parser.add_argument('--max-points', type=int, default=DEFAULT_MAX_POINTS,
+                        help=f'心率、配速、海拔图表每条序列的最大点数（LTTB降采样），默认为{DEFAULT_MAX_POINTS}，0表示每10个点取一个')
+    parser.add_argument('--stream-output', choices=['frontmatter', 'sidecar'], default='frontmatter',
+                        help='图表、分段、公里分割和分圈数据的输出位置：frontmatter写入markdown，sidecar写入static/streams/<id>.json由详情页按需加载')
+    parser.add_argument('--stream-tiers', type=parse_stream_tiers,
+                        default=','.join(f'{name}:{points}' if points else name for name, points in LOD_TIERS),
+                        help='sidecar模式下额外生成的图表细节层级，格式为 名称:点数，不写点数表示保留全部采样点，'
+                             '空字符串表示只生成概览数据；默认为 %(default)s')
+
+def add_engine_arguments(parser):
+    """添加数据获取引擎相关的命令行参数"""
+    parser.add_argument('--engine', choices=['client', 'async'], default='client',
+                        help='数据获取引擎：client使用stravalib客户端，async使用基于asyncio的并发引擎（需要aiohttp）')
+    parser.add_argument('--concurrency', type=int, default=32, help='异步引擎同时在途的活动数')
+    parser.add_argument('--base-url', default=STRAVA_BASE_URL,
+                        help='Strava服务地址，可指向本地模拟服务（strava_stub_server.py）离线测试同步流程')
+    parser.add_argument('--pool-size', type=int,
+                        help=f'HTTP连接池的连接数，默认为{DEFAULT_POOL_SIZE}和并发线程数中的较大值')
+    parser.add_argument('--http-timeout', type=float, default=DEFAULT_TIMEOUT[1],
+                        help=f'HTTP请求的读取超时（秒），默认为{DEFAULT_TIMEOUT[1]}')
+
+def configure_http(args):
+    """根据命令行参数设置共享连接池的大小和超时"""
+    workers = args.workers + getattr(args, 'window_workers', 0)
+    sessions.configure(pool_size=args.pool_size or max(DEFAULT_POOL_SIZE, workers),
+                       timeout=(DEFAULT_TIMEOUT[0], args.http_timeout))
+
+def add_cache_arguments(parser):
+    """添加本地API响应缓存相关的命令行参数"""
+    parser.add_argument('--no-cache', action='store_true', help='不使用本地API响应缓存')
+    parser.add_argument('--cache-dir', default=get_default_cache_dir(), help='本地API响应缓存目录')
+    parser.add_argument('--cache-max-age', type=float, default=6, help='近期活动缓存的有效时长（小时）')
+    parser.add_argument('--cache-max-size', type=float, default=1024, help='缓存目录大小上限（MB）')
+
+def add_change_detection_arguments(parser):
+    """添加变更检测相关的命令行参数"""
+    parser.add_argument('--ignore-fingerprints', action='store_true',
+                        help='不比较汇总指纹，重新获取活动列表中全部跑步活动的详情和流数据')
+
+def add_store_arguments(parser):
+    """添加本地活动数据库相关的命令行参数"""
+    parser.add_argument('--no-store', action='store_true', help='不使用本地SQLite活动数据库')
+    parser.add_argument('--db-path', default=get_default_store_path(), help='本地SQLite活动数据库路径')
+
+def add_metrics_arguments(parser):
+    """添加同步指标报告相关的命令行参数"""
+    parser.add_argument('--metrics-file', default=get_default_metrics_path(),
+                        help='同步结束后写入JSON格式指标报告（各阶段耗时、接口请求数、重试和限额余量等）的路径')
+    parser.add_argument('--metrics-prom',
+                        help='同时写入Prometheus文本格式的指标文件，例如node_exporter textfile目录下的strava_sync.prom')
+
+def add_credential_arguments(parser):
+    """添加凭据缓存相关的命令行参数"""
+    parser.add_argument('--credentials-file', default=get_default_credentials_path(),
+                        help='缓存access_token和轮换后的refresh_token的文件，令牌过期前的运行无需重新请求令牌。'
+                             '文件中保存有效的令牌，不要放在会被上传的目录中（例如CI的actions/cache缓存的cache目录），'
+                             '否则其他工作流（包括来自fork的pull request）可能读取到令牌')
+    parser.add_argument('--no-credentials-cache', action='store_true',
+                        help='不缓存凭据，每次运行都刷新access_token；在CI等令牌文件无法安全保存的环境中使用')
+
+def create_credentials(args):
+    """根据命令行参数创建凭据存储，令牌刷新同样经过共享限流器并计入同步指标"""
+    def refresh(client_id, client_secret, refresh_token):
+        return refresh_access_token(client_id, client_secret, refresh_token, base_url=args.base_url)
+    
+    credentials = CredentialStore(
+        args.client_id, args.client_secret, args.refresh_token, refresh,
+        path=None if args.no_credentials_cache else args.credentials_file,
+    )
+    if credentials.cached_token():
+        logger.info('使用缓存的access_token')
+    return credentials
+
+def add_resume_arguments(parser):
+    """添加中断后恢复同步相关的命令行参数"""
+    parser.add_argument('--resume', action='store_true',
+                        help='从进度日志恢复上次中断的同步，跳过已获取的活动列表和已写入的活动，已获取过的详情直接读取缓存')
+    parser.add_argument('--journal-file', default=get_default_journal_path(),
+                        help='同步进度日志的路径，同步成功结束后自动删除')
+
+def open_journal(args, params):
+    """打开本次同步的进度日志，参数与日志不同时不会恢复"""
+    return SyncJournal.open(args.journal_file, params, resume=args.resume)
+
+def write_metrics_report(args, cache=None, failures=None, succeeded=True):
+    """输出本次同步的指标报告，写入失败不影响同步结果"""
+    report = metrics.report(governor, write_stats, cache, failures, succeeded, pool=sessions.stats())
+    try:
+        write_json_report(args.metrics_file, report)
+        if args.metrics_prom:
+            write_prometheus_report(args.metrics_prom, report)
+        logger.info('同步指标已写入 %s', args.metrics_file)
+    except OSError as e:
+        logger.warning('写入同步指标失败: %s', e)
+    return report
+
+def create_store(args):
+    """根据命令行参数打开本地活动数据库"""
+    if args.no_store:
+        return None
+    return ActivityStore(args.db_path)
+
+def create_cache(args):
+    """根据命令行参数创建本地API响应缓存"""
+    if args.no_cache:
+        return None
+    return ActivityCache(args.cache_dir, max_age_hours=args.cache_max_age, max_size_mb=args.cache_max_size)
+
+def process_runs(runs, credentials, runs_dir, args, cache=None, manifest=None, store=None, journal=None):
+    """串行或并发处理跑步活动（可以是逐个产出活动的生成器），并汇总处理失败的活动"""
+    failures = []
+    if args.workers > 1:
+        logger.info('使用 %d 个线程并发处理跑步记录', args.workers)
+        failures = process_activities_concurrently(runs, credentials, runs_dir, args, cache, manifest, store, journal)
+    else:
+        # 与获取活动列表使用同一个客户端
+        client = get_thread_client(credentials, args.base_url)
+        
+        # 保存活动数据
+        for activity in runs:
+            try:
+                process_activity(client, activity, runs_dir, args, cache, manifest, store, journal)
+            except Exception as e:
+                logger.error('保存活动 %s 失败: %s', activity.id, e)
+                failures.append((activity.id, str(e)))
+                write_stats.add('skipped')
+                if manifest is not None:
+                    manifest.record_failure(activity)
+    
+    print_sync_summary(failures, cache)
+    return failures
+
+def print_sync_summary(failures, cache=None):
+    """输出文件写入情况、处理失败的活动、缓存命中情况和限流统计"""
+    logger.info('\n%s', write_stats.summary())
+    
+    if failures:
+        logger.warning('\n共有 %d 条活动处理失败:', len(failures))
+        for activity_id, error in failures:
+            logger.warning('- %s: %s', activity_id, error)
+    
+    if cache:
+        removed = cache.evict()
+        logger.info('缓存命中 %d 次，未命中 %d 次%s', cache.hits, cache.misses, f'，已淘汰 {removed} 个缓存文件' if removed else '')
+    
+    headroom = governor.headroom()['X-ReadRateLimit']
+    logger.info('限流等待 %.0f 秒，重试 %d 次，剩余读请求额度: 15分钟 %d，当日 %d',
+                governor.throttled_seconds, governor.retries, headroom[0], headroom[1])
+    
+    pool = sessions.stats()
+    logger.info('HTTP连接池: 新建连接 %d 个，请求 %d 次，其中复用连接 %d 次', pool['connections'], pool['requests'], pool['reused'])
+
 def main():
     parser = argparse.ArgumentParser(description='从Strava获取跑步数据')
-    parser.add_argument('--client-id', required=True, help='Strava API的client ID')
-    parser.add_argument('--client-secret', required=True, help='Strava API的client secret')
-    parser.add_argument('--refresh-token', required=True, help='Strava API的refresh token')
+    parser.add_argument('--client-id', help='Strava API的client ID')
+    parser.add_argument('--client-secret', help='Strava API的client secret')
+    parser.add_argument('--refresh-token', help='Strava API的refresh token')
     parser.add_argument('--fetch-all', action='store_true', help='是否获取所有历史数据')
+    parser.add_argument('--rerender', action='store_true',
+                        help='不访问Strava API，只使用本地缓存的数据并行重新生成全部跑步数据文件')
     parser.add_argument('--no-segments', action='store_true', help='不获取分段数据')
     parser.add_argument('--no-splits', action='store_true', help='不获取公里分割数据')
     parser.add_argument('--no-laps', action='store_true', help='不获取分圈数据')
     parser.add_argument('--no-streams', action='store_true', help='不获取流数据（心率、配速、海拔）')
+    parser.add_argument('--workers', type=int, default=1, help='并发处理活动的线程数，默认为1（串行处理）')
+    parser.add_argument('--rebuild-manifest', action='store_true', help='扫描runs目录重建同步清单')
+    parser.add_argument('--recheck-days', type=float, default=DEFAULT_RECHECK_DAYS,
+                        help=f'增量同步时重新获取最近同步时间之前多少天的活动列表，按汇总指纹找出其中被编辑过的活动，'
+                             f'默认为{DEFAULT_RECHECK_DAYS}，0表示只获取新活动')
+    add_processing_arguments(parser)
+    add_engine_arguments(parser)
+    add_cache_arguments(parser)
+    add_change_detection_arguments(parser)
+    add_store_arguments(parser)
+    add_metrics_arguments(parser)
+    add_credential_arguments(parser)
+    add_resume_arguments(parser)
+    add_logging_arguments(parser)
     
     args = parser.parse_args()
+    setup_logging(args.verbose, args.quiet)
+    
+    if args.workers < 1:
+        parser.error('--workers 必须大于等于1')
+    if args.concurrency < 1:
+        parser.error('--concurrency 必须大于等于1')
+    if args.recheck_days < 0:
+        parser.error('--recheck-days 不能小于0')
+    if args.rerender:
+        if args.no_cache:
+            parser.error('--rerender 需要使用本地API响应缓存，不能与 --no-cache 同时使用')
+        if args.resume:
+            parser.error('--rerender 不访问Strava API，不能与 --resume 同时使用')
+    elif not (args.client_id and args.client_secret and args.refresh_token):
+        parser.error('需要提供 --client-id、--client-secret 和 --refresh-token')
+    configure_http(args)
     
     try:
-        activities, new_refresh_token, access_token = fetch_strava_activities(
-            args.client_id,
-            args.client_secret,
-            args.refresh_token,
-            args.fetch_all
-        )
-        
         # 创建runs目录
         script_dir = os.path.dirname(os.path.abspath(__file__))
         project_root = os.path.dirname(script_dir)
         runs_dir = os.path.join(project_root, 'content', 'runs')
-        os.makedirs(runs_dir, exist_ok=True)
         
-        # 创建客户端
-        client = Client(access_token=access_token)
+        cache = create_cache(args)
+        store = create_store(args)
+        manifest = SyncManifest.load_or_rebuild(runs_dir, rebuild=args.rebuild_manifest)
+        manifest.set_render_options(get_render_options(args))
+        after = None if args.fetch_all else manifest.latest_time()
+        # 往前多获取一段时间的活动列表，汇总指纹变化的活动重新获取，未变化的直接跳过
+        if after is not None and args.recheck_days:
+            after -= timedelta(days=args.recheck_days)
+        journal = None
+        failures = None
+        succeeded = False
         
-        # 保存活动数据
-        for activity in activities:
-            if activity.type != 'Run':
-                continue
-            
-            # 生成markdown文件名
-            start_time = activity.start_date_local
-            file_name = f"{activity.id}_{start_time.strftime('%Y-%m-%dT%H-%M-%S')}.md"
-            file_path = os.path.join(runs_dir, file_name)
-            
-            # 获取详细数据
-            segments = None
-            stream_data = None
-            
-            if not args.no_segments:
-                try:
-                    # 获取活动详情，包括分段数据
-                    activity_detail = get_activity_details(client, activity.id)
-                    segments = process_segment_efforts(activity_detail.segment_efforts)
-                    print(f'已获取活动 {activity.id} 的分段数据，共 {len(segments)} 个分段')
-                except Exception as e:
-                    print(f'获取活动 {activity.id} 分段数据失败: {str(e)}')
-            
-            if not args.no_streams:
-                try:
-                    # 获取活动流数据
-                    streams = get_activity_streams(client, activity.id)
-                    if streams:
-                        stream_data = process_stream_data(streams)
-                        print(f'已获取活动 {activity.id} 的流数据')
-                except Exception as e:
-                    print(f'获取活动 {activity.id} 流数据失败: {str(e)}')
-            
-            # 获取公里分割数据
-            splits = None
-            detailed_activity = None
-            if not args.no_splits:
-                try:
-                    # 获取详细的活动数据，包括分割信息
-                    detailed_activity = get_activity_splits(client, activity.id)
-                    splits = process_splits(detailed_activity)
-                    if splits:
-                        print(f'已获取活动 {activity.id} 的公里分割数据，共 {len(splits)} 个分割')
-                except Exception as e:
-                    print(f'获取活动 {activity.id} 公里分割数据失败: {str(e)}')
-            
-            # 获取分圈数据
-            laps = None
-            if not args.no_laps:
-                try:
-                    # 使用正确的API调用获取分圈数据
-                    if not detailed_activity:
-                        detailed_activity = client.get_activity(activity.id, include_all_efforts=True)
-                    
-                    # 如果有流数据，使用流数据计算分圈的心率
-                    if stream_data and 'heartrate_data' in stream_data and stream_data['heartrate_data']:
-                        # 使用流数据计算分圈的心率
-                        # 将流数据转换为process_laps_with_streams函数需要的格式
-                        streams = {}
-                        if 'heartrate_data' in stream_data and stream_data['heartrate_data']:
-                            times = [point['x'] for point in stream_data['heartrate_data']]
-                            heartrates = [point['y'] for point in stream_data['heartrate_data']]
-                            
-                            # 创建流数据对象
-                            class StreamData:
-                                def __init__(self, data):
-                                    self.data = data
-                                    
-                            streams['time'] = StreamData(times)
-                            streams['heartrate'] = StreamData(heartrates)
-                            
-                            # 使用流数据处理分圈数据
-                            laps = process_laps_with_streams(detailed_activity, streams)
-                        else:
-                            # 如果没有心率流数据，使用普通方法
-                            laps = process_laps(detailed_activity)
-                    else:
-                        # 如果没有流数据，使用普通方法
-                        laps = process_laps(detailed_activity)
-                        
-                    if laps:
-                        print(f'已获取活动 {activity.id} 的分圈数据，共 {len(laps)} 个分圈')
-                except Exception as e:
-                    print(f'获取活动 {activity.id} 分圈数据失败: {str(e)}')
+        try:
+            if not args.rerender:
+                # 活动列表的范围相同时才能从进度日志恢复
+                journal = open_journal(args, {
+                    'script': 'fetch_strava_data',
+                    'fetch_all': args.fetch_all,
+                    'after': to_epoch(after) if after else None,
+                })
+                credentials = create_credentials(args)
             
-            # 生成markdown内容并保存
-            try:
-                content = create_markdown(activity, segments, stream_data, splits, laps)
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                print(f'已保存活动数据：{file_name}')
-            except Exception as e:
-                print(f'保存活动 {activity.id} 失败: {str(e)}')
+            if args.rerender:
+                from rerender import rerender_runs
+                
+                # --workers 大于1时作为进程数，否则使用全部CPU核心
+                failures = rerender_runs(runs_dir, args, manifest, store, workers=args.workers if args.workers > 1 else None)
+            elif args.engine == 'async':
+                from async_engine import sync_activities_async
+                
+                os.makedirs(runs_dir, exist_ok=True)
+                if args.fetch_all:
+                    logger.info('获取所有历史数据')
+                else:
+                    logger.info('获取最新活动数据')
+                failures = asyncio.run(sync_activities_async(credentials, runs_dir, args, cache, manifest, store,
+                                                             after=after, journal=journal))
+            else:
+                activities = fetch_strava_activities(
+                    credentials,
+                    args.fetch_all,
+                    after=after,
+                    base_url=args.base_url,
+                    journal=journal
+                )
+                os.makedirs(runs_dir, exist_ok=True)
+                
+                # 只处理跑步活动，边获取活动列表边处理
+                runs = select_runs(activities, journal, None if args.ignore_fingerprints else manifest, runs_dir)
+                failures = process_runs(runs, credentials, runs_dir, args, cache, manifest, store, journal)
+            succeeded = True
+        finally:
+            # 同步成功结束时删除进度日志，否则保留以便 --resume 继续
+            if journal is not None:
+                journal.close(completed=succeeded)
+            # 先提交数据库中剩余的写入，再保存同步清单
+            if store is not None:
+                with metrics.stage('store'):
+                    store.close()
+            # 只记录已成功写入的活动，中途失败时也保存已完成的进度
+            with metrics.stage('manifest'):
+                if manifest.save():
+                    logger.info('已更新同步清单')
+            write_metrics_report(args, cache, failures, succeeded)
     
-        print('\n数据同步完成！')
+        logger.info('\n数据同步完成！')
         
     except Exception as e:
-        print('数据同步失败:', str(e))
-        print('错误详情:')
-        import traceback
-        print(traceback.format_exc())
+        # 附带完整的错误堆栈
+        logger.exception('数据同步失败: %s', e)
         sys.exit(1)
 
 if __name__ == '__main__':
+    # 以脚本方式运行时，异步引擎等模块导入的fetch_strava_data与本模块是同一个对象，
+    # 共享限流器、写入统计和同步指标
+    sys.modules.setdefault('fetch_strava_data', sys.modules[__name__])
     main()
\ No newline at end of file
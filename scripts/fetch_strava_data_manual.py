@@ -1,377 +1,198 @@
 import os
 import argparse
-from stravalib.client import Client
-from datetime import date, datetime, timedelta
-from dateutil.relativedelta import relativedelta
-import json
-import time
-import requests
-from dotenv import load_dotenv
-import glob
-import re
+from datetime import datetime, timedelta
 import sys
-from process_laps_with_streams import process_laps, process_laps_with_streams
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from stravalib import model
+from fetch_strava_data import (
+    PAGE_SIZE,
+    governor,
+    create_client,
+    get_activity_page,
+    get_thread_client,
+    metrics,
+    select_runs,
+    to_epoch,
+    add_processing_arguments,
+    add_engine_arguments,
+    configure_http,
+    add_cache_arguments,
+    add_change_detection_arguments,
+    add_store_arguments,
+    add_credential_arguments,
+    create_credentials,
+    add_metrics_arguments,
+    add_resume_arguments,
+    open_journal,
+    write_metrics_report,
+    add_logging_arguments,
+    setup_logging,
+    create_cache,
+    create_store,
+    get_render_options,
+    process_runs,
+)
+from sync_manifest import SyncManifest
+from logging_setup import get_logger
 
+logger = get_logger('fetch')
 
-def refresh_access_token(client_id, client_secret, refresh_token, max_retries=3, initial_delay=1):
-    # 验证参数
-    if not all([client_id, client_secret, refresh_token]):
-        raise ValueError('client_id、client_secret和refresh_token都不能为空')
 
-    current_delay = initial_delay
-    last_exception = None
+# 每个时间窗口期望包含的活动数，不超过列表接口一页的条数时每个窗口只需一次请求
+TARGET_PER_WINDOW = 150
 
-    for attempt in range(max_retries):
-        try:
-            response = requests.post(
-                'https://www.strava.com/oauth/token',
-                data={
-                    'client_id': client_id,
-                    'client_secret': client_secret,
-                    'refresh_token': refresh_token,
-                    'grant_type': 'refresh_token'
-                },
-                timeout=10  # 设置10秒超时
-            )
-            
-            if response.status_code == 200:
-                token_data = response.json()
-                return token_data['access_token'], token_data['refresh_token']
-            else:
-                error_msg = f'刷新access_token失败，HTTP状态码：{response.status_code}'
-                if response.text:
-                    try:
-                        error_data = response.json()
-                        error_msg += f'，错误信息：{error_data.get("message", "未知错误")}'
-                    except:
-                        error_msg += f'，响应内容：{response.text}'
-                raise Exception(error_msg)
-                
-        except requests.exceptions.Timeout:
-            last_exception = Exception(f'请求超时（第{attempt + 1}次尝试）')
-        except requests.exceptions.ConnectionError as e:
-            last_exception = Exception(f'连接错误：{str(e)}（第{attempt + 1}次尝试）')
-        except Exception as e:
-            last_exception = e
-        
-        if attempt < max_retries - 1:
-            print(f'第{attempt + 1}次请求失败，{current_delay}秒后重试...')
-            time.sleep(current_delay)
-            current_delay *= 2  # 指数退避
-        
-    raise last_exception or Exception('刷新access_token失败，重试次数已用完')
+# 还没有观察到活动密度时的窗口长度，以及自适应窗口长度的上下限（天）
+INITIAL_WINDOW_DAYS = 30
+MIN_WINDOW_DAYS = 1
+MAX_WINDOW_DAYS = 365
 
-def fetch_strava_activities(client_id, client_secret, refresh_token, start_date, end_date, max_retries=3):
-    access_token, new_refresh_token = refresh_access_token(client_id, client_secret, refresh_token)
-    client = Client(access_token=access_token)
-    
-    # 验证token
-    try:
-        athlete = client.get_athlete()
-        print(f'认证成功，当前用户: {athlete.firstname} {athlete.lastname}')
-    except Exception as e:
-        print(f'认证失败: {str(e)}')
-        raise
-    
-    for attempt in range(max_retries):
-        try:
-            all_activities = []
-            current_time = start_date
-            
-            while current_time < end_date:
-                # 设置30天的时间窗口
-                window_end = min(current_time + timedelta(days=30), end_date)
-                activities = list(client.get_activities(after=current_time, before=window_end))
-                
-                if activities:
-                    all_activities.extend(activities)
-                    print(f'已获取{current_time.date()}至{window_end.date()}的数据，共{len(all_activities)}条记录')
-                
-                current_time = window_end
-            
-            return all_activities, new_refresh_token, access_token
-        except Exception as e:
-            if attempt == max_retries - 1:
-                raise e
-            print(f'第{attempt + 1}次获取数据失败，等待重试...')
-            time.sleep(5)
+# 相邻窗口重叠的时间，避免恰好落在窗口边界上的活动被漏掉，重复的活动按ID去重
+WINDOW_OVERLAP = timedelta(seconds=1)
 
-def get_activity_details(client, activity_id, max_retries=3):
-    """获取活动的详细信息，包括分段数据"""
-    for attempt in range(max_retries):
-        try:
-            # 获取活动详情，包括分段数据
-            activity_detail = client.get_activity(activity_id, include_all_efforts=True)
-            return activity_detail
-        except Exception as e:
-            if attempt == max_retries - 1:
-                print(f'获取活动 {activity_id} 详情失败: {str(e)}')
-                raise e
-            print(f'第{attempt + 1}次获取活动详情失败，等待重试...')
-            time.sleep(5)
 
-def get_activity_streams(client, activity_id, max_retries=3):
-    """获取活动的流数据，包括心率、配速和海拔数据"""
-    for attempt in range(max_retries):
-        try:
-            # 获取活动流数据
-            streams = client.get_activity_streams(
-                activity_id, 
-                types=['time', 'distance', 'heartrate', 'altitude', 'velocity_smooth', 'cadence'],
-                resolution='medium'
-            )
-            return streams
-        except Exception as e:
-            if attempt == max_retries - 1:
-                print(f'获取活动 {activity_id} 流数据失败: {str(e)}')
-                return None  # 返回None而不是抛出异常，因为流数据不是必需的
-            print(f'第{attempt + 1}次获取活动流数据失败，等待重试...')
-            time.sleep(5)
+class WindowPlanner:
+    """
+    把日期范围切分为连续的时间窗口
 
-def process_segment_efforts(segment_efforts):
-    """处理分段数据，提取关键信息"""
-    if not segment_efforts:
-        return []
-    
-    processed_segments = []
-    for effort in segment_efforts:
-        segment = effort.segment
-        
-        # 提取分段信息
-        segment_data = {
-            'name': effort.name,
-            'distance': float(effort.distance),
-            'elapsed_time': effort.elapsed_time.total_seconds() if hasattr(effort.elapsed_time, 'total_seconds') else float(effort.elapsed_time),
-            'moving_time': effort.moving_time.total_seconds() if hasattr(effort.moving_time, 'total_seconds') else float(effort.moving_time),
-            'average_heartrate': float(getattr(effort, 'average_heartrate', 0) or 0),
-            'max_heartrate': float(getattr(effort, 'max_heartrate', 0) or 0),
-            'average_grade': float(getattr(segment, 'average_grade', 0) or 0),
-            'maximum_grade': float(getattr(segment, 'maximum_grade', 0) or 0),
-            'elevation_difference': float(getattr(segment, 'elevation_high', 0) or 0) - float(getattr(segment, 'elevation_low', 0) or 0)
-        }
-        
-        processed_segments.append(segment_data)
-    
-    return processed_segments
+    窗口长度根据已完成窗口观察到的活动密度（每天的活动数）调整，
+    使每个窗口大约包含target条活动：训练密集的时期窗口变短，空闲的时期窗口变长。
+    completed中的时间窗口（从进度日志恢复时已获取的窗口）会被跳过。
+    """
 
-def process_stream_data(streams):
-    """处理流数据，生成图表数据"""
-    if not streams:
-        return {
-            'heartrate_data': [],
-            'pace_data': [],
-            'elevation_data': []
-        }
-    
-    heartrate_data = []
-    pace_data = []
-    elevation_data = []
-    
-    # 处理心率数据
-    if 'heartrate' in streams and 'time' in streams:
-        times = streams['time'].data
-        heartrates = streams['heartrate'].data
-        
-        for i in range(0, len(times), 10):  # 每10个数据点取一个，减少数据量
-            heartrate_data.append({
-                'x': times[i],  # 时间（秒）
-                'y': heartrates[i]  # 心率
-            })
-    
-    # 处理配速数据（从速度计算）
-    if 'velocity_smooth' in streams and 'time' in streams:
-        times = streams['time'].data
-        velocities = streams['velocity_smooth'].data
-        
-        for i in range(0, len(times), 10):  # 每10个数据点取一个
-            if velocities[i] > 0:
-                # 计算配速（分钟/公里）
-                pace_min_per_km = 16.6667 / velocities[i]  # 1000 / 60 / velocity
-                
-                pace_data.append({
-                    'x': times[i],  # 时间（秒）
-                    'y': pace_min_per_km  # 配速（分钟/公里）
-                })
-    
-    # 处理海拔数据
-    if 'altitude' in streams and 'time' in streams:
-        times = streams['time'].data
-        altitudes = streams['altitude'].data
-        
-        for i in range(0, len(times), 10):  # 每10个数据点取一个
-            elevation_data.append({
-                'x': times[i],  # 时间（秒）
-                'y': altitudes[i]  # 海拔（米）
-            })
-    
-    return {
-        'heartrate_data': heartrate_data,
-        'pace_data': pace_data,
-        'elevation_data': elevation_data
+    def __init__(self, start_date, end_date, target=TARGET_PER_WINDOW, initial_days=INITIAL_WINDOW_DAYS,
+                 completed=()):
+        self.cursor = start_date
+        self.end_date = end_date
+        self.target = target
+        self.initial_days = initial_days
+        self.density = None
+        self.completed = sorted(completed)
+
+    def next_window(self):
+        """返回下一个 (开始时间, 结束时间)，日期范围已全部分配时返回None"""
+        for completed_start, completed_end in self.completed:
+            if completed_start <= self.cursor < completed_end:
+                self.cursor = completed_end
+        if self.cursor >= self.end_date:
+            return None
+        if self.density is None:
+            days = self.initial_days
+        elif self.density <= 0:
+            days = MAX_WINDOW_DAYS
+        else:
+            days = min(MAX_WINDOW_DAYS, max(MIN_WINDOW_DAYS, self.target / self.density))
+        window_end = min(self.cursor + timedelta(days=days), self.end_date)
+        for completed_start, _ in self.completed:
+            if self.cursor < completed_start < window_end:
+                window_end = completed_start
+                break
+        window = (self.cursor, window_end)
+        self.cursor = window_end
+        return window
+
+    def observe(self, window, count):
+        """记录一个窗口中的活动数，用指数滑动平均更新活动密度"""
+        days = max((window[1] - window[0]).total_seconds() / 86400, 1 / 24)
+        density = count / days
+        self.density = density if self.density is None else (self.density + density) / 2
+
+
+def fetch_window(credentials, window, max_retries=3, base_url=None):
+    """获取一个时间窗口内全部活动的原始汇总数据，失败时只重试失败的那一页"""
+    window_start, window_end = window
+    client = get_thread_client(credentials, base_url)
+    params = {
+        'per_page': PAGE_SIZE,
+        'after': to_epoch(window_start - WINDOW_OVERLAP),
+        'before': to_epoch(window_end),
     }
+    activities = []
+    page = 1
+    while True:
+        raw_activities = get_activity_page(client, {**params, 'page': page}, max_retries)
+        activities.extend(raw_activities)
+        if len(raw_activities) < PAGE_SIZE:
+            return activities
+        page += 1
 
-def get_activity_splits(client, activity_id):
-    """获取活动的公里分割数据"""
-    # 获取完整的活动详情，包括分割数据
-    activity_detail = client.get_activity(activity_id=activity_id, include_all_efforts=True)
-    return activity_detail
 
-def process_splits(activity):
-    """处理公里分割数据"""
-    splits = []
-    
-    # 获取公里分割数据
-    if hasattr(activity, 'splits_metric') and activity.splits_metric:
-        for i, split in enumerate(activity.splits_metric):
-            # 处理elapsed_time和moving_time，可能是timedelta对象
-            elapsed_time = getattr(split, 'elapsed_time', 0) or 0
-            if hasattr(elapsed_time, 'total_seconds'):
-                elapsed_time = elapsed_time.total_seconds()
-                
-            moving_time = getattr(split, 'moving_time', 0) or 0
-            if hasattr(moving_time, 'total_seconds'):
-                moving_time = moving_time.total_seconds()
-            
-            split_data = {
-                'distance': float(getattr(split, 'distance', 0) or 0),
-                'elapsed_time': float(elapsed_time),
-                'moving_time': float(moving_time),
-                'average_speed': float(getattr(split, 'average_speed', 0) or 0),
-                'pace': 16.6667 / float(getattr(split, 'average_speed', 0) or 1) if float(getattr(split, 'average_speed', 0) or 0) > 0 else 0,
-                'average_heartrate': float(getattr(split, 'average_heartrate', 0) or 0),
-                'elevation_difference': float(getattr(split, 'elevation_difference', 0) or 0),
-                'split_number': i + 1
-            }
-            splits.append(split_data)
-    
-    return splits
+def list_activities_in_windows(credentials, start_date, end_date, workers=4, max_retries=3, base_url=None,
+                               journal=None):
+    """
+    并发获取日期范围内的活动，逐个产出
 
-def create_markdown(activity, segments=None, stream_data=None, splits=None, laps=None):
-    try:
-        start_time = activity.start_date_local
-        if not start_time:
-            raise ValueError('活动开始时间不能为空')
+    同时在途的窗口数不超过workers，也不超过当前15分钟窗口剩余的读请求额度；
+    每个窗口完成后立即产出其中未出现过的活动，只保留已产出的活动ID用于去重，
+    调用方处理已产出的活动时其余窗口继续在后台获取。
+    传入进度日志时先重放日志中已完成的窗口，只获取其余的时间范围，完成的窗口写入日志。
+    所有窗口结束后，如有窗口在重试后仍然失败则抛出异常。
+    """
+    completed = journal.completed_windows() if journal is not None else ()
+    planner = WindowPlanner(start_date, end_date, completed=completed)
+    seen_ids = set()
+    failed = []
 
-        avg_speed = float(getattr(activity, 'average_speed', 0) or 0) * 3.6
-        max_speed = float(getattr(activity, 'max_speed', 0) or 0) * 3.6
-        distance = float(getattr(activity, 'distance', 0) or 0)
-        elevation = float(getattr(activity, 'total_elevation_gain', 0) or 0)
-        moving_time = getattr(activity, 'moving_time', None)
-        if moving_time:
-            try:
-                moving_time = moving_time.total_seconds()
-            except AttributeError:
-                # 如果total_seconds()方法不可用，尝试直接使用秒数
-                moving_time = getattr(moving_time, 'seconds', 0)
-        else:
-            moving_time = 0
-        avg_heartrate = float(getattr(activity, 'average_heartrate', 0) or 0)
-        max_heartrate = float(getattr(activity, 'max_heartrate', 0) or 0)
-        calories = float(getattr(activity, 'calories', 0) or 0)
+    def accept(window, raw_activities):
+        planner.observe(window, len(raw_activities))
+        new_activities = [raw for raw in raw_activities if raw['id'] not in seen_ids]
+        seen_ids.update(raw['id'] for raw in new_activities)
+        return [model.Activity.parse_obj(raw) for raw in new_activities]
 
-        avg_pace = 60 / avg_speed if avg_speed > 0 else 0
-        max_pace = 60 / max_speed if max_speed > 0 else 0
+    if journal is not None:
+        for window_start, window_end, raw_activities in journal.replay_windows():
+            yield from accept((window_start, window_end), raw_activities)
 
-        time_str = str(timedelta(seconds=int(moving_time)))
-        avg_pace_min = int(avg_pace)
-        avg_pace_sec = int((avg_pace % 1) * 60)
-        max_pace_min = int(max_pace)
-        max_pace_sec = int((max_pace % 1) * 60)
+    def in_flight_limit():
+        remaining = governor.headroom()['X-ReadRateLimit'][0] - governor.reserve
+        return max(1, min(workers, remaining))
 
-        # 构建frontmatter
-        frontmatter_lines = [
-            f"date: {start_time.strftime('%Y-%m-%d')}",
-            f"distance: {distance:.2f}",
-            f"duration: {moving_time}",
-            f"elevation: {elevation}",
-            f"avg_speed: {avg_speed:.2f}",
-            f"max_speed: {max_speed:.2f}",
-            f"avg_pace: {avg_pace:.2f}",
-            f"max_pace: {max_pace:.2f}",
-            f"avg_heartrate: {avg_heartrate:.1f}",
-            f"max_heartrate: {max_heartrate:.1f}",
-            f"calories: {calories:.1f}"
-        ]
-        
-        # 添加分段数据
-        if segments:
-            frontmatter_lines.append(f"segments: {json.dumps(segments)}")
-            
-        # 添加分割数据
-        if splits:
-            frontmatter_lines.append(f"splits: {json.dumps(splits)}")
-            
-        # 添加分圈数据
-        if laps:
-            frontmatter_lines.append(f"laps: {json.dumps(laps)}")
-        
-        # 添加流数据
-        if stream_data:
-            if stream_data.get('heartrate_data'):
-                frontmatter_lines.append(f"heartrate_data: {json.dumps(stream_data['heartrate_data'])}")
-            if stream_data.get('pace_data'):
-                frontmatter_lines.append(f"pace_data: {json.dumps(stream_data['pace_data'])}")
-            if stream_data.get('elevation_data'):
-                frontmatter_lines.append(f"elevation_data: {json.dumps(stream_data['elevation_data'])}")
-        
-        # 构建frontmatter部分
-        frontmatter = "---\n" + "\n".join(frontmatter_lines) + "\n---\n\n"
-        
-        # 构建Markdown内容
-        content = f"# {start_time.strftime('%Y年%m月%d日')} 跑步数据\n\n"
-        content += f"- 距离：{distance/1000:.2f}公里\n"
-        content += f"- 时长：{time_str}\n"
-        content += f"- 海拔：{elevation}米\n"
-        content += f"- 平均配速：{avg_pace_min}:{avg_pace_sec:02d}/公里\n"
-        content += f"- 最快配速：{max_pace_min}:{max_pace_sec:02d}/公里\n"
-        content += f"- 平均心率：{avg_heartrate:.1f}次/分钟\n"
-        content += f"- 最大心率：{max_heartrate:.1f}次/分钟\n"
-        content += f"- 卡路里消耗：{calories:.1f}千卡\n"
-        content += f"- 活动链接：https://www.strava.com/activities/{activity.id}\n"
-        
-        # 添加公里分割数据描述
-        if splits and len(splits) > 0:
-            content += "\n## 公里分割\n\n"
-            content += "| 公里 | 用时 | 配速 | 心率 | 海拔变化 |\n"
-            content += "|------|------|------|------|------|\n"
-            
-            for split in splits:
-                split_time = str(timedelta(seconds=int(split['moving_time'])))
-                pace_min = int(split['pace'])
-                pace_sec = int((split['pace'] % 1) * 60)
-                pace_str = f"{pace_min}:{pace_sec:02d}"
-                
-                content += f"| {split['split_number']} | {split_time} | {pace_str}/km | {int(split['average_heartrate'])} | {split['elevation_difference']:.1f}m |\n"
-            
-            content += "\n"
-        
-        # 添加分段数据描述
-        if segments and len(segments) > 0:
-            content += "\n## 分段数据\n\n"
-            for i, segment in enumerate(segments):
-                content += f"### {i+1}. {segment['name']}\n\n"
-                content += f"- 距离：{segment['distance']/1000:.2f}公里\n"
-                segment_time = str(timedelta(seconds=int(segment['elapsed_time'])))
-                content += f"- 用时：{segment_time}\n"
-                
-                if segment['average_grade']:
-                    content += f"- 平均坡度：{segment['average_grade']:.1f}%\n"
-                
-                if segment['maximum_grade']:
-                    content += f"- 最大坡度：{segment['maximum_grade']:.1f}%\n"
-                
-                if segment['average_heartrate']:
-                    content += f"- 平均心率：{segment['average_heartrate']:.1f}次/分钟\n"
-                
-                if segment['max_heartrate']:
-                    content += f"- 最大心率：{segment['max_heartrate']:.1f}次/分钟\n"
-                
-                content += "\n"
-        
-        return frontmatter + content
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        while True:
+            while len(pending) < in_flight_limit():
+                window = planner.next_window()
+                if window is None:
+                    break
+                pending[executor.submit(fetch_window, credentials, window, max_retries, base_url)] = window
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                window = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error('获取%s至%s的数据失败: %s', window[0].date(), window[1].date(), e)
+                    failed.append(window)
+                    continue
+                if journal is not None:
+                    journal.record_window(window[0], window[1], result)
+                new_activities = accept(window, result)
+                if result:
+                    logger.info('已获取%s至%s的数据%d条，共%d条记录',
+                                window[0].date(), window[1].date(), len(result), len(seen_ids))
+                yield from new_activities
+
+    if failed:
+        ranges = '，'.join(f'{window_start.date()}至{window_end.date()}' for window_start, window_end in failed)
+        raise RuntimeError(f'{len(failed)} 个时间窗口获取失败: {ranges}')
+
+
+def fetch_strava_activities(credentials, start_date, end_date, max_retries=3, base_url=None, workers=4, journal=None):
+    client = create_client(credentials, base_url)
+    
+    # 验证token
+    try:
+        athlete = client.get_athlete()
+        logger.info('认证成功，当前用户: %s %s', athlete.firstname, athlete.lastname)
     except Exception as e:
-        print(f'处理活动数据时出错: {str(e)}')
+        logger.error('认证失败: %s', e)
         raise
+    
+    # 返回的是生成器，各时间窗口在处理过程中并发获取
+    return list_activities_in_windows(credentials, start_date, end_date, workers, max_retries, base_url, journal)
 
 def main():
     parser = argparse.ArgumentParser(description='从Strava获取指定日期范围内的跑步数据')
@@ -384,8 +205,29 @@ def main():
     parser.add_argument('--no-splits', action='store_true', help='不获取公里分割数据')
     parser.add_argument('--no-laps', action='store_true', help='不获取分圈数据')
     parser.add_argument('--no-streams', action='store_true', help='不获取流数据（心率、配速、海拔）')
+    parser.add_argument('--workers', type=int, default=1, help='并发处理活动的线程数，默认为1（串行处理）')
+    parser.add_argument('--window-workers', type=int, default=4,
+                        help='并发获取活动列表的时间窗口数，窗口长度根据活动密度自动调整')
+    add_processing_arguments(parser)
+    add_engine_arguments(parser)
+    add_cache_arguments(parser)
+    add_change_detection_arguments(parser)
+    add_store_arguments(parser)
+    add_metrics_arguments(parser)
+    add_credential_arguments(parser)
+    add_resume_arguments(parser)
+    add_logging_arguments(parser)
     
     args = parser.parse_args()
+    setup_logging(args.verbose, args.quiet)
+    
+    if args.workers < 1:
+        parser.error('--workers 必须大于等于1')
+    if args.concurrency < 1:
+        parser.error('--concurrency 必须大于等于1')
+    if args.window_workers < 1:
+        parser.error('--window-workers 必须大于等于1')
+    configure_http(args)
     
     try:
         # 解析日期字符串
@@ -397,134 +239,77 @@ def main():
             current_date = datetime.now()
             if end_date > current_date:
                 end_date = current_date
-                print(f'结束日期已调整为当前日期: {end_date.strftime("%Y-%m-%d")}')
+                logger.info('结束日期已调整为当前日期: %s', end_date.strftime('%Y-%m-%d'))
             
             # 确保开始日期不晚于结束日期
             if start_date > end_date:
                 raise ValueError('开始日期不能晚于结束日期')
                 
         except ValueError as e:
-            print(f'日期格式错误: {str(e)}')
+            logger.error('日期格式错误: %s', e)
             sys.exit(1)
         
-        activities, new_refresh_token, access_token = fetch_strava_activities(
-            args.client_id,
-            args.client_secret,
-            args.refresh_token,
-            start_date,
-            end_date
-        )
-        
         # 创建runs目录
         script_dir = os.path.dirname(os.path.abspath(__file__))
         project_root = os.path.dirname(script_dir)
         runs_dir = os.path.join(project_root, 'content', 'runs')
-        os.makedirs(runs_dir, exist_ok=True)
         
-        # 创建客户端
-        client = Client(access_token=access_token)
+        cache = create_cache(args)
+        store = create_store(args)
+        manifest = SyncManifest.load_or_rebuild(runs_dir)
+        manifest.set_render_options(get_render_options(args))
+        failures = None
+        succeeded = False
         
-        # 保存活动数据
-        for activity in activities:
-            if activity.type != 'Run':
-                continue
-            
-            # 生成markdown文件名
-            start_time = activity.start_date_local
-            file_name = f"{activity.id}_{start_time.strftime('%Y-%m-%dT%H-%M-%S')}.md"
-            file_path = os.path.join(runs_dir, file_name)
-            
-            # 获取详细数据
-            segments = None
-            stream_data = None
-            
-            if not args.no_segments:
-                try:
-                    # 获取活动详情，包括分段数据
-                    activity_detail = get_activity_details(client, activity.id)
-                    segments = process_segment_efforts(activity_detail.segment_efforts)
-                    print(f'已获取活动 {activity.id} 的分段数据，共 {len(segments)} 个分段')
-                except Exception as e:
-                    print(f'获取活动 {activity.id} 分段数据失败: {str(e)}')
-            
-            if not args.no_streams:
-                try:
-                    # 获取活动流数据
-                    streams = get_activity_streams(client, activity.id)
-                    if streams:
-                        stream_data = process_stream_data(streams)
-                        print(f'已获取活动 {activity.id} 的流数据')
-                except Exception as e:
-                    print(f'获取活动 {activity.id} 流数据失败: {str(e)}')
-            
-            # 获取公里分割数据
-            splits = None
-            detailed_activity = None
-            if not args.no_splits:
-                try:
-                    # 获取详细的活动数据，包括分割信息
-                    detailed_activity = get_activity_splits(client, activity.id)
-                    splits = process_splits(detailed_activity)
-                    if splits:
-                        print(f'已获取活动 {activity.id} 的公里分割数据，共 {len(splits)} 个分割')
-                except Exception as e:
-                    print(f'获取活动 {activity.id} 公里分割数据失败: {str(e)}')
-            
-            # 获取分圈数据
-            laps = None
-            if not args.no_laps:
-                try:
-                    # 使用正确的API调用获取分圈数据
-                    if not detailed_activity:
-                        detailed_activity = client.get_activity(activity.id, include_all_efforts=True)
-                    
-                    # 如果有流数据，使用流数据计算分圈的心率
-                    if stream_data and 'heartrate_data' in stream_data and stream_data['heartrate_data']:
-                        # 使用流数据计算分圈的心率
-                        # 将流数据转换为process_laps_with_streams函数需要的格式
-                        streams = {}
-                        if 'heartrate_data' in stream_data and stream_data['heartrate_data']:
-                            times = [point['x'] for point in stream_data['heartrate_data']]
-                            heartrates = [point['y'] for point in stream_data['heartrate_data']]
-                            
-                            # 创建流数据对象
-                            class StreamData:
-                                def __init__(self, data):
-                                    self.data = data
-                                    
-                            streams['time'] = StreamData(times)
-                            streams['heartrate'] = StreamData(heartrates)
-                            
-                            # 使用流数据处理分圈数据
-                            laps = process_laps_with_streams(detailed_activity, streams)
-                        else:
-                            # 如果没有心率流数据，使用普通方法
-                            laps = process_laps(detailed_activity)
-                    else:
-                        # 如果没有流数据，使用普通方法
-                        laps = process_laps(detailed_activity)
-                        
-                    if laps:
-                        print(f'已获取活动 {activity.id} 的分圈数据，共 {len(laps)} 个分圈')
-                except Exception as e:
-                    print(f'获取活动 {activity.id} 分圈数据失败: {str(e)}')
-            
-            # 生成markdown内容并保存
-            try:
-                content = create_markdown(activity, segments, stream_data, splits, laps)
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                print(f'已保存活动数据：{file_name}')
-            except Exception as e:
-                print(f'保存活动 {activity.id} 失败: {str(e)}')
+        # 日期范围相同时才能从进度日志恢复
+        journal = open_journal(args, {
+            'script': 'fetch_strava_data_manual',
+            'start_date': args.start_date,
+            'end_date': args.end_date,
+        })
+        credentials = create_credentials(args)
+        
+        try:
+            if args.engine == 'async':
+                from async_engine import sync_activities_async
+                
+                # 异步引擎直接按页获取整个日期范围，无需分窗
+                os.makedirs(runs_dir, exist_ok=True)
+                failures = asyncio.run(sync_activities_async(credentials, runs_dir, args, cache, manifest, store,
+                                                             after=start_date, before=end_date, journal=journal))
+            else:
+                activities = fetch_strava_activities(
+                    credentials,
+                    start_date,
+                    end_date,
+                    base_url=args.base_url,
+                    workers=args.window_workers,
+                    journal=journal
+                )
+                os.makedirs(runs_dir, exist_ok=True)
+                
+                # 只处理跑步活动，边获取活动列表边处理；汇总指纹未变化的已同步活动直接跳过
+                runs = select_runs(activities, journal, None if args.ignore_fingerprints else manifest, runs_dir)
+                failures = process_runs(runs, credentials, runs_dir, args, cache, manifest, store, journal)
+            succeeded = True
+        finally:
+            # 同步成功结束时删除进度日志，否则保留以便 --resume 继续
+            journal.close(completed=succeeded)
+            # 先提交数据库中剩余的写入，再保存同步清单
+            if store is not None:
+                with metrics.stage('store'):
+                    store.close()
+            # 补录的活动同样记录到同步清单中
+            with metrics.stage('manifest'):
+                if manifest.save():
+                    logger.info('已更新同步清单')
+            write_metrics_report(args, cache, failures, succeeded)
     
-        print('\n数据同步完成！')
+        logger.info('\n数据同步完成！')
         
     except Exception as e:
-        print('数据同步失败:', str(e))
-        print('错误详情:')
-        import traceback
-        print(traceback.format_exc())
+        # 附带完整的错误堆栈
+        logger.exception('数据同步失败: %s', e)
         sys.exit(1)
 
 if __name__ == '__main__':
@@ -1,10 +1,12 @@
 import os
-import requests
 import webbrowser
 import argparse
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import parse_qs, urlparse
 from dotenv import load_dotenv
+from logging_setup import add_logging_arguments, get_logger, setup_logging
+from http_session import SessionFactory
+from rate_limit import RateLimitGovernor
 
 # 加载环境变量
 load_dotenv()
@@ -14,6 +16,11 @@ REDIRECT_URI = "http://localhost:8000/callback"
 AUTH_URL = "https://www.strava.com/oauth/authorize"
 TOKEN_URL = "https://www.strava.com/oauth/token"
 
+logger = get_logger('token')
+
+# 与同步脚本使用同样的会话：默认超时、gzip和5xx退避重试
+sessions = SessionFactory(RateLimitGovernor())
+
 class TokenHandler(BaseHTTPRequestHandler):
     # 使用类变量而不是实例变量
     client_id = None
@@ -25,11 +32,12 @@ class TokenHandler(BaseHTTPRequestHandler):
             code = query_components.get('code', [None])[0]
             
             if code:
-                print("收到授权码: ", code)
-                print("client_id: ", TokenHandler.client_id)
-                print("client_secret: ", TokenHandler.client_secret)
-                # 使用授权码获取访问令牌
-                response = requests.post(TOKEN_URL, data={
+                logger.info('收到授权码: %s', code)
+                logger.debug('client_id: %s', TokenHandler.client_id)
+                # 只输出client_secret的前几位用于核对
+                logger.debug('client_secret: %s...', (TokenHandler.client_secret or '')[:4])
+                # 使用授权码获取访问令牌；授权码只能使用一次，失败时不能自动重试，否则真正的错误会被400掩盖
+                response = sessions.create(max_retries=0).post(TOKEN_URL, data={
                     'client_id': TokenHandler.client_id,
                     'client_secret': TokenHandler.client_secret,
                     'code': code,
@@ -41,8 +49,8 @@ class TokenHandler(BaseHTTPRequestHandler):
                     refresh_token = token_data['refresh_token']
                     access_token = token_data['access_token']
                     
-                    print("已获取refresh_token: ", refresh_token)
-                    print("已获取access_token: ", access_token)
+                    logger.info('已获取refresh_token: %s', refresh_token)
+                    logger.info('已获取access_token: %s', access_token)
                     
                     self.send_response(200)
                     self.send_header('Content-type', 'text/html; charset=utf-8')
@@ -62,7 +70,7 @@ class TokenHandler(BaseHTTPRequestHandler):
                     '''
                     self.wfile.write(html_content.encode('utf-8'))
                 else:
-                    print("获取访问令牌失败响应: ", response.content)
+                    logger.error('获取访问令牌失败响应: %s', response.content)
                     self.send_response(400)
                     self.send_header('Content-type', 'text/html; charset=utf-8')
                     self.end_headers()
@@ -110,7 +118,7 @@ def main(client_id, client_secret):
     auth_url = f"{AUTH_URL}?" + "&".join(f"{k}={v}" for k, v in auth_params.items())
     
     # 打开浏览器进行授权
-    print("正在打开浏览器进行Strava授权...")
+    logger.info('正在打开浏览器进行Strava授权...')
     webbrowser.open(auth_url)
     
     # 设置TokenHandler的类变量
@@ -119,7 +127,7 @@ def main(client_id, client_secret):
     
     # 启动本地服务器接收回调
     server = HTTPServer(('localhost', 8000), TokenHandler)
-    print("等待授权回调...")
+    logger.info('等待授权回调...')
     server.handle_request()
 
 if __name__ == '__main__':
@@ -127,6 +135,8 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='获取Strava API的访问令牌')
     parser.add_argument('--client_id', required=True, help='Strava API的Client ID')
     parser.add_argument('--client_secret', required=True, help='Strava API的Client Secret')
+    add_logging_arguments(parser)
     args = parser.parse_args()
+    setup_logging(args.verbose, args.quiet)
     
     main(args.client_id, args.client_secret)
\ No newline at end of file
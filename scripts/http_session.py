@@ -0,0 +1,80 @@
+import threading
+
+from requests.adapters import HTTPAdapter
+
+from rate_limit import GovernedSession
+
+# 连接池中每个主机保持的连接数，应不小于并发请求的线程数
+DEFAULT_POOL_SIZE = 16
+
+# 连接超时和读取超时（秒）
+DEFAULT_TIMEOUT = (5, 30)
+
+
+class SessionFactory:
+    """
+    创建共享同一个连接池的GovernedSession
+
+    requests.Session本身不保证线程安全，每个线程仍使用自己的会话，但所有会话挂载同一个
+    HTTPAdapter：令牌刷新、活动列表、详情和流数据的请求复用同一组keep-alive连接，
+    TLS握手只在连接池需要新连接时进行。所有线程共享同一个实例。
+    """
+
+    def __init__(self, governor, metrics=None, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, max_retries=5):
+        self.governor = governor
+        self.metrics = metrics
+        self.max_retries = max_retries
+        # 不经过requests的连接（异步引擎的aiohttp连接池）的统计
+        self._external_connections = 0
+        self._external_requests = 0
+        self._lock = threading.Lock()
+        self.configure(pool_size, timeout)
+
+    def configure(self, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        """设置连接池大小和超时，之后创建的会话使用新的连接池"""
+        with self._lock:
+            self.pool_size = pool_size
+            self.timeout = timeout
+            # 连接池已满时等待空闲连接，而不是临时创建用完即关闭的连接
+            self._adapter = HTTPAdapter(pool_maxsize=pool_size, pool_block=True)
+
+    def create(self, base_url=None, credentials=None, max_retries=None):
+        """
+        创建一个经过限流器、使用共享连接池的会话
+
+        max_retries为None时使用工厂的重试次数；/oauth/token等非幂等的POST请求应传入0，
+        由调用方决定是否重试，避免服务端已处理请求后自动重发。
+        """
+        if max_retries is None:
+            max_retries = self.max_retries
+        session = GovernedSession(self.governor, max_retries=max_retries, base_url=base_url,
+                                  metrics=self.metrics, credentials=credentials, timeout=self.timeout)
+        session.headers['Accept-Encoding'] = 'gzip, deflate'
+        with self._lock:
+            session.mount('https://', self._adapter)
+            session.mount('http://', self._adapter)
+        return session
+
+    def record_connections(self, connections, requests):
+        """记录异步引擎等自行管理连接池的调用方新建的连接数和请求数"""
+        with self._lock:
+            self._external_connections += connections
+            self._external_requests += requests
+
+    def stats(self):
+        """连接池统计：新建的连接数和经过连接池的请求数，两者之差为复用连接的请求数"""
+        with self._lock:
+            pools = self._adapter.poolmanager.pools
+            connections = self._external_connections
+            requests = self._external_requests
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    connections += pool.num_connections
+                    requests += pool.num_requests
+        return {
+            'pool_size': self.pool_size,
+            'connections': connections,
+            'requests': requests,
+            'reused': max(0, requests - connections),
+        }
@@ -0,0 +1,40 @@
+import sys
+import logging
+
+# 同步脚本各模块日志记录器的公共前缀，例如 strava.fetch、strava.laps
+LOGGER_NAME = 'strava'
+
+# 默认只输出消息本身，与原来的打印输出一致；详细模式下附带时间、级别和线程
+DEFAULT_FORMAT = '%(message)s'
+VERBOSE_FORMAT = '%(asctime)s %(levelname)s [%(threadName)s] %(name)s: %(message)s'
+
+
+def get_logger(name):
+    """返回某个模块使用的日志记录器"""
+    return logging.getLogger(f'{LOGGER_NAME}.{name}')
+
+
+def add_logging_arguments(parser):
+    """添加日志级别相关的命令行参数"""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('-v', '--verbose', action='store_true',
+                       help='输出调试信息，包括每个活动的处理细节和活动、分圈对象的全部属性')
+    group.add_argument('-q', '--quiet', action='store_true', help='只输出警告和错误')
+
+
+def setup_logging(verbose=False, quiet=False):
+    """
+    配置同步脚本的日志输出
+
+    日志消息使用%格式的参数，只有达到输出级别时才会格式化；
+    未调用本函数时（例如被基准测试导入），只有警告和错误会输出到标准错误。
+    """
+    level = logging.DEBUG if verbose else logging.WARNING if quiet else logging.INFO
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(VERBOSE_FORMAT if verbose else DEFAULT_FORMAT))
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    logger.handlers[:] = [handler]
+    logger.propagate = False
+    return logger
@@ -1,25 +1,40 @@
+import logging
+
+from logging_setup import get_logger
+
+logger = get_logger('laps')
+
+
+def _log_attributes(title, obj, with_values=True):
+    """输出对象的全部公开属性，只在调试模式下调用"""
+    logger.debug(title)
+    for attr in dir(obj):
+        if attr.startswith('_') or attr in ['from_dict', 'to_dict']:
+            continue
+        if not with_values:
+            logger.debug('- %s', attr)
+            continue
+        try:
+            logger.debug('- %s: %s', attr, getattr(obj, attr))
+        except Exception as e:
+            logger.debug('- %s: 无法获取值 (%s)', attr, e)
+
+
 def process_laps(activity):
     """处理分圈数据"""
     laps = []
+    # 遍历对象属性的开销很大，只在 --verbose 时检查分圈数据的位置
+    debug = logger.isEnabledFor(logging.DEBUG)
     
-    # 打印活动对象的属性，检查分圈数据的位置
-    print("\n\n检查活动对象的属性:")
-    for attr in dir(activity):
-        if not attr.startswith('_'):
-            print(f"- {attr}")
+    if debug:
+        _log_attributes('\n\n检查活动对象的属性:', activity, with_values=False)
     
     # 获取分圈数据
     if hasattr(activity, 'laps') and activity.laps:
-        print(f"\n找到 {len(activity.laps)} 个分圈")
+        logger.debug('\n找到 %d 个分圈', len(activity.laps))
         for i, lap in enumerate(activity.laps):
-            print(f"\n分圈 {i+1} 的属性:")
-            for attr in dir(lap):
-                if not attr.startswith('_') and attr not in ['from_dict', 'to_dict']:
-                    try:
-                        value = getattr(lap, attr)
-                        print(f"- {attr}: {value}")
-                    except Exception as e:
-                        print(f"- {attr}: 无法获取值 ({str(e)})")
+            if debug:
+                _log_attributes(f'\n分圈 {i + 1} 的属性:', lap)
             
             # 处理elapsed_time和moving_time，可能是timedelta对象
             elapsed_time = getattr(lap, 'elapsed_time', 0) or 0
@@ -45,23 +60,23 @@ def process_laps(activity):
             for field in possible_avg_hr_fields:
                 if hasattr(lap, field) and getattr(lap, field) is not None:
                     avg_hr = float(getattr(lap, field))
-                    print(f"\n找到平均心率字段: {field} = {avg_hr}")
+                    logger.debug('\n找到平均心率字段: %s = %s', field, avg_hr)
                     break
                     
             for field in possible_max_hr_fields:
                 if hasattr(lap, field) and getattr(lap, field) is not None:
                     max_hr = float(getattr(lap, field))
-                    print(f"找到最大心率字段: {field} = {max_hr}")
+                    logger.debug('找到最大心率字段: %s = %s', field, max_hr)
                     break
             
             # 如果还是没有找到心率数据，尝试从其他数据源获取
             if avg_hr == 0 and hasattr(activity, 'average_heartrate') and activity.average_heartrate:
                 avg_hr = float(activity.average_heartrate)
-                print(f"\n使用活动的平均心率: {avg_hr}")
+                logger.debug('\n使用活动的平均心率: %s', avg_hr)
                 
             if max_hr == 0 and hasattr(activity, 'max_heartrate') and activity.max_heartrate:
                 max_hr = float(activity.max_heartrate)
-                print(f"使用活动的最大心率: {max_hr}")
+                logger.debug('使用活动的最大心率: %s', max_hr)
             
             lap_data = {
                 'lap_number': i + 1,
@@ -78,19 +93,13 @@ def process_laps(activity):
             }
             laps.append(lap_data)
     else:
-        print("\n活动对象中没有分圈数据")
+        logger.debug('\n活动对象中没有分圈数据')
         if hasattr(activity, 'splits_metric') and activity.splits_metric:
-            print(f"\n活动有 {len(activity.splits_metric)} 个公里分割数据，尝试使用这些数据作为分圈数据")
+            logger.debug('\n活动有 %d 个公里分割数据，尝试使用这些数据作为分圈数据', len(activity.splits_metric))
             # 如果没有分圈数据，尝试使用公里分割数据
             for i, split in enumerate(activity.splits_metric):
-                print(f"\n公里分割 {i+1} 的属性:")
-                for attr in dir(split):
-                    if not attr.startswith('_') and attr not in ['from_dict', 'to_dict']:
-                        try:
-                            value = getattr(split, attr)
-                            print(f"- {attr}: {value}")
-                        except Exception as e:
-                            print(f"- {attr}: 无法获取值 ({str(e)})")
+                if debug:
+                    _log_attributes(f'\n公里分割 {i + 1} 的属性:', split)
                 
                 # 处理elapsed_time和moving_time
                 elapsed_time = getattr(split, 'elapsed_time', 0) or 0
@@ -1,139 +1,158 @@
+from bisect import bisect_left, bisect_right
+
+from logging_setup import get_logger
+
+logger = get_logger('laps')
+
+
+def _stream_data(streams, stream_type):
+    """取出某个通道的原始数据列表，通道不存在时返回None"""
+    if not streams or stream_type not in streams:
+        return None
+    return streams[stream_type].data
+
+
+def _lap_bounds(lap, activity, times, full_resolution, elapsed_time):
+    """
+    计算分圈在流数据中的下标范围 [start, end)
+
+    流数据是完整分辨率时直接使用分圈的start_index/end_index；
+    否则根据分圈相对活动开始的时间偏移，在有序的时间数组上二分查找。
+    """
+    start_index = getattr(lap, 'start_index', None)
+    end_index = getattr(lap, 'end_index', None)
+    if full_resolution and start_index is not None and end_index is not None and end_index > start_index:
+        return start_index, min(end_index + 1, len(times))
+
+    lap_start_time = getattr(lap, 'start_date', None)
+    activity_start_time = getattr(activity, 'start_date', None)
+    if not lap_start_time or not activity_start_time:
+        return 0, 0
+
+    start_offset = (lap_start_time - activity_start_time).total_seconds()
+    end_offset = start_offset + elapsed_time
+    return bisect_left(times, start_offset), bisect_right(times, end_offset)
+
+
+def _lap_stream_stats(streams, start, end):
+    """在分圈对应的下标范围内计算心率、步频和海拔统计"""
+    stats = {}
+
+    heartrates = _stream_data(streams, 'heartrate')
+    if heartrates:
+        window = heartrates[start:end]
+        if window:
+            stats['average_heartrate'] = sum(window) / len(window)
+            stats['max_heartrate'] = float(max(window))
+
+    cadences = _stream_data(streams, 'cadence')
+    if cadences:
+        window = cadences[start:end]
+        if window:
+            stats['average_cadence'] = sum(window) / len(window)
+
+    altitudes = _stream_data(streams, 'altitude')
+    if altitudes:
+        window = altitudes[start:end]
+        if len(window) > 1:
+            stats['elevation_gain'] = sum(max(b - a, 0) for a, b in zip(window, window[1:]))
+
+    return stats
+
+
 def process_laps_with_streams(activity, streams=None):
     """
-    处理分圈数据，并使用流数据计算每个分圈的平均心率和最大心率
-    
+    处理分圈数据，并使用流数据计算每个分圈的心率、步频和海拔
+
     参数:
         activity: Strava活动对象
-        streams: 活动的流数据，包含心率、时间等信息
+        streams: 活动的原始流数据（以类型为键的Stream对象字典），需包含time通道
     
     返回:
         分圈数据列表
     """
-    laps = []
+    times = _stream_data(streams, 'time')
     
     # 如果没有流数据，则使用默认方法处理
-    if not streams or 'heartrate' not in streams or 'time' not in streams:
+    if not times:
+        logger.debug('活动 %s 没有时间流数据，分圈不使用流数据计算', getattr(activity, 'id', None))
         return process_laps(activity)
     
-    # 提取心率和时间数据
-    times = streams['time'].data
-    heartrates = streams['heartrate'].data
+    # 活动对象中没有分圈数据，使用默认方法处理
+    if not (hasattr(activity, 'laps') and activity.laps):
+        return process_laps(activity)
     
-    # 获取分圈数据
-    if hasattr(activity, 'laps') and activity.laps:
-        print(f"\n找到 {len(activity.laps)} 个分圈")
-        for i, lap in enumerate(activity.laps):
-            # 处理elapsed_time和moving_time，可能是timedelta对象
-            elapsed_time = getattr(lap, 'elapsed_time', 0) or 0
-            if hasattr(elapsed_time, 'total_seconds'):
-                elapsed_time = elapsed_time.total_seconds()
-                
-            moving_time = getattr(lap, 'moving_time', 0) or 0
-            if hasattr(moving_time, 'total_seconds'):
-                moving_time = moving_time.total_seconds()
-            
-            # 计算配速 (分钟/公里)
-            avg_speed = float(getattr(lap, 'average_speed', 0) or 0)
-            pace = 16.6667 / avg_speed if avg_speed > 0 else 0
-            
-            # 获取分圈的开始时间（相对于活动开始的秒数）
-            start_index = getattr(lap, 'start_index', 0) or 0
-            end_index = getattr(lap, 'end_index', 0) or 0
-            
-            # 如果没有start_index或end_index，尝试使用时间计算
-            if start_index == 0 or end_index == 0:
-                # 获取分圈和活动的开始时间
-                lap_start_time = getattr(lap, 'start_date', None)
-                activity_start_time = getattr(activity, 'start_date', None)
-                
-                if lap_start_time and activity_start_time:
-                    # 计算分圈开始时间相对于活动开始时间的偏移（秒）
-                    try:
-                        time_offset = (lap_start_time - activity_start_time).total_seconds()
-                        # 找到最接近这个时间偏移的时间点索引
-                        for j, t in enumerate(times):
-                            if t >= time_offset:
-                                start_index = j
-                                break
-                        # 结束索引 = 开始索引 + 持续时间对应的数据点数
-                        end_index = start_index
-                        for j in range(start_index, len(times)):
-                            if times[j] >= time_offset + elapsed_time:
-                                end_index = j
-                                break
-                    except Exception as e:
-                        pass
-            
-            # 计算分圈的心率数据
-            avg_hr = 0
-            max_hr = 0
-            hr_data_points = []
+    # 完整分辨率的流数据可以直接用分圈的start_index/end_index切片
+    original_size = getattr(streams['time'], 'original_size', None)
+    full_resolution = original_size is not None and original_size == len(times)
+    if not full_resolution:
+        logger.debug('活动 %s 的流数据不是完整分辨率（%d/%s个点），按时间查找分圈范围',
+                     getattr(activity, 'id', None), len(times), original_size)
+    
+    laps = []
+    for i, lap in enumerate(activity.laps):
+        # 处理elapsed_time和moving_time，可能是timedelta对象
+        elapsed_time = getattr(lap, 'elapsed_time', 0) or 0
+        if hasattr(elapsed_time, 'total_seconds'):
+            elapsed_time = elapsed_time.total_seconds()
             
-            # 获取分圈的开始和结束时间
-            lap_start_time = getattr(lap, 'start_date', None)
-            activity_start_time = getattr(activity, 'start_date', None)
+        moving_time = getattr(lap, 'moving_time', 0) or 0
+        if hasattr(moving_time, 'total_seconds'):
+            moving_time = moving_time.total_seconds()
+        
+        # 计算配速 (分钟/公里)
+        avg_speed = float(getattr(lap, 'average_speed', 0) or 0)
+        pace = 16.6667 / avg_speed if avg_speed > 0 else 0
+        
+        start, end = _lap_bounds(lap, activity, times, full_resolution, float(elapsed_time))
+        stats = _lap_stream_stats(streams, start, end)
+        
+        avg_hr = stats.get('average_heartrate', 0.0)
+        max_hr = stats.get('max_heartrate', 0.0)
+        
+        # 如果没有从流数据中获取到心率，尝试从分圈对象或活动对象中获取
+        if avg_hr == 0:
+            # 检查多种可能的心率字段名
+            possible_avg_hr_fields = ['average_heartrate', 'avg_heartrate', 'average_heart_rate', 'avg_heart_rate']
+            possible_max_hr_fields = ['max_heartrate', 'maximum_heartrate', 'max_heart_rate', 'maximum_heart_rate']
             
-            if lap_start_time and activity_start_time:
-                try:
-                    # 计算分圈开始时间相对于活动开始时间的偏移（秒）
-                    start_offset = (lap_start_time - activity_start_time).total_seconds()
-                    end_offset = start_offset + elapsed_time
-                    
-                    # 从流数据中提取对应时间范围内的心率数据
-                    for j in range(len(times)):
-                        if times[j] >= start_offset and times[j] <= end_offset:
-                            hr_data_points.append(heartrates[j])
+            for field in possible_avg_hr_fields:
+                if hasattr(lap, field) and getattr(lap, field) is not None:
+                    avg_hr = float(getattr(lap, field))
+                    break
                     
-                    if hr_data_points:
-                        avg_hr = sum(hr_data_points) / len(hr_data_points)
-                        max_hr = max(hr_data_points)
-                except Exception as e:
-                    pass
+            for field in possible_max_hr_fields:
+                if hasattr(lap, field) and getattr(lap, field) is not None:
+                    max_hr = float(getattr(lap, field))
+                    break
             
-            # 如果没有从流数据中获取到心率，尝试从分圈对象或活动对象中获取
-            if avg_hr == 0:
-                # 检查多种可能的心率字段名
-                possible_avg_hr_fields = ['average_heartrate', 'avg_heartrate', 'average_heart_rate', 'avg_heart_rate']
-                possible_max_hr_fields = ['max_heartrate', 'maximum_heartrate', 'max_heart_rate', 'maximum_heart_rate']
-                
-                for field in possible_avg_hr_fields:
-                    if hasattr(lap, field) and getattr(lap, field) is not None:
-                        avg_hr = float(getattr(lap, field))
-                        pass
-                        break
-                        
-                for field in possible_max_hr_fields:
-                    if hasattr(lap, field) and getattr(lap, field) is not None:
-                        max_hr = float(getattr(lap, field))
-                        pass
-                        break
+            # 如果还是没有找到心率数据，尝试从活动对象获取
+            if avg_hr == 0 and hasattr(activity, 'average_heartrate') and activity.average_heartrate:
+                avg_hr = float(activity.average_heartrate)
                 
-                # 如果还是没有找到心率数据，尝试从活动对象获取
-                if avg_hr == 0 and hasattr(activity, 'average_heartrate') and activity.average_heartrate:
-                    avg_hr = float(activity.average_heartrate)
-                    pass
-                    
-                if max_hr == 0 and hasattr(activity, 'max_heartrate') and activity.max_heartrate:
-                    max_hr = float(activity.max_heartrate)
-                    pass
-            
-            lap_data = {
-                'lap_number': i + 1,
-                'name': getattr(lap, 'name', f"Lap {i + 1}"),
-                'distance': float(getattr(lap, 'distance', 0) or 0),
-                'elapsed_time': float(elapsed_time),
-                'moving_time': float(moving_time),
-                'average_speed': avg_speed,
-                'pace': pace,
-                'average_heartrate': avg_hr,
-                'max_heartrate': max_hr,
-                'start_date': str(getattr(lap, 'start_date_local', '')),
-                'elevation_difference': float(getattr(lap, 'total_elevation_gain', 0) or 0)
-            }
-            laps.append(lap_data)
-    else:
-        # 活动对象中没有分圈数据，使用默认方法处理
-        return process_laps(activity)
+            if max_hr == 0 and hasattr(activity, 'max_heartrate') and activity.max_heartrate:
+                max_hr = float(activity.max_heartrate)
+        
+        # 步频优先使用流数据，否则使用分圈对象中的平均步频
+        avg_cadence = stats.get('average_cadence', float(getattr(lap, 'average_cadence', 0) or 0))
+        
+        lap_data = {
+            'lap_number': i + 1,
+            'name': getattr(lap, 'name', f"Lap {i + 1}"),
+            'distance': float(getattr(lap, 'distance', 0) or 0),
+            'elapsed_time': float(elapsed_time),
+            'moving_time': float(moving_time),
+            'average_speed': avg_speed,
+            'pace': pace,
+            'average_heartrate': avg_hr,
+            'max_heartrate': max_hr,
+            'average_cadence': avg_cadence,
+            'start_date': str(getattr(lap, 'start_date_local', '')),
+            'elevation_difference': float(getattr(lap, 'total_elevation_gain', 0) or 0),
+            # 由海拔流数据计算的累计爬升，与Strava分圈数据中的elevation_difference分开保存
+            'elevation_gain': stats.get('elevation_gain')
+        }
+        laps.append(lap_data)
     
     return laps
 
@@ -192,14 +211,18 @@ def process_laps(activity):
                 'pace': pace,
                 'average_heartrate': avg_hr,
                 'max_heartrate': max_hr,
+                'average_cadence': float(getattr(lap, 'average_cadence', 0) or 0),
                 'start_date': str(getattr(lap, 'start_date_local', '')),
-                'elevation_difference': float(getattr(lap, 'total_elevation_gain', 0) or 0)
+                'elevation_difference': float(getattr(lap, 'total_elevation_gain', 0) or 0),
+                'elevation_gain': None  # 没有海拔流数据
             }
             laps.append(lap_data)
     else:
         # 活动对象中没有分圈数据
         if hasattr(activity, 'splits_metric') and activity.splits_metric:
             # 如果没有分圈数据，尝试使用公里分割数据
+            logger.debug('活动 %s 没有分圈数据，使用 %d 个公里分割代替',
+                         getattr(activity, 'id', None), len(activity.splits_metric))
             for i, split in enumerate(activity.splits_metric):
                 # 处理elapsed_time和moving_time
                 elapsed_time = getattr(split, 'elapsed_time', 0) or 0
@@ -226,9 +249,11 @@ def process_laps(activity):
                     'average_speed': avg_speed,
                     'pace': pace,
                     'average_heartrate': avg_hr,
-                    'max_heartrate': 0,  # 分割数据通常没有最大心率
+                    'max_heartrate': 0.0,  # 分割数据通常没有最大心率
+                    'average_cadence': 0.0,  # 分割数据没有步频
                     'start_date': '',  # 分割数据通常没有开始时间
-                    'elevation_difference': float(getattr(split, 'elevation_difference', 0) or 0)
+                    'elevation_difference': float(getattr(split, 'elevation_difference', 0) or 0),
+                    'elevation_gain': None
                 }
                 laps.append(lap_data)
     
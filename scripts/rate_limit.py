@@ -0,0 +1,243 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+import requests
+
+from logging_setup import get_logger
+
+logger = get_logger('rate_limit')
+
+
+# Strava API的默认限额（15分钟窗口, 每日窗口），在收到响应头之前使用
+DEFAULT_LIMITS = {
+    'X-RateLimit': (200, 2000),
+    'X-ReadRateLimit': (100, 1000),
+}
+
+# 需要退避重试的HTTP状态码
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Strava服务地址，stravalib和令牌接口的请求都以它开头
+STRAVA_BASE_URL = 'https://www.strava.com'
+
+
+class _Window:
+    """固定时间窗口的令牌桶，令牌数 = 限额 - 已用量，在窗口边界处补满"""
+
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+        self.usage = 0
+        self.reset_at = self._next_reset(time.time())
+
+    def _next_reset(self, now):
+        # Strava的15分钟窗口对齐到整刻钟，每日窗口对齐到UTC零点
+        return (int(now) // self.period + 1) * self.period
+
+    def roll(self, now):
+        if now >= self.reset_at:
+            self.usage = 0
+            self.reset_at = self._next_reset(now)
+
+    def remaining(self):
+        return self.limit - self.usage
+
+
+class RateLimitGovernor:
+    """
+    根据Strava响应头控制请求速率的限流器
+
+    对15分钟窗口和每日窗口分别维护令牌桶，每次请求前调用acquire()获取令牌，
+    令牌不足时阻塞到窗口重置；每次响应后调用update()用X-RateLimit-Limit、
+    X-RateLimit-Usage（以及读请求专用的X-ReadRateLimit-*）校准本地计数。
+    所有线程共享同一个实例。
+    """
+
+    def __init__(self, reserve=2, max_backoff=60):
+        # reserve为每个窗口预留的请求数，避免并发请求恰好越过限额
+        self.reserve = reserve
+        self.max_backoff = max_backoff
+        self.retries = 0
+        self.throttled_seconds = 0.0
+        self._lock = threading.Lock()
+        self._windows = {
+            prefix: (_Window(short_limit, 900), _Window(long_limit, 86400))
+            for prefix, (short_limit, long_limit) in DEFAULT_LIMITS.items()
+        }
+
+    def try_acquire(self):
+        """尝试获取一个请求令牌，成功返回0，否则返回需要等待的秒数"""
+        with self._lock:
+            now = time.time()
+            wait_until = 0
+            for windows in self._windows.values():
+                for window in windows:
+                    window.roll(now)
+                    if window.remaining() <= self.reserve:
+                        wait_until = max(wait_until, window.reset_at)
+            if wait_until:
+                return wait_until - now + random.uniform(0.5, 2)
+            for windows in self._windows.values():
+                for window in windows:
+                    window.usage += 1
+            return 0
+
+    def acquire(self):
+        """获取一个请求令牌，所有窗口都有剩余额度时才返回"""
+        while True:
+            delay = self.try_acquire()
+            if not delay:
+                return
+            logger.warning('已接近Strava API限额，等待%d秒后继续...', delay)
+            self._sleep(delay)
+
+    def update(self, headers):
+        """根据响应头校准各窗口的限额和用量"""
+        with self._lock:
+            now = time.time()
+            for prefix, windows in self._windows.items():
+                limits = _parse_pair(headers.get(f'{prefix}-Limit'))
+                usages = _parse_pair(headers.get(f'{prefix}-Usage'))
+                if not limits or not usages:
+                    continue
+                for window, limit, usage in zip(windows, limits, usages):
+                    window.roll(now)
+                    window.limit = limit
+                    # 服务器的用量不包含仍在进行中的请求，取两者的较大值
+                    window.usage = max(window.usage, usage)
+
+    def headroom(self):
+        """返回各窗口的剩余请求数"""
+        with self._lock:
+            now = time.time()
+            result = {}
+            for prefix, (short_window, long_window) in self._windows.items():
+                short_window.roll(now)
+                long_window.roll(now)
+                result[prefix] = (short_window.remaining(), long_window.remaining())
+            return result
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """计算第attempt次失败后的等待时间：优先遵循Retry-After，否则使用带随机抖动的指数退避"""
+        with self._lock:
+            self.retries += 1
+        if retry_after is not None:
+            return retry_after + random.uniform(0, 1)
+        return random.uniform(0, min(self.max_backoff, 2 ** (attempt + 1)))
+
+    def backoff(self, attempt, retry_after=None):
+        """第attempt次失败后退避等待"""
+        self._sleep(self.backoff_delay(attempt, retry_after))
+
+    def rate_limited_delay(self, headers, attempt):
+        """计算429响应后的等待时间：额度已用尽时等到窗口重置，否则按Retry-After或退避"""
+        retry_after = _parse_retry_after(headers.get('Retry-After'))
+        if retry_after is None:
+            self.update(headers)
+            with self._lock:
+                reset_at = [
+                    window.reset_at
+                    for windows in self._windows.values()
+                    for window in windows
+                    if window.remaining() <= 0
+                ]
+            if reset_at:
+                retry_after = min(reset_at) - time.time()
+        return self.backoff_delay(attempt, retry_after)
+
+    def rate_limited(self, response, attempt):
+        """处理429响应"""
+        self._sleep(self.rate_limited_delay(response.headers, attempt))
+
+    def record_wait(self, delay):
+        """记录限流等待的时长（供异步调用方在自行等待后使用）"""
+        with self._lock:
+            self.throttled_seconds += max(0, delay)
+
+    def _sleep(self, delay):
+        delay = max(0, delay)
+        self.record_wait(delay)
+        time.sleep(delay)
+
+
+class GovernedSession(requests.Session):
+    """
+    每个请求都经过限流器的requests会话，自动处理429和5xx重试
+
+    指定base_url时，发往Strava的请求改发到该地址，例如本地的模拟服务；
+    指定metrics时，每次请求（包括重试）都按接口记录到同步指标中；
+    指定credentials（CredentialStore）时，每次请求使用其中当前有效的access_token，
+    令牌被拒绝（HTTP 401）时刷新后重试一次，长时间的回填不会因令牌过期而中断；
+    timeout为未单独指定超时的请求使用的默认超时。
+    """
+
+    def __init__(self, governor, max_retries=5, base_url=None, metrics=None, credentials=None, timeout=None):
+        super().__init__()
+        self.governor = governor
+        self.max_retries = max_retries
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.metrics = metrics
+        self.credentials = credentials
+        self.timeout = timeout
+
+    def request(self, method, url, *args, **kwargs):
+        if self.base_url and url.startswith(STRAVA_BASE_URL):
+            url = self.base_url + url[len(STRAVA_BASE_URL):]
+        if self.timeout is not None:
+            kwargs.setdefault('timeout', self.timeout)
+        # stravalib把access_token放在查询参数中，没有令牌参数的请求（例如刷新令牌）原样发送
+        params = kwargs.get('params')
+        if self.credentials is None or not params or 'access_token' not in params:
+            return super().request(method, url, *args, **kwargs)
+
+        for attempt in range(2):
+            access_token = self.credentials.access_token()
+            params['access_token'] = access_token
+            response = super().request(method, url, *args, **kwargs)
+            if response.status_code != 401 or attempt:
+                return response
+            logger.warning('access_token已失效，刷新后重试...')
+            self.credentials.invalidate(access_token)
+        return response
+
+    def send(self, request, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self.governor.acquire()
+            response = super().send(request, **kwargs)
+            self.governor.update(response.headers)
+            if self.metrics is not None:
+                self.metrics.record_request(request.url, response.status_code, len(response.content))
+
+            if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                return response
+
+            logger.warning('请求返回HTTP %d（第%d次），退避后重试...', response.status_code, attempt + 1)
+            if response.status_code == 429:
+                self.governor.rate_limited(response, attempt)
+            else:
+                self.governor.backoff(attempt)
+        return response
+
+
+def _parse_pair(value):
+    if not value:
+        return None
+    try:
+        return [int(part.strip()) for part in value.split(',')]
+    except ValueError:
+        return None
+
+
+def _parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
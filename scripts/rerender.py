@@ -0,0 +1,94 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from activity_cache import ActivityCache
+from activity_store import snapshot_activity
+from fetch_strava_data import (
+    load_activity_detail,
+    load_activity_streams,
+    load_activity_summary,
+    metrics,
+    process_activity_data,
+    render_processed,
+    write_run_file,
+    write_stats,
+)
+from logging_setup import get_logger
+
+logger = get_logger('rerender')
+
+# 每次分发给工作进程的活动数，减少进程间通信的次数
+CHUNK_SIZE = 16
+
+# 工作进程中的缓存和命令行参数，由_init_worker初始化
+_worker_cache = None
+_worker_args = None
+
+
+def _init_worker(cache_dir, args):
+    global _worker_cache, _worker_args
+    _worker_cache = ActivityCache(cache_dir)
+    _worker_args = args
+
+
+def _process_cached_activity(activity_id):
+    """
+    在工作进程中从缓存读取活动详情和流数据并完成处理
+
+    返回 (活动ID, 活动记录, 错误信息, 耗时)，缓存中没有活动详情时活动记录为None。
+    """
+    started = time.perf_counter()
+    try:
+        raw = _worker_cache.get('activities', activity_id, ignore_freshness=True)
+        if raw is None:
+            return activity_id, None, '缓存中没有活动详情', time.perf_counter() - started
+
+        activity = load_activity_summary(raw)
+        activity_detail = load_activity_detail(None, raw)
+        streams = None
+        if not _worker_args.no_streams:
+            raw_streams = _worker_cache.get('streams', activity_id, ignore_freshness=True)
+            if raw_streams is not None:
+                streams = load_activity_streams(raw_streams)
+
+        record = process_activity_data(activity, activity_detail, streams, _worker_args)
+        # stravalib的活动对象无法在进程间传递，只返回生成markdown需要的汇总字段
+        record.activity = snapshot_activity(record.activity)
+        return activity_id, record, None, time.perf_counter() - started
+    except Exception as e:
+        return activity_id, None, str(e), time.perf_counter() - started
+
+
+def rerender_runs(runs_dir, args, manifest, store=None, workers=None):
+    """
+    只使用本地缓存的API响应重新生成同步清单中的全部跑步数据文件，不访问网络
+
+    解析原始响应、计算分段、图表和分圈数据由进程池并行完成；
+    写入数据库、生成markdown和写文件在主进程中依次进行，内容未变化的文件不会重写。
+    返回无法重新生成的活动列表。
+    """
+    activity_ids = sorted(manifest.activities, key=int)
+    workers = workers or os.cpu_count() or 1
+    logger.info('使用 %d 个进程从缓存重新生成 %d 条跑步记录', workers, len(activity_ids))
+
+    failures = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(args.cache_dir, args)) as executor:
+        results = executor.map(_process_cached_activity, activity_ids, chunksize=CHUNK_SIZE)
+        for activity_id, record, error, seconds in results:
+            # 工作进程中的耗时无法直接记入主进程的同步指标，随结果一起返回
+            metrics.add_stage('process', seconds)
+            if record is None:
+                failures.append((activity_id, error))
+                write_stats.add('skipped')
+                continue
+            content, sidecar = render_processed(record, args, store)
+            write_run_file(runs_dir, record.activity, content, manifest, sidecar)
+
+    logger.info('\n%s', write_stats.summary())
+    if failures:
+        logger.warning('\n共有 %d 条活动无法从缓存重新生成:', len(failures))
+        for activity_id, error in failures:
+            logger.warning('- %s: %s', activity_id, error)
+    return failures
@@ -0,0 +1,170 @@
+import os
+import json
+import tempfile
+from datetime import date
+
+ROLLUPS_VERSION = 2
+
+# 汇总的时间粒度：按天（日历）、ISO周、月和年
+PERIODS = ('days', 'weeks', 'months', 'years')
+
+# 每个汇总桶中累加的字段，全部是可加减的总和，平均值在读取时计算（与首页原来的算法一致）：
+#   runs: 跑步次数        distance: 总距离（公里）  duration: 总时长（秒）  elevation: 总爬升（米）
+#   pace_sum / hr_sum: 每次跑步平均配速、平均心率的总和，除以runs得到月度、年度的平均值
+#   pace_weighted: 按距离加权的配速总和，除以distance得到每天的平均配速
+#   hr_weighted / hr_distance: 按距离加权的心率总和及有心率数据的距离，相除得到每天的平均心率
+BUCKET_FIELDS = (
+    'runs', 'distance', 'duration', 'elevation',
+    'pace_sum', 'hr_sum', 'pace_weighted', 'hr_weighted', 'hr_distance'
+)
+
+# 从frontmatter中读取的汇总字段
+SUMMARY_FIELDS = ('date', 'distance', 'duration', 'elevation', 'avg_pace', 'avg_heartrate')
+
+
+def get_rollups_path(runs_dir):
+    """汇总数据与同步清单一样保存在runs目录的上一级"""
+    return os.path.join(os.path.dirname(runs_dir), 'rollups.json')
+
+
+def activity_summary(activity):
+    """提取汇总需要的字段，取值和精度与create_markdown写入frontmatter的一致"""
+    avg_speed = float(getattr(activity, 'average_speed', 0) or 0) * 3.6
+    moving_time = getattr(activity, 'moving_time', None)
+    if moving_time and hasattr(moving_time, 'total_seconds'):
+        moving_time = moving_time.total_seconds()
+    return {
+        'date': activity.start_date_local.strftime('%Y-%m-%d'),
+        'distance': round(float(getattr(activity, 'distance', 0) or 0), 2),
+        'duration': float(moving_time or 0),
+        'elevation': float(getattr(activity, 'total_elevation_gain', 0) or 0),
+        'avg_pace': round(60 / avg_speed, 2) if avg_speed > 0 else 0,
+        'avg_heartrate': round(float(getattr(activity, 'average_heartrate', 0) or 0), 1)
+    }
+
+
+def parse_summary(content):
+    """从markdown的frontmatter中读取汇总字段，重建同步清单时使用"""
+    summary = {}
+    lines = content.split('\n')
+    if not lines or lines[0] != '---':
+        return None
+    for line in lines[1:]:
+        if line == '---':
+            break
+        key, _, value = line.partition(': ')
+        if key not in SUMMARY_FIELDS:
+            continue
+        if key == 'date':
+            summary[key] = value.strip()
+        else:
+            try:
+                summary[key] = float(value)
+            except ValueError:
+                summary[key] = 0
+    if 'date' not in summary:
+        return None
+    return summary
+
+
+def period_keys(date_str):
+    """返回某一天所属的各个汇总桶的键"""
+    day = date.fromisoformat(date_str)
+    iso_year, iso_week, _ = day.isocalendar()
+    return {
+        'days': date_str,
+        'weeks': f'{iso_year}-W{iso_week:02d}',
+        'months': date_str[:7],
+        'years': date_str[:4]
+    }
+
+
+class Rollups:
+    """
+    首页使用的跑步数据汇总
+
+    按天、周、月、年维护距离、时长、爬升、次数以及配速和心率的总和，
+    新增或更新一条活动时只需修改它所属的四个汇总桶，不必重新遍历全部活动。
+    线程安全由持有它的同步清单负责。
+    """
+
+    def __init__(self, path, buckets=None):
+        self.path = path
+        self.buckets = buckets or {period: {} for period in PERIODS}
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path):
+        """读取汇总文件，文件不存在或格式不正确时返回None"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != ROLLUPS_VERSION:
+            return None
+        return cls(path, {period: data.get(period) or {} for period in PERIODS})
+
+    @classmethod
+    def build(cls, path, summaries):
+        """根据全部活动的汇总字段重新计算"""
+        rollups = cls(path)
+        for summary in summaries:
+            if summary:
+                rollups._apply(summary, 1)
+        rollups.dirty = True
+        return rollups
+
+    def _apply(self, summary, sign):
+        distance = summary.get('distance', 0) / 1000
+        avg_pace = summary.get('avg_pace') or 0
+        avg_heartrate = summary.get('avg_heartrate') or 0
+        delta = {
+            'runs': 1,
+            'distance': distance,
+            'duration': summary.get('duration', 0),
+            'elevation': summary.get('elevation', 0),
+            'pace_sum': avg_pace,
+            'hr_sum': avg_heartrate,
+            'pace_weighted': avg_pace * distance,
+            'hr_weighted': avg_heartrate * distance,
+            'hr_distance': distance if avg_heartrate else 0
+        }
+        for period, key in period_keys(summary['date']).items():
+            bucket = self.buckets[period].setdefault(key, dict.fromkeys(BUCKET_FIELDS, 0))
+            for field, value in delta.items():
+                # 保留有限的小数位，避免反复加减累积浮点误差
+                bucket[field] = round(bucket.get(field, 0) + sign * value, 3)
+            if bucket['runs'] <= 0:
+                del self.buckets[period][key]
+
+    def update(self, previous, summary):
+        """用活动的新汇总字段替换旧值，两者相同时不做任何修改"""
+        if previous == summary:
+            return
+        if previous:
+            self._apply(previous, -1)
+        if summary:
+            self._apply(summary, 1)
+        self.dirty = True
+
+    def save(self):
+        """有变更时通过临时文件加重命名原子地写回汇总文件"""
+        if not self.dirty:
+            return False
+        data = {'version': ROLLUPS_VERSION, **self.buckets}
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+                f.write('\n')
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.dirty = False
+        return True
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import threading
+
+from sync_manifest import content_hash
+
+
+class WriteStats:
+    """统计本次同步中写入、未变化和跳过的跑步数据文件数"""
+
+    def __init__(self):
+        self.written = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def add(self, result):
+        with self._lock:
+            setattr(self, result, getattr(self, result) + 1)
+
+    def summary(self):
+        return f'写入 {self.written} 个文件，内容未变化 {self.unchanged} 个，跳过 {self.skipped} 个'
+
+
+def write_atomic(file_path, content):
+    """通过临时文件加重命名写入文件，避免中途失败留下不完整的文件"""
+    directory = os.path.dirname(file_path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        # 内容为bytes时按二进制写入
+        with (os.fdopen(fd, 'wb') if isinstance(content, bytes) else os.fdopen(fd, 'w', encoding='utf-8')) as f:
+            f.write(content)
+        # mkstemp创建的文件权限为600，改为普通文件的默认权限
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, file_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_if_changed(file_path, content, known_hash=None):
+    """
+    只在内容变化时写入文件
+
+    known_hash为同步清单中记录的哈希值，与新内容一致且文件存在时无需读取磁盘；
+    否则与磁盘上的文件内容比较。返回 (是否写入, 新内容的哈希值)。
+    """
+    digest = content_hash(content)
+    if os.path.exists(file_path):
+        if known_hash == digest:
+            return False, digest
+        try:
+            with (open(file_path, 'rb') if isinstance(content, bytes) else open(file_path, 'r', encoding='utf-8')) as f:
+                if content_hash(f.read()) == digest:
+                    return False, digest
+        except (OSError, UnicodeDecodeError):
+            pass
+    write_atomic(file_path, content)
+    return True, digest
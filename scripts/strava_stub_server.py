@@ -0,0 +1,371 @@
+import os
+import re
+import json
+import time
+import random
+import signal
+import argparse
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from activity_cache import ActivityCache
+from synthetic_activities import SyntheticHistory, summary_from_detail
+
+# 服务端生成的活动详情和流数据的缓存条数，详情和流数据通常被先后请求
+PAYLOAD_CACHE_SIZE = 256
+
+ACTIVITY_PATH = re.compile(r'^/api/v3/activities/(\d+)$')
+STREAMS_PATH = re.compile(r'^/api/v3/activities/(\d+)/streams$')
+TOKEN_PATTERN = re.compile(r'^stub-access-(\d+)$')
+
+
+def _timestamp(value):
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc).timestamp()
+
+
+class RecordedHistory:
+    """
+    使用本地API响应缓存（同步脚本的cache目录）中录制的活动详情和流数据
+
+    活动列表由活动详情去掉详情字段得到。
+    """
+
+    def __init__(self, cache_dir):
+        self.cache = ActivityCache(cache_dir)
+        directory = os.path.join(cache_dir, 'activities')
+        self.summaries = []
+        for name in os.listdir(directory) if os.path.isdir(directory) else []:
+            if not name.endswith('.json.gz'):
+                continue
+            detail = self.cache.get('activities', name[:-len('.json.gz')], ignore_freshness=True)
+            if detail:
+                self.summaries.append(summary_from_detail(detail))
+        self.summaries.sort(key=lambda summary: summary['start_date'], reverse=True)
+
+    def __len__(self):
+        return len(self.summaries)
+
+    def generate(self, activity_id):
+        detail = self.cache.get('activities', activity_id, ignore_freshness=True)
+        if detail is None:
+            return None
+        streams = self.cache.get('streams', activity_id, ignore_freshness=True) or {}
+        return detail, streams
+
+
+class RateLimitCounter:
+    """模拟Strava的15分钟和每日请求限额，窗口对齐到整刻钟和UTC零点"""
+
+    def __init__(self, limits, read_limits):
+        self.limits = {'X-RateLimit': limits, 'X-ReadRateLimit': read_limits}
+        self.usage = {prefix: [0, 0] for prefix in self.limits}
+        self.windows = (None, None)
+        self._lock = threading.Lock()
+
+    def hit(self, read):
+        """记录一次请求，返回 (是否超出限额, 响应头)"""
+        with self._lock:
+            now = int(time.time())
+            windows = (now // 900, now // 86400)
+            if windows != self.windows:
+                for prefix, usage in self.usage.items():
+                    if windows[0] != self.windows[0]:
+                        usage[0] = 0
+                    if windows[1] != self.windows[1]:
+                        usage[1] = 0
+                self.windows = windows
+
+            prefixes = ('X-RateLimit', 'X-ReadRateLimit') if read else ('X-RateLimit',)
+            limited = any(
+                usage >= limit
+                for prefix in prefixes
+                for usage, limit in zip(self.usage[prefix], self.limits[prefix])
+            )
+            if not limited:
+                for prefix in prefixes:
+                    self.usage[prefix][0] += 1
+                    self.usage[prefix][1] += 1
+
+            headers = {}
+            for prefix, limits in self.limits.items():
+                headers[f'{prefix}-Limit'] = f'{limits[0]},{limits[1]}'
+                headers[f'{prefix}-Usage'] = f'{self.usage[prefix][0]},{self.usage[prefix][1]}'
+            return limited, headers
+
+
+class StubState:
+    """模拟服务的共享状态：活动数据、故障注入配置和请求统计"""
+
+    def __init__(self, history, latency=0.0, jitter=0.0, error_rate=0.0, rate_limits=None, seed=0, token_ttl=6 * 3600):
+        self.history = history
+        self.token_ttl = token_ttl
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limits = rate_limits
+        self.random = random.Random(seed)
+        self.requests = Counter()
+        self.errors = Counter()
+        self.bytes_sent = 0
+        self._payloads = OrderedDict()
+        self._starts = [_timestamp(summary['start_date']) for summary in history.summaries]
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, size, status):
+        with self._lock:
+            self.requests[endpoint] += 1
+            self.bytes_sent += size
+            if status >= 400:
+                self.errors[status] += 1
+
+    def should_fail(self):
+        with self._lock:
+            return self.error_rate > 0 and self.random.random() < self.error_rate
+
+    def delay(self):
+        if self.latency or self.jitter:
+            with self._lock:
+                extra = self.random.uniform(0, self.jitter)
+            time.sleep(self.latency + extra)
+
+    def payload(self, activity_id):
+        """返回活动的 (详情, 流数据)，最近生成的结果保存在有界缓存中"""
+        with self._lock:
+            if activity_id in self._payloads:
+                self._payloads.move_to_end(activity_id)
+                return self._payloads[activity_id]
+        payload = self.history.generate(activity_id)
+        if payload is None:
+            return None
+        with self._lock:
+            self._payloads[activity_id] = payload
+            while len(self._payloads) > PAYLOAD_CACHE_SIZE:
+                self._payloads.popitem(last=False)
+        return payload
+
+    def list_activities(self, after=None, before=None, page=1, per_page=30):
+        """
+        与Strava相同的分页语义：只指定after时按时间正序返回，否则按时间倒序返回
+        """
+        summaries = self.history.summaries
+        if after is not None or before is not None:
+            summaries = [
+                summary for summary, start in zip(summaries, self._starts)
+                if (after is None or start > after) and (before is None or start < before)
+            ]
+        if after is not None and before is None:
+            summaries = summaries[::-1]
+        start = (page - 1) * per_page
+        return summaries[start:start + per_page]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # 使用HTTP/1.1以支持keep-alive，与真实服务一样复用连接
+    protocol_version = 'HTTP/1.1'
+    server_version = 'StravaStub/1.0'
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, endpoint, status, payload, headers=None):
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.state.record(endpoint, len(body), status)
+
+    def _query(self):
+        return {key: values[-1] for key, values in parse_qs(urlsplit(self.path).query).items()}
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else ''
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            return json.loads(body or '{}')
+        return {key: values[-1] for key, values in parse_qs(body).items()}
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        form = self._read_body()
+        self.state.delay()
+        if path != '/oauth/token':
+            return self._send_json('other', 404, {'message': 'Record Not Found'})
+        if not form.get('refresh_token') and not form.get('code'):
+            return self._send_json('/oauth/token', 400, {'message': 'Bad Request', 'errors': [{'field': 'refresh_token'}]})
+        # 令牌接口不计入API限额；access_token中带有过期时间，过期后请求返回401
+        expires_at = int(time.time()) + self.state.token_ttl
+        self._send_json('/oauth/token', 200, {
+            'token_type': 'Bearer',
+            'access_token': f'stub-access-{expires_at}',
+            'refresh_token': form.get('refresh_token') or 'stub-refresh',
+            'expires_at': expires_at,
+            'expires_in': self.state.token_ttl,
+        })
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == '/api/v3/athlete':
+            endpoint = '/athlete'
+        elif path == '/api/v3/athlete/activities':
+            endpoint = '/athlete/activities'
+        elif ACTIVITY_PATH.match(path):
+            endpoint = '/activities/{id}'
+        elif STREAMS_PATH.match(path):
+            endpoint = '/activities/{id}/streams'
+        else:
+            return self._send_json('other', 404, {'message': 'Record Not Found'})
+
+        # 与Strava一样同时接受Authorization头和access_token查询参数
+        query = self._query()
+        authorization = self.headers.get('Authorization', '')
+        token = authorization[len('Bearer '):] if authorization.startswith('Bearer ') else query.get('access_token')
+        if not token or _token_expired(token):
+            return self._send_json(endpoint, 401, {'message': 'Authorization Error'})
+
+        self.state.delay()
+        limited, headers = self.state.rate_limits.hit(read=True)
+        if limited:
+            return self._send_json(endpoint, 429, {'message': 'Rate Limit Exceeded'}, headers)
+        if self.state.should_fail():
+            status = self.state.random.choice((500, 502, 503))
+            return self._send_json(endpoint, status, {'message': 'Injected Error'}, headers)
+
+        if endpoint == '/athlete':
+            return self._send_json(endpoint, 200, {
+                'id': 1, 'resource_state': 3, 'firstname': 'Stub', 'lastname': 'Runner',
+                'city': 'Shanghai', 'country': 'China', 'sex': 'M',
+            }, headers)
+
+        if endpoint == '/athlete/activities':
+            try:
+                after = float(query['after']) if 'after' in query else None
+                before = float(query['before']) if 'before' in query else None
+                page = max(1, int(query.get('page', 1)))
+                per_page = min(200, max(1, int(query.get('per_page', 30))))
+            except ValueError:
+                return self._send_json(endpoint, 400, {'message': 'Bad Request'}, headers)
+            return self._send_json(endpoint, 200, self.state.list_activities(after, before, page, per_page), headers)
+
+        activity_id = int((ACTIVITY_PATH.match(path) or STREAMS_PATH.match(path)).group(1))
+        payload = self.state.payload(activity_id)
+        if payload is None:
+            return self._send_json(endpoint, 404, {'message': 'Record Not Found'}, headers)
+        detail, streams = payload
+
+        if endpoint == '/activities/{id}':
+            if query.get('include_all_efforts', '').lower() not in ('true', '1'):
+                detail = {**detail, 'segment_efforts': detail.get('segment_efforts', [])[:5]}
+            return self._send_json(endpoint, 200, detail, headers)
+
+        keys = [key for key in query.get('keys', '').split(',') if key]
+        # Strava总是同时返回distance流
+        selected = {
+            name: stream for name, stream in streams.items()
+            if not keys or name in keys or name == 'distance'
+        }
+        if query.get('key_by_type', '').lower() in ('true', '1'):
+            return self._send_json(endpoint, 200, selected, headers)
+        return self._send_json(endpoint, 200, [{'type': name, **stream} for name, stream in selected.items()], headers)
+
+
+def _parse_limits(value):
+    try:
+        short_limit, long_limit = (int(part) for part in value.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError('限额格式应为 "15分钟限额,每日限额"，例如 200,2000')
+    return short_limit, long_limit
+
+
+def create_server(state, host='127.0.0.1', port=0, verbose=False):
+    """创建模拟服务，port为0时自动选择空闲端口，返回的服务尚未开始监听循环"""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.state = state
+    server.verbose = verbose
+    return server
+
+
+def print_server_stats(state):
+    print(f'\n共处理 {sum(state.requests.values())} 个请求，发送 {state.bytes_sent / 1024 / 1024:.1f} MB')
+    for endpoint, count in sorted(state.requests.items()):
+        print(f'- {endpoint}: {count}')
+    if state.errors:
+        print('错误响应: ' + '，'.join(f'HTTP {status} {count} 次' for status, count in sorted(state.errors.items())))
+
+
+def _token_expired(token):
+    """本服务签发的access_token（stub-access-<过期时间>）过期后视为无效，其他令牌始终有效"""
+    match = TOKEN_PATTERN.match(token)
+    return bool(match) and int(match.group(1)) <= time.time()
+
+
+def _stop(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟的Strava API服务，用于离线测试和压测同步脚本')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口')
+    parser.add_argument('--activities', type=int, default=1000, help='合成的活动数量')
+    parser.add_argument('--seed', type=int, default=0, help='合成数据的随机种子')
+    parser.add_argument('--sample-interval', type=float, default=1.0,
+                        help='合成流数据的采样间隔（秒），调大可减少模拟服务生成数据的开销')
+    parser.add_argument('--fixtures', help='使用同步脚本缓存目录中录制的API响应代替合成数据')
+    parser.add_argument('--latency', type=float, default=0, help='每个请求的固定延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0, help='在固定延迟之外增加的随机延迟上限（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0, help='随机返回5xx错误的请求比例，0到1之间')
+    parser.add_argument('--rate-limit', type=_parse_limits, default=(200, 2000),
+                        help='总请求限额，格式为 "15分钟限额,每日限额"，默认与Strava相同')
+    parser.add_argument('--read-rate-limit', type=_parse_limits, default=(100, 1000),
+                        help='读请求限额，格式同上')
+    parser.add_argument('--token-ttl', type=int, default=6 * 3600,
+                        help='签发的access_token的有效期（秒），默认与Strava相同，调小可测试令牌过期后的自动刷新')
+    parser.add_argument('--verbose', action='store_true', help='打印每个请求的访问日志')
+    args = parser.parse_args()
+
+    if args.fixtures:
+        history = RecordedHistory(args.fixtures)
+        print(f'已从 {args.fixtures} 加载 {len(history)} 条录制的活动')
+    else:
+        history = SyntheticHistory(args.activities, seed=args.seed, sample_interval=args.sample_interval)
+        print(f'已生成 {len(history)} 条合成活动')
+
+    state = StubState(
+        history,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        rate_limits=RateLimitCounter(args.rate_limit, args.read_rate_limit),
+        seed=args.seed,
+        token_ttl=args.token_ttl,
+    )
+    server = create_server(state, args.host, args.port, args.verbose)
+    host, port = server.server_address[:2]
+    print(f'模拟服务已启动: http://{host}:{port}')
+    print(f'同步脚本使用 --base-url http://{host}:{port} 连接，任意client ID、client secret和refresh token均可通过认证')
+    # 压测脚本通常用SIGTERM结束后台的模拟服务，同样输出请求统计
+    signal.signal(signal.SIGTERM, _stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print_server_stats(state)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,349 @@
+import json
+import math
+import zlib
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # 没有安装NumPy时使用纯Python的参考实现
+    np = None
+
+# 文件头：4字节标识和1字节格式版本，之后是zlib压缩的正文
+MAGIC = b'STRC'
+FORMAT_VERSION = 1
+
+# 按整数量化时尝试的最多小数位数，超过后按float64原样保存
+MAX_DECIMALS = 6
+
+# 压缩级别，解码耗时与级别无关
+DEFAULT_LEVEL = 6
+
+
+# ---------------------------------------------------------------------------
+# varint（LEB128）与zigzag编码
+# ---------------------------------------------------------------------------
+
+def _zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value):
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+def _encode_varints_python(values):
+    out = bytearray()
+    for value in values:
+        value = _zigzag(value)
+        while value >= 0x80:
+            out.append((value & 0x7f) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def _decode_varints_python(data, count):
+    values = []
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append(_unzigzag(value))
+        value = 0
+        shift = 0
+    if len(values) != count:
+        raise ValueError(f'流数据通道的数据点数不符：应为{count}，实际为{len(values)}')
+    return values
+
+
+def _encode_varints_numpy(values):
+    values = np.asarray(values, dtype=np.int64)
+    encoded = ((values << 1) ^ (values >> 63)).astype(np.uint64)
+    # 每个值占用的字节数：每7位一个字节
+    nbytes = np.ones(len(encoded), dtype=np.int64)
+    for bits in range(7, 64, 7):
+        nbytes += encoded >= np.uint64(1 << bits)
+    starts = np.cumsum(nbytes) - nbytes
+    position = np.arange(int(nbytes.sum())) - np.repeat(starts, nbytes)
+    out = (np.repeat(encoded, nbytes) >> (7 * position).astype(np.uint64)) & np.uint64(0x7f)
+    out = out.astype(np.uint8)
+    # 除每个值的最后一个字节外都设置延续位
+    out[position < np.repeat(nbytes, nbytes) - 1] |= 0x80
+    return out.tobytes()
+
+
+def _decode_varints_numpy(data, count):
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buffer < 0x80)
+    if len(ends) != count or (len(buffer) and ends[-1] != len(buffer) - 1):
+        raise ValueError(f'流数据通道的数据点数不符：应为{count}，实际为{len(ends)}')
+    if count == 0:
+        return np.zeros(0, dtype=np.int64)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    position = np.arange(len(buffer)) - np.repeat(starts, ends - starts + 1)
+    parts = (buffer & 0x7f).astype(np.uint64) << (7 * position).astype(np.uint64)
+    encoded = np.add.reduceat(parts, starts)
+    return ((encoded >> np.uint64(1)).astype(np.int64)) ^ -((encoded & np.uint64(1)).astype(np.int64))
+
+
+# ---------------------------------------------------------------------------
+# 单个通道的编码
+# ---------------------------------------------------------------------------
+
+def _channel_kind(values):
+    """
+    判断通道的数值类型：int、float，含有布尔值、None、非有限数或嵌套列表等其他值时为None
+
+    NumPy和纯Python编码使用同一个判断，否则经纬度（二维数组）、布尔值等通道的编码会不一致。
+    """
+    if all(type(value) is int for value in values):
+        return 'int'
+    if all(type(value) in (int, float) for value in values) and all(math.isfinite(value) for value in values):
+        return 'float'
+    return None
+
+
+def _quantize(values, kind):
+    """
+    找到能无损还原全部数值的最少小数位数，返回 (小数位数, 整数化的数值)
+
+    Strava的流数据只有0到3位小数（距离和海拔0.1米，速度0.001米/秒），按10的幂放大后即为整数；
+    还原时整数除以同一个10的幂得到与原值完全相同的浮点数。没有合适的位数时返回None。
+    """
+    if kind == 'int':
+        return 0, values
+    for decimals in range(MAX_DECIMALS + 1):
+        scale = 10 ** decimals
+        if np is not None:
+            array = np.asarray(values, dtype=float)
+            scaled = np.round(array * scale)
+            if np.abs(scaled).max(initial=0) < 2 ** 53 and np.array_equal(scaled / scale, array):
+                return decimals, scaled.astype(np.int64)
+        else:
+            scaled = [round(value * scale) for value in values]
+            if all(abs(q) < 2 ** 53 for q in scaled) and all(q / scale == value for q, value in zip(scaled, values)):
+                return decimals, scaled
+    return None
+
+
+def _encode_channel(name, values):
+    """编码一个通道，返回 (通道描述, 二进制数据)"""
+    values = list(values) if not isinstance(values, list) else values
+    kind = _channel_kind(values)
+    quantized = _quantize(values, kind) if kind is not None else None
+    if quantized is not None:
+        decimals, integers = quantized
+        # 相邻采样点的差值通常只有一两位数，varint只需一个字节
+        if np is not None:
+            deltas = np.diff(np.asarray(integers, dtype=np.int64), prepend=np.int64(0))
+            payload = _encode_varints_numpy(deltas)
+        else:
+            deltas = [b - a for a, b in zip([0] + integers[:-1], integers)]
+            payload = _encode_varints_python(deltas)
+        info = {'name': name, 'encoding': 'delta', 'count': len(values), 'decimals': decimals,
+                'float': kind == 'float', 'size': len(payload)}
+        return info, payload
+    if kind == 'float':
+        payload = struct.pack(f'<{len(values)}d', *values)
+        return {'name': name, 'encoding': 'float64', 'count': len(values), 'size': len(payload)}, payload
+    # 布尔值、经纬度等其他通道原样写入文件头
+    return {'name': name, 'encoding': 'json', 'count': len(values), 'size': 0, 'values': values}, b''
+
+
+def _decode_channel(info, payload):
+    encoding = info['encoding']
+    if encoding == 'json':
+        return info['values']
+    if encoding == 'float64':
+        return list(struct.unpack(f'<{info["count"]}d', payload))
+    if encoding != 'delta':
+        raise ValueError(f'未知的流数据通道编码: {encoding}')
+
+    scale = 10 ** info['decimals']
+    if np is not None:
+        integers = np.cumsum(_decode_varints_numpy(payload, info['count']))
+        if info['float']:
+            return (integers / scale).tolist()
+        return integers.tolist()
+    integers = []
+    total = 0
+    for delta in _decode_varints_python(payload, info['count']):
+        total += delta
+        integers.append(total)
+    if info['float']:
+        return [value / scale for value in integers]
+    return integers
+
+
+# ---------------------------------------------------------------------------
+# 容器格式
+# ---------------------------------------------------------------------------
+
+def is_encoded(data):
+    """判断数据是否为本模块编码的二进制格式"""
+    return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def encode_channels(channels, meta=None, level=DEFAULT_LEVEL):
+    """
+    把多个数值通道编码为紧凑的二进制数据
+
+    channels为 {通道名称: 数值列表}，meta为随数据保存的任意JSON对象。
+    每个通道按能无损还原的最少小数位数整数化，对相邻差值做zigzag和varint编码，
+    最后整体用zlib压缩；无法整数化的浮点通道按float64保存，其他通道按JSON保存。
+    解码结果与编码前的数值完全相同。
+    """
+    infos = []
+    payloads = []
+    for name, values in channels.items():
+        info, payload = _encode_channel(name, values)
+        infos.append(info)
+        payloads.append(payload)
+    header = json.dumps({'meta': meta, 'channels': infos}, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    body = _encode_varints_python([len(header)]) + header + b''.join(payloads)
+    return MAGIC + bytes([FORMAT_VERSION]) + zlib.compress(body, level)
+
+
+def _read_header_length(body):
+    """读取正文开头varint格式的文件头长度，返回 (文件头长度, 文件头开始的位置)"""
+    header_length = 0
+    shift = 0
+    offset = 0
+    while True:
+        if offset >= len(body):
+            raise ValueError('流数据文件头长度不完整')
+        byte = body[offset]
+        offset += 1
+        header_length |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            break
+        shift += 7
+    header_length = _unzigzag(header_length)
+    if header_length < 0 or offset + header_length > len(body):
+        raise ValueError(f'流数据文件头长度不正确: {header_length}')
+    return header_length, offset
+
+
+def decode_channels(data):
+    """
+    解码encode_channels生成的数据，返回 (meta, {通道名称: 数值列表})
+
+    数据被截断或损坏时抛出ValueError，调用方可以把它当作缓存未命中处理。
+    """
+    if not is_encoded(data):
+        raise ValueError('不是流数据二进制格式')
+    if len(data) <= len(MAGIC):
+        raise ValueError('流数据缺少格式版本')
+    version = data[len(MAGIC)]
+    if version != FORMAT_VERSION:
+        raise ValueError(f'不支持的流数据格式版本: {version}')
+    try:
+        body = zlib.decompress(bytes(data[len(MAGIC) + 1:]))
+    except zlib.error as e:
+        raise ValueError(f'流数据解压失败: {e}') from e
+
+    # 文件头长度本身也是varint
+    header_length, offset = _read_header_length(body)
+    header = json.loads(body[offset:offset + header_length].decode('utf-8'))
+    offset += header_length
+
+    channels = {}
+    try:
+        for info in header['channels']:
+            size = info['size']
+            if size < 0 or offset + size > len(body):
+                raise ValueError(f'流数据通道 {info["name"]} 的数据不完整')
+            payload = body[offset:offset + size]
+            offset += size
+            channels[info['name']] = _decode_channel(info, payload)
+        meta = header['meta']
+    except (KeyError, TypeError, struct.error) as e:
+        raise ValueError(f'流数据文件头格式不正确: {e!r}') from e
+    return meta, channels
+
+
+# ---------------------------------------------------------------------------
+# Strava流数据和图表数据
+# ---------------------------------------------------------------------------
+
+def encode_streams(raw_streams, meta=None, level=DEFAULT_LEVEL):
+    """
+    编码流数据接口的原始响应（key_by_type格式的字典或带type字段的列表）
+
+    时间、距离、心率、海拔、速度、步频等通道各自编码，
+    series_type、original_size、resolution等其余字段随meta保存。
+    """
+    if not isinstance(raw_streams, dict):
+        raw_streams = {stream['type']: {k: v for k, v in stream.items() if k != 'type'} for stream in raw_streams}
+    attributes = {}
+    channels = {}
+    for stream_type, stream in raw_streams.items():
+        attributes[stream_type] = {key: value for key, value in stream.items() if key != 'data'}
+        channels[stream_type] = stream.get('data') or []
+    return encode_channels(channels, {**(meta or {}), 'streams': attributes}, level)
+
+
+def decode_streams(data):
+    """解码encode_streams生成的数据，返回 (meta, key_by_type格式的原始响应)"""
+    meta, channels = decode_channels(data)
+    if not isinstance(meta, dict):
+        raise ValueError('流数据缺少meta字段')
+    attributes = meta.pop('streams', {})
+    raw_streams = {
+        stream_type: {'data': channels[stream_type], **attributes.get(stream_type, {})}
+        for stream_type in channels
+    }
+    return meta, raw_streams
+
+
+def encode_chart_data(stream_data, level=DEFAULT_LEVEL):
+    """编码 {字段名: [{'x', 'y'}]} 格式的图表数据，每个字段的x和y各为一个通道"""
+    channels = {}
+    for field, points in stream_data.items():
+        channels[f'{field}.x'] = [point['x'] for point in points or ()]
+        channels[f'{field}.y'] = [point['y'] for point in points or ()]
+    return encode_channels(channels, {'fields': list(stream_data)}, level)
+
+
+def decode_chart_data(data):
+    """解码encode_chart_data生成的数据"""
+    meta, channels = decode_channels(data)
+    return {
+        field: [{'x': x, 'y': y} for x, y in zip(channels[f'{field}.x'], channels[f'{field}.y'])]
+        for field in meta['fields']
+    }
+
+
+def _benchmark(repeat=20, seed=0):
+    """在各个距离的合成活动上比较JSON格式和二进制格式的大小与解码耗时"""
+    import gzip
+    import timeit
+
+    from synthetic_activities import PROFILES, generate_activity
+
+    print(f'{"活动":>10} {"采样点":>8} {"JSON":>10} {"gzip JSON":>10} {"二进制":>10} '
+          f'{"JSON解码":>10} {"gzip解码":>10} {"二进制解码":>10}')
+    for index, (profile, distance_km) in enumerate(PROFILES.items()):
+        _, raw_streams = generate_activity(index + 1, distance_km, seed=seed)
+        text = json.dumps(raw_streams).encode('utf-8')
+        compressed = gzip.compress(text, mtime=0)
+        encoded = encode_streams(raw_streams)
+        if decode_streams(encoded)[1] != raw_streams:
+            raise AssertionError('二进制格式解码后的流数据与原始数据不一致')
+
+        def best(func):
+            return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+        json_time = best(lambda: json.loads(text))
+        gzip_time = best(lambda: json.loads(gzip.decompress(compressed)))
+        codec_time = best(lambda: decode_streams(encoded))
+        samples = len(raw_streams['time']['data'])
+        print(f'{profile:>10} {samples:>8} {len(text):>10,} {len(compressed):>10,} {len(encoded):>10,} '
+              f'{json_time:>8.2f}ms {gzip_time:>8.2f}ms {codec_time:>8.2f}ms')
+
+
+if __name__ == '__main__':
+    _benchmark()
@@ -0,0 +1,251 @@
+try:
+    import numpy as np
+except ImportError:  # 没有安装NumPy时使用纯Python的参考实现
+    np = None
+
+# LTTB降采样时每条图表序列的默认点数上限
+DEFAULT_MAX_POINTS = 200
+
+# 额外生成的细节层级和每条序列的最大点数，None表示保留全部采样点；
+# 最粗的概览层级即按DEFAULT_MAX_POINTS降采样、内嵌在sidecar中的图表数据
+LOD_TIERS = (('detail', 2000), ('full', None))
+
+
+def process_stream_data(streams):
+    """处理流数据，生成图表数据"""
+    if not streams:
+        return {
+            'heartrate_data': [],
+            'pace_data': [],
+            'elevation_data': []
+        }
+    
+    heartrate_data = []
+    pace_data = []
+    elevation_data = []
+    
+    # 处理心率数据
+    if 'heartrate' in streams and 'time' in streams:
+        times = streams['time'].data
+        heartrates = streams['heartrate'].data
+        
+        for i in range(0, len(times), 10):  # 每10个数据点取一个，减少数据量
+            heartrate_data.append({
+                'x': times[i],  # 时间（秒）
+                'y': heartrates[i]  # 心率
+            })
+    
+    # 处理配速数据（从速度计算）
+    if 'velocity_smooth' in streams and 'time' in streams:
+        times = streams['time'].data
+        velocities = streams['velocity_smooth'].data
+        
+        for i in range(0, len(times), 10):  # 每10个数据点取一个
+            if velocities[i] > 0:
+                # 计算配速（分钟/公里）
+                pace_min_per_km = 16.6667 / velocities[i]  # 1000 / 60 / velocity
+                
+                pace_data.append({
+                    'x': times[i],  # 时间（秒）
+                    'y': pace_min_per_km  # 配速（分钟/公里）
+                })
+    
+    # 处理海拔数据
+    if 'altitude' in streams and 'time' in streams:
+        times = streams['time'].data
+        altitudes = streams['altitude'].data
+        
+        for i in range(0, len(times), 10):  # 每10个数据点取一个
+            elevation_data.append({
+                'x': times[i],  # 时间（秒）
+                'y': altitudes[i]  # 海拔（米）
+            })
+    
+    return {
+        'heartrate_data': heartrate_data,
+        'pace_data': pace_data,
+        'elevation_data': elevation_data
+    }
+
+
+def _to_points(times, values):
+    """把时间和数值序列转换为图表使用的 {'x', 'y'} 列表"""
+    return [{'x': x, 'y': y} for x, y in zip(times, values)]
+
+
+def _lttb_indices_python(x, y, budget):
+    """lttb_indices的纯Python实现，在没有安装NumPy时使用"""
+    n = len(x)
+    step = (n - 2) / (budget - 2)
+    edges = [int(1 + i * step) for i in range(budget - 1)]
+    edges[-1] = n - 1
+    indices = [0]
+    a = 0
+    for i in range(budget - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            count = next_end - next_start
+            avg_x = sum(x[next_start:next_end]) / count
+            avg_y = sum(y[next_start:next_end]) / count
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        best_area = -1
+        best = start
+        for j in range(start, end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best_area = area
+                best = j
+        a = best
+        indices.append(a)
+    indices.append(n - 1)
+    return indices
+
+
+def lttb_indices(x, y, budget):
+    """
+    Largest-Triangle-Three-Buckets降采样，返回保留的数据点下标
+
+    首尾两点总是保留，中间的点均分为budget-2个桶，每个桶中选出与上一个选中点、
+    下一个桶平均点构成的三角形面积最大的点。与固定步长抽样相比，能保留峰值和
+    突变，曲线形状更接近原始数据。
+    """
+    n = len(x)
+    if budget >= n:
+        return list(range(n))
+    if budget < 3:
+        return [0, n - 1][:max(budget, 0)]
+    if np is None:
+        return _lttb_indices_python(x, y, budget)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, budget - 1).astype(int)
+    # 一次性计算所有桶的平均点，桶 k 覆盖 [edges[k], edges[k + 1])
+    counts = np.diff(edges)
+    bucket_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    bucket_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    indices = np.empty(budget, dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+    for i in range(budget - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            avg_x = bucket_x[i + 1]
+            avg_y = bucket_y[i + 1]
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        indices[i + 1] = a
+    return indices.tolist()
+
+
+def _downsample(times, values, max_points):
+    """按点数上限对一条序列做LTTB降采样，返回图表数据点列表"""
+    indices = lttb_indices(times, values, max_points)
+    return [{'x': times[i], 'y': values[i]} for i in indices]
+
+
+def _chart_series(streams):
+    """
+    从完整的流数据中取出图表使用的三条序列，返回 {字段名: (时间, 数值)}
+
+    配速由速度计算，只保留速度大于0的点。
+    """
+    series = {}
+    if not streams or 'time' not in streams:
+        return series
+
+    times = streams['time'].data
+
+    # 处理心率数据
+    if 'heartrate' in streams:
+        series['heartrate_data'] = (times, streams['heartrate'].data)
+
+    # 处理配速数据（从速度计算），只保留速度大于0的点
+    if 'velocity_smooth' in streams:
+        velocities = streams['velocity_smooth'].data
+        if np is not None:
+            velocity_array = np.asarray(velocities, dtype=float)
+            moving = velocity_array > 0
+            moving_times = np.asarray(times)[moving].tolist()
+            pace = (16.6667 / velocity_array[moving]).tolist()  # 1000 / 60 / velocity
+        else:
+            moving_times = [t for t, v in zip(times, velocities) if v > 0]
+            pace = [16.6667 / v for v in velocities if v > 0]
+        series['pace_data'] = (moving_times, pace)
+
+    # 处理海拔数据
+    if 'altitude' in streams:
+        series['elevation_data'] = (times, streams['altitude'].data)
+
+    return series
+
+
+def process_stream_data_lttb(streams, max_points=DEFAULT_MAX_POINTS):
+    """
+    使用LTTB生成图表数据，每条序列最多保留max_points个点
+
+    直接在完整的流数据上降采样，无论活动时长多少，每条序列的数据量都有上限，
+    同时保留固定步长抽样会丢失的峰值。
+    """
+    result = {
+        'heartrate_data': [],
+        'pace_data': [],
+        'elevation_data': []
+    }
+    for field, (times, values) in _chart_series(streams).items():
+        result[field] = _downsample(times, values, max_points)
+    return result
+
+
+def parse_stream_tiers(value):
+    """
+    解析细节层级的配置，例如 "detail:2000,full" -> (('detail', 2000), ('full', None))
+
+    没有点数的层级保留全部采样点，空字符串表示不生成额外的层级。
+    """
+    tiers = []
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, _, points = item.partition(':')
+        if not name.isidentifier():
+            raise ValueError(f'细节层级名称无效: {name}')
+        points = int(points) if points else None
+        if points is not None and points < 3:
+            raise ValueError(f'细节层级 {name} 的点数至少为3')
+        tiers.append((name, points))
+    return tuple(tiers)
+
+
+def process_stream_tiers(streams, tiers=LOD_TIERS, base_points=DEFAULT_MAX_POINTS):
+    """
+    在完整分辨率的流数据上生成多个细节层级的图表数据，供前端按图表宽度和缩放程度选用
+
+    各层级共用同一组原始序列（配速只计算一次），分别做LTTB降采样，不需要再次请求接口。
+    点数不超过base_points（内嵌的概览数据）的层级没有意义；原始采样点数不超过某一层级的
+    点数上限时，该层级与完整数据相同，更高的层级也不再生成。
+    返回 [(层级名称, 每条序列的最大点数, 图表数据)]，按点数从少到多排列。
+    """
+    series = _chart_series(streams)
+    if not series:
+        return []
+    longest = max(len(times) for times, _ in series.values())
+    if longest <= base_points:
+        return []
+
+    result = []
+    for name, max_points in sorted(tiers, key=lambda tier: tier[1] or float('inf')):
+        if max_points is not None and max_points <= base_points:
+            continue
+        complete = max_points is None or max_points >= longest
+        data = {
+            field: _to_points(times, values) if complete else _downsample(times, values, max_points)
+            for field, (times, values) in series.items()
+        }
+        result.append((name, longest if complete else max_points, data))
+        if complete:
+            break
+    return result
@@ -0,0 +1,145 @@
+import os
+import glob
+import json
+
+from logging_setup import get_logger
+from run_writer import write_if_changed
+from stream_codec import encode_channels
+
+logger = get_logger('sidecar')
+
+SIDECAR_VERSION = 2
+
+# 内嵌在sidecar主文件中的概览层级的名称
+OVERVIEW_TIER = 'overview'
+
+# 图表序列在sidecar文件中的名称与create_markdown中字段名的对应关系
+SERIES_FIELDS = {
+    'heartrate': 'heartrate_data',
+    'pace': 'pace_data',
+    'elevation': 'elevation_data',
+}
+
+
+def get_static_dir(runs_dir):
+    """项目的static目录，其中的文件由Gatsby原样发布，sidecar地址相对于该目录"""
+    project_root = os.path.dirname(os.path.dirname(runs_dir))
+    return os.path.join(project_root, 'static')
+
+
+def get_sidecar_dir(runs_dir):
+    """sidecar文件保存在项目的static/streams目录，由Gatsby原样发布，详情页按需加载"""
+    return os.path.join(get_static_dir(runs_dir), 'streams')
+
+
+def get_sidecar_url(activity_id):
+    """sidecar文件相对于站点根路径的地址，写入frontmatter供详情页加载"""
+    return f'streams/{activity_id}.json'
+
+
+def get_tier_url(activity_id, tier):
+    """细节层级文件相对于站点根路径的地址，与sidecar主文件位于同一目录"""
+    return f'streams/{activity_id}.{tier}.strm'
+
+
+def get_sidecar_files(activity_id, sidecar):
+    """sidecar主文件和细节层级文件相对于static目录的路径，记录在同步清单中"""
+    return [get_sidecar_url(activity_id)] + [tier['url'] for tier in sidecar.get('tiers', ()) if 'url' in tier]
+
+
+def _to_columns(points, ndigits=2):
+    """把 [{'x', 'y'}] 数据点列表转换为并列的x、y数组"""
+    return {
+        'x': [point['x'] for point in points],
+        'y': [round(point['y'], ndigits) for point in points]
+    }
+
+
+def _build_series(stream_data):
+    series = {}
+    if stream_data:
+        for name, field in SERIES_FIELDS.items():
+            if stream_data.get(field):
+                series[name] = _to_columns(stream_data[field])
+    return series
+
+
+def _series_points(series):
+    return max((len(columns['x']) for columns in series.values()), default=0)
+
+
+def build_sidecar(stream_data=None, segments=None, splits=None, laps=None, stream_tiers=None, activity_id=None):
+    """
+    构建单个活动的sidecar数据
+
+    图表序列按列存储为并列的x、y数组，避免每个数据点重复写出键名；
+    分段、公里分割和分圈数据原样保存。
+    series为内嵌的概览层级；stream_tiers（process_stream_tiers的结果）中更精细的层级
+    列在tiers中，写入时各自保存为单独的文件，详情页根据图表宽度和缩放程度按需加载。
+    """
+    series = _build_series(stream_data)
+    tiers = [{'name': OVERVIEW_TIER, 'points': _series_points(series)}]
+    for name, points, tier_data in stream_tiers or ():
+        tiers.append({
+            'name': name,
+            'points': points,
+            'url': get_tier_url(activity_id, name),
+            'series': _build_series(tier_data),
+        })
+    return {
+        'version': SIDECAR_VERSION,
+        'series': series,
+        'tiers': tiers,
+        'segments': segments or [],
+        'splits': splits or [],
+        'laps': laps or []
+    }
+
+
+def _write_json(path, data):
+    content = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    written, _ = write_if_changed(path, content)
+    return written
+
+
+def remove_sidecar_files(sidecar_dir, activity_id, keep=()):
+    """
+    删除活动的sidecar主文件和细节层级文件中不在keep（文件名）中的文件，返回删除的文件数
+
+    层级配置或--stream-output改变后，旧的层级文件不会再被引用，不删除会一直留在仓库中。
+    """
+    patterns = (f'{activity_id}.json', f'{activity_id}.*.strm')
+    removed = 0
+    for path in sorted(set().union(*(glob.glob(os.path.join(sidecar_dir, pattern)) for pattern in patterns))):
+        if os.path.basename(path) in keep:
+            continue
+        os.remove(path)
+        removed += 1
+        logger.info('已删除不再使用的sidecar文件：%s', os.path.basename(path))
+    return removed
+
+
+def write_sidecar(sidecar_dir, activity_id, sidecar):
+    """
+    写入sidecar文件（内容未变化时不重写），返回主文件是否写入
+
+    细节层级的序列先写入各自的文件，主文件的tiers中只保留层级名称、点数和文件地址。
+    细节层级的数据点多，使用stream_codec的二进制格式（每个序列的x、y各为一个通道），
+    由详情页的src/utils/streamCodec.js解码。本次没有生成的旧层级文件会被删除。
+    """
+    os.makedirs(sidecar_dir, exist_ok=True)
+    tiers = []
+    for tier in sidecar.get('tiers', ()):
+        if 'series' in tier:
+            channels = {}
+            for name, columns in tier['series'].items():
+                channels[f'{name}.x'] = columns['x']
+                channels[f'{name}.y'] = columns['y']
+            content = encode_channels(channels, {'version': SIDECAR_VERSION, 'tier': tier['name']})
+            write_if_changed(os.path.join(sidecar_dir, os.path.basename(tier['url'])), content)
+            tier = {key: value for key, value in tier.items() if key != 'series'}
+        tiers.append(tier)
+    written = _write_json(os.path.join(sidecar_dir, f'{activity_id}.json'), {**sidecar, 'tiers': tiers})
+    remove_sidecar_files(sidecar_dir, activity_id,
+                         keep={os.path.basename(path) for path in get_sidecar_files(activity_id, sidecar)})
+    return written
@@ -0,0 +1,186 @@
+import os
+import json
+import threading
+from datetime import datetime
+
+from logging_setup import get_logger
+
+logger = get_logger('journal')
+
+JOURNAL_VERSION = 1
+
+
+def get_default_journal_path():
+    """默认进度日志：项目根目录下的cache/sync_journal.jsonl"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    return os.path.join(project_root, 'cache', 'sync_journal.jsonl')
+
+
+class SyncJournal:
+    """
+    回填同步的进度日志
+
+    以JSON Lines格式追加写入，每行一条记录，进程被中断时已写入的记录不会丢失：
+        run       本次同步的参数（第一行），参数不同的日志不能用于恢复
+        page      活动列表的一页（页码和原始汇总数据）
+        window    按日期范围回填时完成的一个时间窗口（起止时间和原始汇总数据）
+        listed    活动列表已全部获取
+        enriched  已获取详情和流数据的活动ID（数据保存在本地API响应缓存中）
+        written   已写入文件的活动ID
+
+    恢复时先重放日志中的活动列表，跳过已写入的活动，再从下一页或未完成的时间窗口继续获取；
+    已获取过详情的活动直接读取缓存，不再检查缓存是否过期。同步成功结束后删除日志。
+    """
+
+    def __init__(self, path, params):
+        self.path = path
+        self.params = params
+        self.pages = {}
+        self.windows = []
+        self.listed = False
+        self.enriched = set()
+        self.written = set()
+        self._file = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path, params, resume=False):
+        """
+        打开进度日志
+
+        resume为True且已有日志的参数与本次相同时加载其中的进度并继续追加，
+        否则新建日志（覆盖旧日志）。
+        """
+        journal = cls(path, params)
+        if resume:
+            if journal._load():
+                logger.info('从进度日志恢复：已获取活动列表 %d 条，已写入 %d 条',
+                            journal.listed_count(), len(journal.written))
+            else:
+                logger.info('没有可以恢复的进度日志，从头开始同步')
+        if journal._file is None:
+            journal._start()
+        return journal
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return False
+
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # 进程中断时最后一行可能只写了一半
+                break
+        if not entries or entries[0].get('type') != 'run':
+            return False
+        if entries[0].get('version') != JOURNAL_VERSION or entries[0].get('params') != self.params:
+            logger.info('进度日志的同步参数与本次不同，不能用于恢复')
+            return False
+
+        for entry in entries[1:]:
+            kind = entry.get('type')
+            if kind == 'page':
+                self.pages[entry['page']] = entry['activities']
+            elif kind == 'window':
+                self.windows.append((datetime.fromisoformat(entry['start']), datetime.fromisoformat(entry['end']),
+                                     entry['activities']))
+            elif kind == 'listed':
+                self.listed = True
+            elif kind == 'enriched':
+                self.enriched.add(entry['id'])
+            elif kind == 'written':
+                self.written.add(entry['id'])
+
+        # 丢弃写了一半的最后一行，之后的记录从新的一行开始
+        if len(entries) < len(lines) or not lines[-1].endswith('\n'):
+            valid = ''.join(line if line.endswith('\n') else line + '\n' for line in lines[:len(entries)])
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write(valid)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        return True
+
+    def _start(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._append({'type': 'run', 'version': JOURNAL_VERSION, 'params': self.params,
+                      'started_at': datetime.now().isoformat()})
+
+    def _append(self, entry):
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def listed_count(self):
+        return (sum(len(activities or ()) for activities in self.pages.values())
+                + sum(len(activities or ()) for _, _, activities in self.windows))
+
+    def replay_pages(self):
+        """按页码顺序产出日志中的 (页码, 原始汇总列表)，产出后释放该页数据"""
+        for page in sorted(self.pages):
+            activities = self.pages[page]
+            if activities:
+                self.pages[page] = None
+                yield page, activities
+
+    def replay_windows(self):
+        """产出日志中已完成的 (开始时间, 结束时间, 原始汇总列表)，产出后释放该窗口数据"""
+        for index, (start, end, activities) in enumerate(self.windows):
+            if activities is not None:
+                self.windows[index] = (start, end, None)
+                yield start, end, activities
+
+    def completed_windows(self):
+        """日志中已完成的时间窗口 (开始时间, 结束时间)"""
+        return [(start, end) for start, end, _ in self.windows]
+
+    def next_page(self):
+        """恢复时继续获取的页码：已连续完成的页之后的第一页"""
+        page = 1
+        while page in self.pages:
+            page += 1
+        return page
+
+    def record_page(self, page, activities):
+        self.pages[page] = None
+        self._append({'type': 'page', 'page': page, 'activities': activities})
+
+    def record_window(self, start, end, activities):
+        self.windows.append((start, end, None))
+        self._append({'type': 'window', 'start': start.isoformat(), 'end': end.isoformat(),
+                      'activities': activities})
+
+    def record_listed(self):
+        self.listed = True
+        self._append({'type': 'listed'})
+
+    def record_enriched(self, activity_id):
+        self._append({'type': 'enriched', 'id': activity_id})
+
+    def record_written(self, activity_id):
+        self._append({'type': 'written', 'id': activity_id})
+
+    def was_enriched(self, activity_id):
+        return activity_id in self.enriched
+
+    def was_written(self, activity_id):
+        return activity_id in self.written
+
+    def close(self, completed=False):
+        """关闭日志；同步成功结束时删除日志，下次同步不会误用"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if completed:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
@@ -0,0 +1,264 @@
+import os
+import re
+import json
+import hashlib
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+from rollups import Rollups, get_rollups_path, parse_summary
+from logging_setup import get_logger
+
+logger = get_logger('manifest')
+
+MANIFEST_VERSION = 2
+
+# 跑步数据文件名格式：<活动ID>_<本地开始时间>.md
+RUN_FILE_PATTERN = re.compile(r'^(\d+)_(\d{4}-\d{2}-\d{2})T(\d{2})-(\d{2})-(\d{2})\.md$')
+
+# 参与汇总指纹计算的字段：活动列表接口返回、且生成的文件依赖的汇总字段。
+# 在Strava上改名、裁剪或修正活动后这些字段会变化
+FINGERPRINT_FIELDS = (
+    'name', 'type', 'start_date', 'distance', 'moving_time', 'elapsed_time', 'total_elevation_gain',
+    'average_speed', 'max_speed', 'average_heartrate', 'max_heartrate'
+)
+
+
+def content_hash(content):
+    """计算markdown内容（或sidecar等二进制文件内容）的哈希值"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+def summary_fingerprint(activity):
+    """
+    计算活动汇总字段的指纹
+
+    stravalib活动对象和数据库中读回的活动对象得到相同的指纹：
+    时长统一为秒数，带单位的数值统一为float，时间统一为ISO格式。
+    """
+    values = []
+    for field in FINGERPRINT_FIELDS:
+        value = getattr(activity, field, None)
+        if hasattr(value, 'total_seconds'):
+            value = value.total_seconds()
+        elif hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        elif value is not None and not isinstance(value, str):
+            value = float(value)
+        values.append(value)
+    return hashlib.sha256(json.dumps(values, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+
+def get_manifest_path(runs_dir):
+    """同步清单保存在runs目录的上一级，避免被Gatsby当作跑步数据读取"""
+    return os.path.join(os.path.dirname(runs_dir), 'sync_manifest.json')
+
+
+class SyncManifest:
+    """
+    同步状态清单
+
+    记录最近一次同步到的活动开始时间（UTC时间戳）、已知的活动ID，
+    以及每个活动对应的文件名、内容哈希、汇总字段和汇总指纹。增量同步直接读取清单，
+    无需扫描整个runs目录；同步结束时原子地写回磁盘。
+    活动列表中已知活动的汇总指纹没有变化时无需重新获取详情和流数据。
+    首页使用的汇总数据（rollups）随清单一起增量更新和保存。
+    """
+
+    def __init__(self, path, last_synced=None, activities=None):
+        self.path = path
+        self.last_synced = last_synced
+        self.activities = activities or {}
+        self.dirty = False
+        self.rollups = None
+        # 影响生成文件内容的选项，由set_render_options设置，随每个活动记录
+        self.render_options = None
+        # 本次同步开始前的同步起点，以及处理失败的活动中最早的开始时间
+        self._initial_last_synced = last_synced
+        self._earliest_failure = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """读取清单文件，文件不存在或格式不正确时返回None"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != MANIFEST_VERSION:
+            return None
+        return cls(path, data.get('last_synced'), data.get('activities'))
+
+    @classmethod
+    def rebuild(cls, path, runs_dir):
+        """
+        扫描runs目录重建清单
+
+        文件名中只有本地时间，无法得知准确的UTC时间，因此把最新的本地时间
+        提前一天作为同步起点（时区偏移不超过14小时），宁可多获取也不遗漏；
+        重新获取到的活动会用准确的UTC时间更新清单。
+        """
+        manifest = cls(path)
+        latest = None
+        if os.path.isdir(runs_dir):
+            for file_name in os.listdir(runs_dir):
+                match = RUN_FILE_PATTERN.match(file_name)
+                if not match:
+                    continue
+                activity_id, date_part, hour, minute, second = match.groups()
+                local_time = datetime.fromisoformat(f'{date_part}T{hour}:{minute}:{second}').replace(tzinfo=timezone.utc)
+                with open(os.path.join(runs_dir, file_name), 'r', encoding='utf-8') as f:
+                    content = f.read()
+                manifest.activities[activity_id] = {
+                    'file': file_name,
+                    'hash': content_hash(content),
+                    'summary': parse_summary(content)
+                }
+                if latest is None or local_time > latest:
+                    latest = local_time
+        if latest is not None:
+            manifest.last_synced = int(latest.timestamp()) - 86400
+        manifest.dirty = True
+        return manifest
+
+    @classmethod
+    def load_or_rebuild(cls, runs_dir, rebuild=False):
+        """读取runs目录对应的清单，清单不存在或要求重建时扫描runs目录"""
+        path = get_manifest_path(runs_dir)
+        manifest = None if rebuild else cls.load(path)
+        rebuilt = manifest is None
+        if rebuilt:
+            logger.info('同步清单不存在或需要重建，正在扫描runs目录...')
+            manifest = cls.rebuild(path, runs_dir)
+            logger.info('已重建同步清单，共 %d 条活动', len(manifest.activities))
+        
+        # 汇总数据由清单中各活动的汇总字段计算，清单重建时一并重建
+        rollups_path = get_rollups_path(runs_dir)
+        manifest.rollups = None if rebuilt else Rollups.load(rollups_path)
+        if manifest.rollups is None:
+            manifest.rollups = Rollups.build(
+                rollups_path,
+                (entry.get('summary') for entry in manifest.activities.values())
+            )
+        return manifest
+
+    def latest_time(self):
+        """返回最近同步到的活动开始时间（UTC），没有记录时返回None"""
+        if self.last_synced is None:
+            return None
+        return datetime.fromtimestamp(self.last_synced, tz=timezone.utc)
+
+    def __contains__(self, activity_id):
+        return str(activity_id) in self.activities
+
+    def get(self, activity_id):
+        return self.activities.get(str(activity_id))
+
+    def set_render_options(self, options):
+        """设置本次同步的生成选项，与已同步活动记录的选项不同时这些活动不会被跳过"""
+        self.render_options = options
+        if any(entry.get('render') != options for entry in self.activities.values() if entry.get('fingerprint')):
+            logger.info('生成选项与上次同步时不同，活动列表中已同步的活动将重新生成；'
+                        '使用 --fetch-all 或 --rerender 重新生成全部文件')
+
+    def is_unchanged(self, activity, runs_dir=None, static_dir=None):
+        """
+        活动已同步过、汇总指纹和生成选项都与记录的相同时返回True
+
+        传入runs_dir和static_dir时还要求markdown文件和记录的sidecar文件都存在，被删除的文件会重新生成。
+        重建清单得到的条目没有指纹，视为需要重新处理。
+        """
+        entry = self.get(activity.id)
+        if not entry or not entry.get('fingerprint'):
+            return False
+        if entry['fingerprint'] != summary_fingerprint(activity):
+            return False
+        if entry.get('render') != self.render_options:
+            return False
+        if runs_dir is not None and not os.path.exists(os.path.join(runs_dir, entry['file'])):
+            return False
+        if static_dir is not None:
+            return all(os.path.exists(os.path.join(static_dir, url)) for url in entry.get('sidecar') or ())
+        return True
+
+    def is_changed(self, activity):
+        """活动已同步过但汇总指纹变化（在Strava上被编辑过）时返回True"""
+        entry = self.get(activity.id)
+        fingerprint = entry.get('fingerprint') if entry else None
+        return fingerprint is not None and fingerprint != summary_fingerprint(activity)
+
+    def record(self, activity, file_name, digest, summary=None, sidecar_files=None):
+        """
+        记录一个已写入的活动，并用它的汇总字段更新汇总数据
+
+        sidecar_files为该活动的sidecar和细节层级文件相对于static目录的路径。
+        """
+        start_date = getattr(activity, 'start_date', None)
+        entry = {
+            'file': file_name,
+            'hash': digest,
+            'summary': summary,
+            'fingerprint': summary_fingerprint(activity),
+            'render': self.render_options,
+            'sidecar': sidecar_files or []
+        }
+        with self._lock:
+            # 内容未变化时不标记为已修改，避免无意义地改写清单文件
+            previous = self.activities.get(str(activity.id))
+            if previous != entry:
+                self.activities[str(activity.id)] = entry
+                self.dirty = True
+                if self.rollups is not None:
+                    self.rollups.update(previous.get('summary') if previous else None, summary)
+            if start_date:
+                timestamp = int(start_date.timestamp())
+                if self.last_synced is None or timestamp > self.last_synced:
+                    self.last_synced = timestamp
+                    self.dirty = True
+
+    def record_failure(self, activity):
+        """记录处理失败的活动，保证下次增量同步时会重新获取它"""
+        start_date = getattr(activity, 'start_date', None)
+        if not start_date:
+            return
+        timestamp = int(start_date.timestamp())
+        with self._lock:
+            if self._earliest_failure is None or timestamp < self._earliest_failure:
+                self._earliest_failure = timestamp
+
+    def save(self):
+        """有变更时通过临时文件加重命名原子地写回清单和汇总数据"""
+        with self._lock:
+            if self.rollups is not None:
+                self.rollups.save()
+            if not self.dirty:
+                return False
+            # 并发处理时较新的活动可能先完成，同步起点不能越过处理失败的活动
+            if self._earliest_failure is not None and self.last_synced is not None:
+                capped = min(self.last_synced, self._earliest_failure - 1)
+                if self._initial_last_synced is not None:
+                    capped = max(capped, self._initial_last_synced)
+                self.last_synced = capped
+            data = {
+                'version': MANIFEST_VERSION,
+                'last_synced': self.last_synced,
+                'activities': self.activities
+            }
+            directory = os.path.dirname(self.path)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+                    f.write('\n')
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, self.path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self.dirty = False
+            return True
@@ -0,0 +1,165 @@
+import os
+import re
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from run_writer import write_atomic
+
+METRICS_VERSION = 1
+
+# 指标名称的前缀，Prometheus文本格式中使用
+PROMETHEUS_PREFIX = 'strava_sync'
+
+# 接口路径中的活动ID等数字替换为占位符，按接口而不是按活动统计
+_ID_PATTERN = re.compile(r'/\d+(?=/|$)')
+
+
+def get_default_metrics_path():
+    """默认指标文件：项目根目录下的cache/sync_metrics.json"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(script_dir)
+    return os.path.join(project_root, 'cache', 'sync_metrics.json')
+
+
+def endpoint_name(url):
+    """将请求地址转换为接口名称，例如 /api/v3/activities/123/streams -> /activities/{id}/streams"""
+    path = urlsplit(url).path
+    if path.startswith('/api/v3'):
+        path = path[len('/api/v3'):]
+    return _ID_PATTERN.sub('/{id}', path) or '/'
+
+
+class SyncMetrics:
+    """
+    一次同步过程的指标
+
+    stage()统计各阶段的耗时和次数，并发处理时为所有线程、协程耗时的累计值；
+    record_request()按接口统计请求次数、响应字节数和错误响应数，重试的请求也分别计数。
+    所有线程共享同一个实例。
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.stages = {}
+        self.api = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, seconds):
+        with self._lock:
+            stage = self.stages.setdefault(name, {'seconds': 0.0, 'count': 0})
+            stage['seconds'] += seconds
+            stage['count'] += 1
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - started)
+
+    def record_request(self, url, status, size):
+        endpoint = endpoint_name(url)
+        with self._lock:
+            entry = self.api.setdefault(endpoint, {'calls': 0, 'bytes': 0, 'errors': 0})
+            entry['calls'] += 1
+            entry['bytes'] += size
+            if status >= 400:
+                entry['errors'] += 1
+
+    def report(self, governor, write_stats, cache=None, failures=None, succeeded=True, pool=None):
+        """汇总本次同步的全部指标"""
+        with self._lock:
+            stages = {name: dict(stage, seconds=round(stage['seconds'], 3)) for name, stage in self.stages.items()}
+            api = {endpoint: dict(entry) for endpoint, entry in self.api.items()}
+        return {
+            'version': METRICS_VERSION,
+            'started_at': datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(),
+            'finished_at': datetime.now(timezone.utc).isoformat(),
+            'succeeded': succeeded,
+            'wall_seconds': round(time.perf_counter() - self._started, 3),
+            'stages': stages,
+            'api': api,
+            'retries': governor.retries,
+            'throttled_seconds': round(governor.throttled_seconds, 3),
+            'rate_limit_headroom': {
+                prefix: {'15min': short_remaining, 'daily': long_remaining}
+                for prefix, (short_remaining, long_remaining) in governor.headroom().items()
+            },
+            'files': {
+                'written': write_stats.written,
+                'unchanged': write_stats.unchanged,
+                'skipped': write_stats.skipped,
+            },
+            'cache': {'hits': cache.hits, 'misses': cache.misses} if cache else None,
+            'http_pool': pool,
+            'failures': len(failures or []),
+        }
+
+
+def write_json_report(path, report):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    write_atomic(path, json.dumps(report, ensure_ascii=False, indent=2) + '\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+
+def format_prometheus(report):
+    """将指标转换为Prometheus文本格式，供node_exporter的textfile收集器读取"""
+    lines = []
+
+    def metric(name, help_text, samples):
+        name = f'{PROMETHEUS_PREFIX}_{name}'
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} gauge')
+        for labels, value in samples:
+            lines.append(f'{name}{labels} {value}')
+
+    finished_at = datetime.fromisoformat(report['finished_at']).timestamp()
+    metric('last_run_timestamp_seconds', 'Unix time the last sync finished.', [('', round(finished_at, 3))])
+    metric('succeeded', 'Whether the last sync finished without errors.', [('', int(report['succeeded']))])
+    metric('wall_seconds', 'Wall time of the last sync.', [('', report['wall_seconds'])])
+    metric('stage_seconds', 'Time spent in each stage, summed across workers.',
+           [(_labels(stage=name), stage['seconds']) for name, stage in sorted(report['stages'].items())])
+    metric('stage_count', 'Number of times each stage ran.',
+           [(_labels(stage=name), stage['count']) for name, stage in sorted(report['stages'].items())])
+    metric('api_calls', 'API requests per endpoint, including retries.',
+           [(_labels(endpoint=endpoint), entry['calls']) for endpoint, entry in sorted(report['api'].items())])
+    metric('api_response_bytes', 'Response body bytes per endpoint.',
+           [(_labels(endpoint=endpoint), entry['bytes']) for endpoint, entry in sorted(report['api'].items())])
+    metric('api_errors', 'Error responses per endpoint.',
+           [(_labels(endpoint=endpoint), entry['errors']) for endpoint, entry in sorted(report['api'].items())])
+    metric('retries', 'Requests retried after a failure or 429.', [('', report['retries'])])
+    metric('throttled_seconds', 'Time spent waiting for rate-limit windows or backoff.', [('', report['throttled_seconds'])])
+    metric('rate_limit_remaining', 'Requests left in each rate-limit window at the end of the sync.', [
+        (_labels(limit=prefix, window=window), remaining)
+        for prefix, windows in sorted(report['rate_limit_headroom'].items())
+        for window, remaining in windows.items()
+    ])
+    metric('files', 'Run files by write result.',
+           [(_labels(result=result), count) for result, count in report['files'].items()])
+    if report['cache']:
+        metric('cache_requests', 'API cache lookups by result.',
+               [(_labels(result=result), count) for result, count in report['cache'].items()])
+    if report.get('http_pool'):
+        metric('http_connections', 'HTTP connections opened by the shared pool.', [('', report['http_pool']['connections'])])
+        metric('http_requests', 'HTTP requests sent through the shared pool.', [('', report['http_pool']['requests'])])
+    metric('failures', 'Activities that failed to sync.', [('', report['failures'])])
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus_report(path, report):
+    """原子地写入Prometheus文本格式文件，避免收集器读到写了一半的文件"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    write_atomic(path, format_prometheus(report))
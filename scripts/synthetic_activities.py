@@ -0,0 +1,309 @@
+import math
+import random
+from datetime import datetime, timedelta, timezone
+
+# 典型的跑步距离（公里），从短距离到100英里越野
+PROFILES = {
+    '5k': 5.0,
+    '10k': 10.0,
+    'half': 21.1,
+    'marathon': 42.2,
+    '50k': 50.0,
+    '100mi': 160.9,
+}
+
+# 活动列表接口不返回的详情字段
+DETAIL_ONLY_FIELDS = ('calories', 'laps', 'splits_metric', 'segment_efforts', 'description')
+
+
+def _base_speed(distance_km):
+    """距离越长配速越慢：5公里约4分45秒/公里，100英里约9分/公里"""
+    return max(1.85, 3.6 - 0.35 * math.log(max(distance_km, 1) / 5 + 1, 2))
+
+
+def _isoformat(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _generate_streams(rng, distance_km, sample_interval):
+    """按秒生成时间、距离、心率、海拔、速度和步频序列，直到跑完指定距离"""
+    target = distance_km * 1000
+    base_speed = _base_speed(distance_km)
+    times, distances, heartrates, altitudes, velocities, cadences = [], [], [], [], [], []
+
+    t = 0.0
+    d = 0.0
+    altitude = rng.uniform(5, 800)
+    slope = 0.0
+    stopped = 0
+    while d < target:
+        # 偶尔停下来（红绿灯、补给站），停止期间速度为0
+        if stopped == 0 and rng.random() < 0.002:
+            stopped = rng.randint(5, 90)
+        fatigue = d / target
+        if stopped:
+            stopped -= 1
+            velocity = 0.0
+        else:
+            slope = 0.98 * slope + rng.gauss(0, 0.004)
+            velocity = max(0.5, base_speed * (1 - 0.12 * fatigue) * (1 - 3 * slope) + rng.gauss(0, 0.12))
+        times.append(int(round(t)))
+        distances.append(round(d, 1))
+        velocities.append(round(velocity, 3))
+        altitudes.append(round(altitude, 1))
+        heartrates.append(int(max(60, min(200, 125 + 25 * velocity / base_speed + 15 * fatigue + rng.gauss(0, 2)))))
+        cadences.append(0 if velocity == 0 else int(round(84 + 4 * (velocity - base_speed) + rng.gauss(0, 1))))
+
+        # 智能记录模式会跳过部分采样点，时间间隔不完全均匀
+        dt = sample_interval * rng.choice((1, 1, 1, 2))
+        t += dt
+        d = min(target, d + velocity * dt)
+        altitude += slope * velocity * dt
+
+    size = len(times)
+    return {
+        name: {'data': data, 'series_type': 'distance', 'original_size': size, 'resolution': 'high'}
+        for name, data in (
+            ('time', times),
+            ('distance', distances),
+            ('heartrate', heartrates),
+            ('altitude', altitudes),
+            ('velocity_smooth', velocities),
+            ('cadence', cadences),
+        )
+    }
+
+
+def _window_stats(streams, start, end):
+    """计算 [start, end] 下标范围内的时间、距离、心率和爬升"""
+    times = streams['time']['data']
+    distances = streams['distance']['data']
+    heartrates = streams['heartrate']['data'][start:end + 1]
+    altitudes = streams['altitude']['data'][start:end + 1]
+    velocities = streams['velocity_smooth']['data'][start:end + 1]
+    elapsed = times[end] - times[start] or 1
+    moving = sum(1 for v in velocities if v > 0) * (elapsed / max(len(velocities), 1))
+    distance = distances[end] - distances[start]
+    gain = sum(max(b - a, 0) for a, b in zip(altitudes, altitudes[1:]))
+    return {
+        'elapsed_time': int(elapsed),
+        'moving_time': int(moving) or 1,
+        'distance': round(distance, 1),
+        'average_speed': round(distance / elapsed, 3),
+        'max_speed': round(max(velocities), 3),
+        'average_heartrate': round(sum(heartrates) / len(heartrates), 1),
+        'max_heartrate': float(max(heartrates)),
+        'total_elevation_gain': round(gain, 1),
+        'elevation_difference': round(altitudes[-1] - altitudes[0], 1),
+    }
+
+
+def _boundaries(distances, step):
+    """按距离每step米切分，返回每段的 (起始下标, 结束下标)"""
+    bounds = []
+    start = 0
+    next_mark = step
+    for i, d in enumerate(distances):
+        if d >= next_mark:
+            bounds.append((start, i))
+            start = i
+            next_mark += step
+    if start < len(distances) - 1:
+        bounds.append((start, len(distances) - 1))
+    return bounds
+
+
+def generate_activity(activity_id, distance_km, seed=0, start_date=None, lap_distance=1000, sample_interval=1.0):
+    """
+    生成一条与Strava API响应结构相同的跑步活动
+
+    返回 (活动详情原始响应, 以类型为键的流数据原始响应)。相同的activity_id、距离和seed
+    总是生成相同的数据。分圈按lap_distance米切分，公里分割按1000米切分，
+    分圈和公里分割的start_index/end_index与流数据的下标对应。
+    """
+    rng = random.Random(seed * 1000003 + activity_id)
+    start_date = start_date or datetime(2024, 1, 1, 6, 30, tzinfo=timezone.utc)
+    utc_offset = 8 * 3600
+    streams = _generate_streams(rng, distance_km, sample_interval)
+    times = streams['time']['data']
+    distances = streams['distance']['data']
+    overall = _window_stats(streams, 0, len(times) - 1)
+
+    laps = []
+    for i, (start, end) in enumerate(_boundaries(distances, lap_distance)):
+        stats = _window_stats(streams, start, end)
+        lap_start = start_date + timedelta(seconds=times[start])
+        laps.append({
+            'id': activity_id * 1000 + i,
+            'resource_state': 2,
+            'name': f'Lap {i + 1}',
+            'lap_index': i + 1,
+            'split': i + 1,
+            'start_index': start,
+            'end_index': end,
+            'start_date': _isoformat(lap_start),
+            'start_date_local': _isoformat(lap_start + timedelta(seconds=utc_offset)),
+            'average_cadence': round(sum(streams['cadence']['data'][start:end + 1]) / (end - start + 1), 1),
+            **{key: stats[key] for key in (
+                'elapsed_time', 'moving_time', 'distance', 'average_speed', 'max_speed',
+                'average_heartrate', 'max_heartrate', 'total_elevation_gain'
+            )},
+        })
+
+    splits = []
+    for i, (start, end) in enumerate(_boundaries(distances, 1000)):
+        stats = _window_stats(streams, start, end)
+        splits.append({
+            'split': i + 1,
+            'pace_zone': rng.randint(1, 5),
+            **{key: stats[key] for key in (
+                'elapsed_time', 'moving_time', 'distance', 'average_speed',
+                'average_heartrate', 'elevation_difference'
+            )},
+        })
+
+    segment_efforts = []
+    for i in range(int(distance_km // 4)):
+        start = rng.randrange(0, max(1, len(times) - 600))
+        end = min(len(times) - 1, start + rng.randint(60, 600))
+        stats = _window_stats(streams, start, end)
+        effort_start = start_date + timedelta(seconds=times[start])
+        altitudes = streams['altitude']['data'][start:end + 1]
+        segment_efforts.append({
+            'id': activity_id * 1000 + 500 + i,
+            'resource_state': 2,
+            'name': f'Segment {activity_id}-{i + 1}',
+            'elapsed_time': stats['elapsed_time'],
+            'moving_time': stats['moving_time'],
+            'distance': stats['distance'],
+            'average_heartrate': stats['average_heartrate'],
+            'max_heartrate': stats['max_heartrate'],
+            'start_index': start,
+            'end_index': end,
+            'start_date': _isoformat(effort_start),
+            'start_date_local': _isoformat(effort_start + timedelta(seconds=utc_offset)),
+            'segment': {
+                'id': activity_id * 1000 + 500 + i,
+                'resource_state': 2,
+                'name': f'Segment {activity_id}-{i + 1}',
+                'activity_type': 'Run',
+                'distance': stats['distance'],
+                'average_grade': round(100 * stats['elevation_difference'] / max(stats['distance'], 1), 1),
+                'maximum_grade': round(abs(100 * stats['elevation_difference'] / max(stats['distance'], 1)) * 2, 1),
+                'elevation_high': max(altitudes),
+                'elevation_low': min(altitudes),
+            },
+        })
+
+    detail = {
+        'id': activity_id,
+        'resource_state': 3,
+        'athlete': {'id': 1, 'resource_state': 1},
+        'name': f'Run {activity_id}',
+        'type': 'Run',
+        'sport_type': 'Run',
+        'distance': overall['distance'],
+        'moving_time': overall['moving_time'],
+        'elapsed_time': overall['elapsed_time'],
+        'total_elevation_gain': overall['total_elevation_gain'],
+        'start_date': _isoformat(start_date),
+        'start_date_local': _isoformat(start_date + timedelta(seconds=utc_offset)),
+        'timezone': '(GMT+08:00) Asia/Shanghai',
+        'utc_offset': utc_offset,
+        'average_speed': overall['average_speed'],
+        'max_speed': overall['max_speed'],
+        'average_cadence': round(sum(streams['cadence']['data']) / len(times), 1),
+        'has_heartrate': True,
+        'average_heartrate': overall['average_heartrate'],
+        'max_heartrate': overall['max_heartrate'],
+        'calories': round(overall['distance'] * 0.065, 1),
+        'laps': laps,
+        'splits_metric': splits,
+        'segment_efforts': segment_efforts,
+    }
+    return detail, streams
+
+
+def summary_from_detail(detail):
+    """由活动详情得到活动列表接口返回的汇总数据"""
+    summary = {key: value for key, value in detail.items() if key not in DETAIL_ONLY_FIELDS}
+    summary['resource_state'] = 2
+    return summary
+
+
+# 合成历史记录中各类距离（公里）的出现权重，以日常跑为主，偶尔有比赛和越野
+HISTORY_DISTANCES = ((5.0, 30), (8.0, 25), (10.0, 20), (15.0, 10), (21.1, 8), (30.0, 4), (42.2, 2), (50.0, 0.7), (160.9, 0.3))
+
+# 非跑步活动所占比例，用来覆盖同步脚本中按类型过滤的逻辑
+OTHER_ACTIVITY_RATIO = 0.1
+
+
+class SyntheticHistory:
+    """
+    按时间倒序生成一名运动员的完整活动历史
+
+    活动列表的汇总数据在创建时一次生成；活动详情和流数据在请求时按活动ID确定性地生成，
+    顶层字段与汇总数据保持一致，因此上万条活动的历史也不必预先生成全部流数据。
+    """
+
+    def __init__(self, count, seed=0, end_date=None, sample_interval=1.0):
+        self.seed = seed
+        self.sample_interval = sample_interval
+        rng = random.Random(seed)
+        distances = [distance for distance, _ in HISTORY_DISTANCES]
+        weights = [weight for _, weight in HISTORY_DISTANCES]
+        current = end_date or datetime.now(timezone.utc).replace(microsecond=0)
+
+        self.summaries = []
+        self._distances = {}
+        for i in range(count):
+            current -= timedelta(hours=rng.uniform(10, 50))
+            activity_id = 10_000_000 + count - i
+            distance_km = rng.choices(distances, weights)[0]
+            activity_type = 'Ride' if rng.random() < OTHER_ACTIVITY_RATIO else 'Run'
+            self._distances[activity_id] = distance_km
+            self.summaries.append(self._summary(rng, activity_id, distance_km, activity_type, current))
+        self._by_id = {summary['id']: summary for summary in self.summaries}
+
+    def _summary(self, rng, activity_id, distance_km, activity_type, start_date):
+        speed = _base_speed(distance_km) * rng.uniform(0.88, 1.02) * (2.5 if activity_type == 'Ride' else 1)
+        distance = round(distance_km * 1000 * rng.uniform(0.99, 1.01), 1)
+        moving_time = int(distance / speed)
+        utc_offset = 8 * 3600
+        return {
+            'id': activity_id,
+            'resource_state': 2,
+            'athlete': {'id': 1, 'resource_state': 1},
+            'name': f'{"Morning" if start_date.hour < 12 else "Evening"} {activity_type} {activity_id}',
+            'type': activity_type,
+            'sport_type': activity_type,
+            'distance': distance,
+            'moving_time': moving_time,
+            'elapsed_time': int(moving_time * rng.uniform(1.0, 1.1)),
+            'total_elevation_gain': round(distance_km * rng.uniform(2, 15), 1),
+            'start_date': _isoformat(start_date),
+            'start_date_local': _isoformat(start_date + timedelta(seconds=utc_offset)),
+            'timezone': '(GMT+08:00) Asia/Shanghai',
+            'utc_offset': utc_offset,
+            'average_speed': round(distance / moving_time, 3),
+            'max_speed': round(speed * rng.uniform(1.2, 1.6), 3),
+            'average_cadence': round(rng.uniform(80, 92), 1),
+            'has_heartrate': True,
+            'average_heartrate': round(rng.uniform(135, 165), 1),
+            'max_heartrate': float(rng.randint(165, 195)),
+        }
+
+    def __len__(self):
+        return len(self.summaries)
+
+    def generate(self, activity_id):
+        """生成活动详情和流数据，活动不存在时返回None"""
+        summary = self._by_id.get(activity_id)
+        if summary is None:
+            return None
+        start_date = datetime.strptime(summary['start_date'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+        detail, streams = generate_activity(activity_id, self._distances[activity_id], seed=self.seed,
+                                            start_date=start_date, sample_interval=self.sample_interval)
+        detail.update(summary)
+        detail['resource_state'] = 3
+        return detail, streams
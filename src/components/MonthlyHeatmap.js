@@ -22,12 +22,21 @@ const MonthlyHeatmap = ({ startDate, endDate, calendarData, maxDistance }) => {
   const dailyAvgPace = {};
   const dailyAvgHeartRate = {};
   
+  // 按日期建立索引，避免每一天都遍历一遍日历数据
+  const calendarByDay = {};
+  calendarData.forEach(item => {
+    if (!calendarByDay[item.day]) {
+      calendarByDay[item.day] = [];
+    }
+    calendarByDay[item.day].push(item);
+  });
+  
   for (let day = 1; day <= daysInMonth; day++) {
     // 使用本地时间创建日期，避免时区问题
     const date = new Date(startDate.getFullYear(), startDate.getMonth(), day);
     // 使用本地日期格式化，避免时区偏移
     const formattedDate = `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, '0')}-${String(date.getDate()).padStart(2, '0')}`;
-    const dayRuns = calendarData.filter(item => item.day === formattedDate);
+    const dayRuns = calendarByDay[formattedDate] || [];
     
     if (dayRuns.length > 0) {
       // 计算总距离
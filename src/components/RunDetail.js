@@ -1,7 +1,7 @@
 import React from 'react'
-import { VictoryChart, VictoryLine, VictoryAxis, VictoryTheme, VictoryContainer, VictoryArea } from 'victory'
+import { VictoryChart, VictoryLine, VictoryAxis, VictoryTheme, VictoryContainer, VictoryZoomContainer, VictoryArea } from 'victory'
 
-const RunDetail = ({ runData, segments, splits: propsSplits }) => {
+const RunDetail = ({ runData, segments, splits: propsSplits, onZoomChange }) => {
   // 检测是否为移动端 - 必须在组件顶层调用Hooks
   const [isMobile, setIsMobile] = React.useState(false);
   
@@ -224,6 +224,22 @@ const RunDetail = ({ runData, segments, splits: propsSplits }) => {
   const paceData = segments?.pace_data || []
   const elevationData = segments?.elevation_data || []
 
+  // 页面提供了更精细的数据层级时允许沿时间轴缩放图表，并把缩放倍数告诉页面以便加载合适的层级
+  // 完整精度的序列可能有上万个点，不用展开参数的Math.max/Math.min
+  const chartRange = [heartRateData, paceData, elevationData].reduce(([min, max], data) => (
+    data.length > 0 ? [Math.min(min, data[0].x), Math.max(max, data[data.length - 1].x)] : [min, max]
+  ), [Infinity, -Infinity])
+  const chartSpan = chartRange[1] > chartRange[0] ? chartRange[1] - chartRange[0] : 0
+  const handleZoom = (domain) => {
+    const visibleSpan = domain.x[1] - domain.x[0]
+    if (chartSpan > 0 && visibleSpan > 0) {
+      onZoomChange(Math.max(1, chartSpan / visibleSpan))
+    }
+  }
+  const chartContainer = onZoomChange
+    ? <VictoryZoomContainer responsive={true} zoomDimension="x" onZoomDomainChange={handleZoom} />
+    : <VictoryContainer responsive={true} />
+  
   return (
     <div style={stravaStyles.container}>
       <h2 style={{ 
@@ -409,6 +425,7 @@ const RunDetail = ({ runData, segments, splits: propsSplits }) => {
                   <th style={stravaStyles.tableHeaderRight}>配速</th>
                   <th style={stravaStyles.tableHeaderRight}>平均心率</th>
                   <th style={stravaStyles.tableHeaderRight}>最大心率</th>
+                  <th style={stravaStyles.tableHeaderRight}>步频</th>
                   <th style={stravaStyles.tableHeaderRight}>爬升 (m)</th>
                 </tr>
               </thead>
@@ -454,7 +471,14 @@ const RunDetail = ({ runData, segments, splits: propsSplits }) => {
                       ) : '-'}
                     </td>
                     <td style={stravaStyles.tableCellRight}>
-                      {Math.round(lap.elevation_difference || 0)}
+                      {/* Strava的跑步步频为单脚每分钟步数，显示时换算为双脚 */}
+                      {lap.average_cadence ? Math.round(lap.average_cadence * 2) : '-'}
+                    </td>
+                    <td style={stravaStyles.tableCellRight}>
+                      {/* Strava分圈没有爬升数据时显示由海拔流数据计算的爬升，并标明来源 */}
+                      {!lap.elevation_difference && lap.elevation_gain != null ? (
+                        <span title="由海拔流数据计算">≈{Math.round(lap.elevation_gain)}</span>
+                      ) : Math.round(lap.elevation_difference || 0)}
                     </td>
                   </tr>
                 ))}
@@ -553,7 +577,7 @@ const RunDetail = ({ runData, segments, splits: propsSplits }) => {
                   theme={VictoryTheme.material}
                   height={200}
                   padding={{ top: 10, bottom: 30, left: 50, right: 20 }}
-                  containerComponent={<VictoryContainer responsive={true} />}
+                  containerComponent={chartContainer}
                 >
                   <VictoryArea
                     style={{
@@ -590,7 +614,7 @@ const RunDetail = ({ runData, segments, splits: propsSplits }) => {
                   theme={VictoryTheme.material}
                   height={200}
                   padding={{ top: 10, bottom: 30, left: 50, right: 20 }}
-                  containerComponent={<VictoryContainer responsive={true} />}
+                  containerComponent={chartContainer}
                 >
                   <VictoryLine
                     style={{
@@ -626,7 +650,7 @@ const RunDetail = ({ runData, segments, splits: propsSplits }) => {
                   theme={VictoryTheme.material}
                   height={200}
                   padding={{ top: 10, bottom: 30, left: 50, right: 20 }}
-                  containerComponent={<VictoryContainer responsive={true} />}
+                  containerComponent={chartContainer}
                 >
                   <VictoryArea
                     style={{
@@ -1,30 +1,25 @@
 import React from 'react'
+import { bucketAveragePace } from '../utils/rollups'
 
-const StatsSummary = ({ runs, isMobile }) => {
-  // 筛选当前年份的数据
-  const filteredRuns = runs.filter(run => {
-    const runDate = new Date(run.frontmatter.date)
-    const now = new Date()
-    return runDate.getFullYear() === now.getFullYear()
-  })
+const StatsSummary = ({ yearStats, isMobile }) => {
+  // 当前年份的汇总数据由同步脚本预先计算
+  const hasRuns = Boolean(yearStats && yearStats.runs > 0)
 
-  // 计算总距离
-  const totalDistance = filteredRuns.reduce((sum, run) => sum + run.frontmatter.distance / 1000, 0)
+  // 总距离
+  const totalDistance = hasRuns ? yearStats.distance : 0
   
-  // 计算总时长
-  const totalDuration = filteredRuns.reduce((sum, run) => sum + (run.frontmatter.duration || 0), 0)
+  // 总时长
+  const totalDuration = hasRuns ? yearStats.duration : 0
   
-  // 计算总爬升
-  const totalElevation = filteredRuns.reduce((sum, run) => sum + (run.frontmatter.elevation || 0), 0)
+  // 总爬升
+  const totalElevation = hasRuns ? yearStats.elevation : 0
   
-  // 计算平均配速
-  const avgPace = filteredRuns.length > 0 
-    ? filteredRuns.reduce((sum, run) => sum + (run.frontmatter.avg_pace || 0), 0) / filteredRuns.length
-    : 0
+  // 平均配速
+  const avgPace = bucketAveragePace(yearStats)
   
   const paceMinutes = Math.floor(avgPace)
   const paceSeconds = Math.floor((avgPace - paceMinutes) * 60)
-  const formattedPace = filteredRuns.length > 0 
+  const formattedPace = hasRuns 
     ? `${paceMinutes}'${paceSeconds.toString().padStart(2, '0')}"`
     : "0'00\""
 
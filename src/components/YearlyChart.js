@@ -1,32 +1,20 @@
 import React from 'react'
 import { VictoryBar, VictoryChart, VictoryTheme, VictoryLabel, VictoryAxis, VictoryContainer, VictoryTooltip } from 'victory'
 
-const YearlyChart = ({ data, runs }) => {
-  // 计算每月的平均配速和心率
+const YearlyChart = ({ data }) => {
+  // 每月的平均配速和心率已由汇总数据计算好，这里只做格式化
   const monthlyStats = data.map(monthData => {
-    const monthRuns = runs.filter(run => {
-      const runDate = new Date(run.frontmatter.date);
-      const monthIndex = runDate.getMonth();
-      const monthName = monthData.x.replace('月', '');
-      return monthIndex === parseInt(monthName) - 1;
-    });
-    
-    if (monthRuns.length > 0) {
-      // 计算平均配速
-      const avgPace = monthRuns.reduce((sum, run) => sum + (run.frontmatter.avg_pace || 0), 0) / monthRuns.length;
-      const paceMin = Math.floor(avgPace);
-      const paceSec = Math.round((avgPace - paceMin) * 60);
-      
-      // 计算平均心率
-      const avgHeartRate = monthRuns.reduce((sum, run) => sum + (run.frontmatter.avg_heartrate || 0), 0) / monthRuns.length;
+    if (monthData.runs > 0) {
+      const paceMin = Math.floor(monthData.pace);
+      const paceSec = Math.round((monthData.pace - paceMin) * 60);
       
       return {
         ...monthData,
         pace: `${paceMin}'${paceSec.toString().padStart(2, '0')}"`,
-        heartrate: Math.round(avgHeartRate)
+        heartrate: Math.round(monthData.heartrate)
       };
     }
-    return monthData;
+    return { ...monthData, pace: null, heartrate: null };
   });
   return (
     <div style={{ flex: '1 1 100%', minWidth: '280px', maxWidth: '100%', background: 'white', padding: '20px', borderRadius: '14px', boxShadow: '0 4px 20px rgba(0,0,0,0.05)', height: '300px', display: 'flex', flexDirection: 'column' }}>
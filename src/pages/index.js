@@ -8,6 +8,14 @@ import YearlyChart from '../components/YearlyChart'
 import Profile from '../components/Profile'
 import AllRunsData from '../components/AllRunsData'
 import StatsSummary from '../components/StatsSummary'
+import {
+  formatDateKey,
+  formatMonthKey,
+  bucketAveragePace,
+  bucketAverageHeartrate,
+  bucketWeightedPace,
+  bucketWeightedHeartrate
+} from '../utils/rollups'
 import '../styles/mobile.css'
 
 export const query = graphql`
@@ -30,12 +38,17 @@ export const query = graphql`
         fileAbsolutePath
       }
     }
+    stravaRollups {
+      days
+      months
+      years
+    }
   }
 `
 
 const IndexPage = ({ data }) => {
   const runs = data.allMarkdownRemark.nodes
-  const [selectedRange, setSelectedRange] = useState('week')
+  const rollups = data.stravaRollups
   const [isMobile, setIsMobile] = useState(false)
 
 
@@ -55,167 +68,76 @@ const IndexPage = ({ data }) => {
 
   // 移动端样式已移至外部 CSS 文件 src/styles/mobile.css
 
-  const processData = () => {
-    const now = new Date()
-    // 首先过滤符合时间范围的跑步数据
-    const filteredData = runs.filter(run => {
-      const runDate = new Date(run.frontmatter.date)
-      const timeDiff = now - runDate
-      
-      switch(selectedRange) {
-        case 'week':
-          return timeDiff < 7 * 86400000
-        case 'month':
-          return runDate.getMonth() === now.getMonth() && 
-                 runDate.getFullYear() === now.getFullYear()
-        case 'year':
-          return runDate.getFullYear() === now.getFullYear()
-        default:
-          return true
-      }
-    })
-    
-    // 按日期分组数据
-    const groupedByDate = {}
-    
-    filteredData.forEach(run => {
-      const date = new Date(run.frontmatter.date)
-      const formattedDate = `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, '0')}-${String(date.getDate()).padStart(2, '0')}`
-      
-      if (!groupedByDate[formattedDate]) {
-        groupedByDate[formattedDate] = []
-      }
-      
-      groupedByDate[formattedDate].push(run)
-    })
-    
-    // 合并每天的数据
-    return Object.entries(groupedByDate).map(([date, dayRuns]) => {
-      // 计算总距离
-      const totalDistance = dayRuns.reduce((sum, run) => sum + run.frontmatter.distance / 1000, 0)
-      
-      // 计算加权平均配速
-      let totalWeightedPace = 0
-      let totalHeartRate = 0
-      let totalHeartRateWeight = 0
-      
-      dayRuns.forEach(run => {
-        const distance = run.frontmatter.distance / 1000
-        if (run.frontmatter.avg_pace) {
-          totalWeightedPace += run.frontmatter.avg_pace * distance
-        }
-        
-        if (run.frontmatter.avg_heartrate) {
-          totalHeartRate += run.frontmatter.avg_heartrate * distance
-          totalHeartRateWeight += distance
-        }
-      })
-      
-      // 计算平均配速和心率
-      const avgPace = totalDistance > 0 ? totalWeightedPace / totalDistance : 0
-      const avgHeartRate = totalHeartRateWeight > 0 ? totalHeartRate / totalHeartRateWeight : 0
-      
-      // 添加跑步次数信息
-      const runsCount = dayRuns.length
-      
-      return {
-        x: date,
-        y: parseFloat(totalDistance.toFixed(2)), // 保持精度一致，保留两位小数
-        pace: avgPace > 0 ? `${Math.floor(avgPace)}:${Math.floor((avgPace % 1) * 60).toString().padStart(2, '0')}` : '-',
-        heartrate: avgHeartRate > 0 ? Math.round(avgHeartRate) : '-',
-        runsCount: runsCount
-      }
-    })
-  }
-
-  const filteredRuns = processData()
-  
-  // 根据当前选择的时间范围筛选原始数据 - 这部分逻辑已移到 StatsSummary 组件中
+  // 以下数据都直接读取同步脚本预先计算好的汇总数据，不再遍历全部跑步记录
+  const now = new Date()
+  const currentYear = now.getFullYear()
+  const currentMonth = now.getMonth()
 
-  // 处理月度日历数据 - 使用与周视图相同的处理方式
-  // 首先按日期分组原始数据
-  const calendarGroupedByDate = {}
-  
-  runs.forEach(run => {
-    const date = new Date(run.frontmatter.date)
-    const formattedDate = `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, '0')}-${String(date.getDate()).padStart(2, '0')}`
-    
-    if (!calendarGroupedByDate[formattedDate]) {
-      calendarGroupedByDate[formattedDate] = []
+  // 最近7×24小时内的跑步按天分组；只有这几条记录需要在页面上合并，其余视图读取汇总数据
+  const weekBuckets = {}
+  runs.filter(run => now - new Date(run.frontmatter.date) < 7 * 86400000).forEach(run => {
+    const day = formatDateKey(new Date(run.frontmatter.date))
+    const distance = run.frontmatter.distance / 1000
+    const bucket = weekBuckets[day] || (weekBuckets[day] = { runs: 0, distance: 0, pace_weighted: 0, hr_weighted: 0, hr_distance: 0 })
+    bucket.runs += 1
+    bucket.distance += distance
+    if (run.frontmatter.avg_pace) {
+      bucket.pace_weighted += run.frontmatter.avg_pace * distance
+    }
+    if (run.frontmatter.avg_heartrate) {
+      bucket.hr_weighted += run.frontmatter.avg_heartrate * distance
+      bucket.hr_distance += distance
     }
-    
-    calendarGroupedByDate[formattedDate].push(run)
   })
-  
-  // 合并每天的数据
-  const calendarData = Object.entries(calendarGroupedByDate).map(([date, dayRuns]) => {
-    // 计算总距离
-    const totalDistance = dayRuns.reduce((sum, run) => sum + run.frontmatter.distance / 1000, 0)
-    
-    // 计算加权平均配速和心率
-    let totalWeightedPace = 0
-    let totalHeartRate = 0
-    let totalHeartRateWeight = 0
-    
-    dayRuns.forEach(run => {
-      const distance = run.frontmatter.distance / 1000
-      if (run.frontmatter.avg_pace) {
-        totalWeightedPace += run.frontmatter.avg_pace * distance
-      }
-      
-      if (run.frontmatter.avg_heartrate) {
-        totalHeartRate += run.frontmatter.avg_heartrate * distance
-        totalHeartRateWeight += distance
-      }
-    })
-    
-    // 计算平均配速和心率
-    const avgPace = totalDistance > 0 ? totalWeightedPace / totalDistance : 0
-    const avgHeartRate = totalHeartRateWeight > 0 ? totalHeartRate / totalHeartRateWeight : 0
-    
-    // 添加跑步次数信息
-    const runsCount = dayRuns.length
+  const filteredRuns = Object.keys(weekBuckets).sort().map(day => {
+    const bucket = weekBuckets[day]
+    const avgPace = bucketWeightedPace(bucket)
+    const avgHeartRate = bucketWeightedHeartrate(bucket)
     
     return {
-      day: date,
-      value: parseFloat(totalDistance.toFixed(2)), // 保留两位小数，保持精度一致
-      pace: avgPace,
-      heartrate: avgHeartRate,
-      runsCount: runsCount
+      x: day,
+      y: parseFloat(bucket.distance.toFixed(2)), // 保持精度一致，保留两位小数
+      pace: avgPace > 0 ? `${Math.floor(avgPace)}:${Math.floor((avgPace % 1) * 60).toString().padStart(2, '0')}` : '-',
+      heartrate: avgHeartRate > 0 ? Math.round(avgHeartRate) : '-',
+      runsCount: bucket.runs
     }
-  }).sort((a, b) => new Date(a.day) - new Date(b.day));
+  })
+
+  // 处理月度日历数据：当月每天的跑步数据
+  const monthPrefix = formatMonthKey(currentYear, currentMonth)
+  const calendarData = Object.entries(rollups.days)
+    .filter(([day]) => day.startsWith(monthPrefix))
+    .map(([day, bucket]) => ({
+      day,
+      value: parseFloat(bucket.distance.toFixed(2)), // 保留两位小数，保持精度一致
+      pace: bucketWeightedPace(bucket),
+      heartrate: bucketWeightedHeartrate(bucket),
+      runsCount: bucket.runs
+    }))
+    .sort((a, b) => a.day.localeCompare(b.day))
 
   // 获取当前日期范围
-  const now = new Date()
-  const currentYear = now.getFullYear()
-  const currentMonth = now.getMonth()
   const startDate = new Date(currentYear, currentMonth, 1) // 从当前月份开始
   const endDate = new Date(currentYear, currentMonth + 1, 0) // 到当前月底结束
 
   // 获取数据中的最大跑步距离
-  const maxDistance = Math.max(...calendarData.filter(data => {
-    const date = new Date(data.day)
-    return date.getMonth() === currentMonth && date.getFullYear() === currentYear
-  }).map(data => data.value))
-
-  // 处理年度数据
-  const yearlyData = runs.reduce((acc, run) => {
-    const date = new Date(run.frontmatter.date)
-    const currentYear = new Date().getFullYear()
-    if (date.getFullYear() === currentYear) {
-      const monthIdx = date.getMonth() // 0-11
-      if (!acc[monthIdx]) acc[monthIdx] = 0
-      acc[monthIdx] += run.frontmatter.distance / 1000
-    }
-    return acc
-  }, {})
+  const maxDistance = Math.max(...calendarData.map(data => data.value))
 
   // 生成完整的12个月份数据
   const monthLabels = ['1月','2月','3月','4月','5月','6月','7月','8月','9月','10月','11月','12月']
-  const yearlyChartData = monthLabels.map((label, idx) => ({
-    x: label,
-    y: yearlyData[idx] || 0
-  }))
+  const yearlyChartData = monthLabels.map((label, idx) => {
+    const bucket = rollups.months[formatMonthKey(currentYear, idx)]
+    return {
+      x: label,
+      y: bucket ? bucket.distance : 0,
+      runs: bucket ? bucket.runs : 0,
+      pace: bucketAveragePace(bucket),
+      heartrate: bucketAverageHeartrate(bucket)
+    }
+  })
+
+  // 本年汇总
+  const yearStats = rollups.years[String(currentYear)]
 
   return (
     <main style={{ maxWidth: '1400px', margin: '0 auto', padding: '20px' }}>
@@ -230,16 +152,13 @@ const IndexPage = ({ data }) => {
         <MonthlyHeatmap 
           startDate={startDate} 
           endDate={endDate} 
-          calendarData={calendarData.filter(item => {
-            const date = new Date(item.day);
-            return date.getMonth() === currentMonth && date.getFullYear() === currentYear;
-          })} 
+          calendarData={calendarData} 
           maxDistance={maxDistance} 
         />
-        <YearlyChart data={yearlyChartData} runs={runs} />
+        <YearlyChart data={yearlyChartData} />
       </div>
 
-      <StatsSummary runs={runs} isMobile={isMobile} />
+      <StatsSummary yearStats={yearStats} isMobile={isMobile} />
 
       <AllRunsData runs={runs} />
     </main>
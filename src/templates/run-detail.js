@@ -1,18 +1,95 @@
-import React from 'react'
-import { graphql, Link } from 'gatsby'
+import React, { useEffect, useState } from 'react'
+import { graphql, Link, withPrefix } from 'gatsby'
 import RunDetail from '../components/RunDetail'
+import { decodeChannels, channelsToSeries } from '../utils/streamCodec'
+
+// 把sidecar文件中按列存储的序列转换为图表使用的 {x, y} 数据点
+const toPoints = (series) => {
+  if (!series) return []
+  return series.x.map((x, i) => ({ x, y: series.y[i] }))
+}
+
+// 每个数据点大约占两个物理像素时曲线已经足够清晰，更多的点不会带来可见的差别
+const PIXELS_PER_POINT = 2
+
+// 根据图表宽度和缩放倍数选择细节层级：点数足够的最粗层级，都不够时使用最精细的层级
+const pickTier = (tiers, width, zoom) => {
+  const needed = width / PIXELS_PER_POINT * zoom
+  return tiers.find(tier => tier.points >= needed) || tiers[tiers.length - 1]
+}
+
+const loadFile = (url) => fetch(withPrefix(`/${url}`)).then(response => {
+  if (!response.ok) throw new Error(`HTTP ${response.status}`)
+  return response
+})
+
+const loadJson = (url) => loadFile(url).then(response => response.json())
+
+// 细节层级文件为二进制格式（.strm），解码后还原为与sidecar相同的按列存储的序列
+const loadTierSeries = (url) => {
+  if (!url.endsWith('.strm')) return loadJson(url).then(result => result.series)
+  return loadFile(url)
+    .then(response => response.arrayBuffer())
+    .then(decodeChannels)
+    .then(({ channels }) => channelsToSeries(channels))
+}
 
 // 跑步详情页面模板
 const RunDetailTemplate = ({ data }) => {
   const { markdownRemark } = data
-  const { frontmatter, html } = markdownRemark
+  const sidecarUrl = markdownRemark.frontmatter.sidecar
+  const [sidecar, setSidecar] = useState(null)
+  const [zoom, setZoom] = useState(1)
+  const [tierSeries, setTierSeries] = useState({})
+  const [activeTier, setActiveTier] = useState(null)
+  
+  // 图表和表格数据保存在sidecar文件中时，在浏览器中按需加载
+  useEffect(() => {
+    if (!sidecarUrl) return
+    let cancelled = false
+    loadJson(sidecarUrl)
+      .then(result => {
+        if (!cancelled) setSidecar(result)
+      })
+      .catch(e => console.error('Error loading sidecar data:', e))
+    return () => { cancelled = true }
+  }, [sidecarUrl])
+  
+  // 图表宽度或缩放倍数需要更多数据点时加载更精细的层级，已加载的层级不会重复请求
+  useEffect(() => {
+    if (!sidecar || !sidecar.tiers || sidecar.tiers.length < 2) return
+    const width = Math.min(window.innerWidth, 1400) * (window.devicePixelRatio || 1)
+    const tier = pickTier(sidecar.tiers, width, zoom)
+    if (!tier.url || tierSeries[tier.name]) {
+      setActiveTier(tier.name)
+      return
+    }
+    let cancelled = false
+    loadTierSeries(tier.url)
+      .then(series => {
+        if (cancelled) return
+        setTierSeries(loaded => ({ ...loaded, [tier.name]: series }))
+        setActiveTier(tier.name)
+      })
+      .catch(e => console.error('Error loading stream tier:', e))
+    return () => { cancelled = true }
+  }, [sidecar, zoom, tierSeries])
+  
+  const frontmatter = sidecar ? {
+    ...markdownRemark.frontmatter,
+    segments: sidecar.segments,
+    splits: sidecar.splits,
+    laps: sidecar.laps
+  } : markdownRemark.frontmatter
   
-  // 从 frontmatter 中提取分段数据、公里分割数据和流数据
+  // 从 frontmatter 或 sidecar 中提取分段数据、公里分割数据和流数据；
+  // sidecar中的series为概览层级，更精细的层级加载完成后替换
+  const series = sidecar ? (tierSeries[activeTier] || sidecar.series) : null
   const segmentData = {
     segment_efforts: frontmatter.segments || [],
-    heartrate_data: frontmatter.heartrate_data || [],
-    pace_data: frontmatter.pace_data || [],
-    elevation_data: frontmatter.elevation_data || []
+    heartrate_data: series ? toPoints(series.heartrate) : (frontmatter.heartrate_data || []),
+    pace_data: series ? toPoints(series.pace) : (frontmatter.pace_data || []),
+    elevation_data: series ? toPoints(series.elevation) : (frontmatter.elevation_data || [])
   }
   
   // 确保将splits数据正确解析并传递给RunDetail组件
@@ -49,9 +126,10 @@ const RunDetailTemplate = ({ data }) => {
       
       {/* 直接传递已解析的splits数据给RunDetail组件 */}
       <RunDetail 
-        runData={markdownRemark} 
+        runData={{ ...markdownRemark, frontmatter }} 
         segments={segmentData} 
         splits={splitsData} 
+        onZoomChange={sidecar && sidecar.tiers && sidecar.tiers.length > 1 ? setZoom : undefined}
       />
       
       {/* 移除Markdown内容的显示，因为RunDetail组件已经包含了所有数据 */}
@@ -75,6 +153,7 @@ export const pageQuery = graphql`
         avg_heartrate
         max_heartrate
         calories
+        sidecar
         splits {
           distance
           elapsed_time
@@ -95,8 +174,10 @@ export const pageQuery = graphql`
           pace
           average_heartrate
           max_heartrate
+          average_cadence
           start_date
           elevation_difference
+          elevation_gain
         }
         segments {
           name
@@ -0,0 +1,25 @@
+// 同步脚本生成的汇总数据（content/rollups.json）的读取工具
+
+// 格式化为汇总数据中按天分组的键（本地日期 yyyy-mm-dd）
+export const formatDateKey = (date) =>
+  `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, '0')}-${String(date.getDate()).padStart(2, '0')}`
+
+// 格式化为汇总数据中按月分组的键（yyyy-mm）
+export const formatMonthKey = (year, monthIndex) =>
+  `${year}-${String(monthIndex + 1).padStart(2, '0')}`
+
+// 汇总桶中每次跑步平均配速的平均值（分钟/公里），用于月度和年度统计，没有跑步时返回0
+export const bucketAveragePace = (bucket) =>
+  bucket && bucket.runs > 0 ? bucket.pace_sum / bucket.runs : 0
+
+// 汇总桶中每次跑步平均心率的平均值，用于月度和年度统计，没有跑步时返回0
+export const bucketAverageHeartrate = (bucket) =>
+  bucket && bucket.runs > 0 ? bucket.hr_sum / bucket.runs : 0
+
+// 汇总桶的距离加权平均配速（分钟/公里），用于每天的数据，没有跑步时返回0
+export const bucketWeightedPace = (bucket) =>
+  bucket && bucket.distance > 0 ? bucket.pace_weighted / bucket.distance : 0
+
+// 汇总桶的距离加权平均心率，只计算有心率数据的跑步，没有心率数据时返回0
+export const bucketWeightedHeartrate = (bucket) =>
+  bucket && bucket.hr_distance > 0 ? bucket.hr_weighted / bucket.hr_distance : 0
@@ -0,0 +1,84 @@
+// 流数据二进制格式（scripts/stream_codec.py）的解码工具
+//
+// 格式：4字节标识STRC、1字节格式版本，之后是zlib压缩的正文；
+// 正文依次为varint编码的文件头长度、JSON文件头和各通道的数据。
+// delta通道为整数化数值相邻差值的zigzag varint编码，float64通道为小端序的双精度浮点数，
+// json通道的数值直接保存在文件头中。
+
+const MAGIC = 'STRC'
+const FORMAT_VERSION = 1
+
+// 浏览器内置的DecompressionStream中，deflate即zlib格式
+const inflate = async (bytes) => {
+  const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'))
+  return new Uint8Array(await new Response(stream).arrayBuffer())
+}
+
+// 读取count个zigzag varint，返回 [数值列表, 结束位置]；
+// 数值可能超过32位，用乘法而不是位运算累加
+const readVarints = (bytes, offset, count) => {
+  const values = new Array(count)
+  let position = offset
+  for (let i = 0; i < count; i++) {
+    let value = 0
+    let scale = 1
+    let byte
+    do {
+      byte = bytes[position++]
+      value += (byte & 0x7f) * scale
+      scale *= 128
+    } while (byte & 0x80)
+    values[i] = value % 2 === 0 ? value / 2 : -(value + 1) / 2
+  }
+  return [values, position]
+}
+
+const decodeChannel = (info, bytes, offset) => {
+  if (info.encoding === 'json') return info.values
+  if (info.encoding === 'float64') {
+    const view = new DataView(bytes.buffer, bytes.byteOffset + offset, info.size)
+    return Array.from({ length: info.count }, (_, i) => view.getFloat64(i * 8, true))
+  }
+  if (info.encoding !== 'delta') throw new Error(`Unknown channel encoding: ${info.encoding}`)
+
+  const [deltas] = readVarints(bytes, offset, info.count)
+  const scale = 10 ** info.decimals
+  let total = 0
+  return deltas.map(delta => {
+    total += delta
+    return scale === 1 ? total : total / scale
+  })
+}
+
+// 解码二进制数据（ArrayBuffer），返回 { meta, channels: { 通道名称: 数值数组 } }
+export const decodeChannels = async (buffer) => {
+  const data = new Uint8Array(buffer)
+  const magic = String.fromCharCode(...data.subarray(0, MAGIC.length))
+  if (magic !== MAGIC) throw new Error('Not a stream codec file')
+  if (data[MAGIC.length] !== FORMAT_VERSION) {
+    throw new Error(`Unsupported stream codec version: ${data[MAGIC.length]}`)
+  }
+
+  const body = await inflate(data.subarray(MAGIC.length + 1))
+  const [[headerLength], headerStart] = readVarints(body, 0, 1)
+  const header = JSON.parse(new TextDecoder().decode(body.subarray(headerStart, headerStart + headerLength)))
+
+  const channels = {}
+  let offset = headerStart + headerLength
+  header.channels.forEach(info => {
+    channels[info.name] = decodeChannel(info, body, offset)
+    offset += info.size
+  })
+  return { meta: header.meta, channels }
+}
+
+// 把 "<序列>.x"、"<序列>.y" 通道还原为sidecar中按列存储的序列 { 序列: { x, y } }
+export const channelsToSeries = (channels) => {
+  const series = {}
+  Object.keys(channels).forEach(name => {
+    const [key, axis] = name.split('.')
+    series[key] = series[key] || {}
+    series[key][axis] = channels[name]
+  })
+  return series
+}
@@ -0,0 +1,31 @@
+// 用与tests/test_stream_codec.py相同的样例文件检查JS解码器：node --test tests/
+import assert from 'node:assert/strict'
+import { readFile } from 'node:fs/promises'
+import test from 'node:test'
+
+import { channelsToSeries, decodeChannels } from '../src/utils/streamCodec.js'
+
+const fixture = name => readFile(new URL(`./fixtures/${name}`, import.meta.url))
+
+test('decodes the shared fixture like the Python decoder', async () => {
+  const expected = JSON.parse(await fixture('stream_codec.json'))
+  const data = await fixture('stream_codec.strm')
+  const { meta, channels } = await decodeChannels(data.buffer.slice(data.byteOffset, data.byteOffset + data.byteLength))
+  assert.deepEqual(meta, expected.meta)
+  assert.deepEqual(channels, expected.channels)
+})
+
+test('rejects data that is not stream codec output', async () => {
+  await assert.rejects(decodeChannels(new TextEncoder().encode('{"time": []}').buffer))
+})
+
+test('rejects unsupported format versions', async () => {
+  const data = new Uint8Array(await fixture('stream_codec.strm'))
+  data[4] += 1
+  await assert.rejects(decodeChannels(data.buffer))
+})
+
+test('groups x and y channels into series', () => {
+  const series = channelsToSeries({ 'pace.x': [0, 0.5], 'pace.y': [6.5, 5.75], 'heartrate.x': [0], 'heartrate.y': [92] })
+  assert.deepEqual(series, { pace: { x: [0, 0.5], y: [6.5, 5.75] }, heartrate: { x: [0], y: [92] } })
+})
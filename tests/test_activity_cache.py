@@ -0,0 +1,45 @@
+import os
+import sys
+import tempfile
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'scripts'))
+
+from activity_cache import ActivityCache  # noqa: E402
+
+STREAMS = {'time': {'data': [0, 1, 2], 'series_type': 'distance', 'original_size': 3, 'resolution': 'high'}}
+
+
+class CorruptCacheTests(unittest.TestCase):
+    """截断或损坏的缓存文件应当作未命中，不能中断同步"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = ActivityCache(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def corrupt(self, kind, activity_id, keep):
+        path = self.cache._path(kind, activity_id)
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write(data[:keep])
+
+    def test_round_trip(self):
+        self.cache.put('streams', 1, STREAMS, start_date='2020-01-01T00:00:00Z')
+        self.assertEqual(self.cache.get('streams', 1), STREAMS)
+
+    def test_truncated_files_are_misses(self):
+        for kind in ActivityCache.KINDS:
+            for keep in (0, 4, 5, 12, -3):
+                with self.subTest(kind=kind, keep=keep):
+                    self.cache.put(kind, 1, STREAMS, start_date='2020-01-01T00:00:00Z')
+                    self.corrupt(kind, 1, keep)
+                    self.assertIsNone(self.cache.get(kind, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'scripts'))
+
+from activity_store import ActivityStore  # noqa: E402
+from process_laps_with_streams import _lap_bounds, process_laps, process_laps_with_streams  # noqa: E402
+
+START = datetime(2024, 5, 1, 6, 0, tzinfo=timezone.utc)
+
+
+def make_lap(start_index=None, end_index=None, offset=None, elapsed=None, **fields):
+    return SimpleNamespace(
+        name=fields.pop('name', 'Lap'),
+        start_index=start_index,
+        end_index=end_index,
+        start_date=START + timedelta(seconds=offset) if offset is not None else None,
+        start_date_local=START + timedelta(seconds=offset) if offset is not None else None,
+        elapsed_time=timedelta(seconds=elapsed or 0),
+        moving_time=timedelta(seconds=elapsed or 0),
+        distance=fields.pop('distance', 1000.0),
+        average_speed=fields.pop('average_speed', 3.0),
+        **fields
+    )
+
+
+def make_streams(times, original_size=None, **channels):
+    streams = {'time': SimpleNamespace(data=times, original_size=original_size)}
+    for name, data in channels.items():
+        streams[name] = SimpleNamespace(data=data)
+    return streams
+
+
+class LapBoundsTests(unittest.TestCase):
+
+    def test_index_path_uses_lap_indices(self):
+        times = list(range(100))
+        # 分圈的开始时间故意与下标不一致，结果只能来自start_index/end_index
+        lap = make_lap(start_index=10, end_index=19, offset=50, elapsed=9)
+        activity = SimpleNamespace(start_date=START)
+        self.assertEqual(_lap_bounds(lap, activity, times, True, 9.0), (10, 20))
+
+    def test_index_path_is_clipped_to_stream_length(self):
+        lap = make_lap(start_index=90, end_index=120, offset=90, elapsed=30)
+        self.assertEqual(_lap_bounds(lap, SimpleNamespace(start_date=START), list(range(100)), True, 30.0), (90, 100))
+
+    def test_index_path_falls_back_without_valid_indices(self):
+        times = list(range(100))
+        activity = SimpleNamespace(start_date=START)
+        for lap in (make_lap(offset=20, elapsed=10), make_lap(start_index=30, end_index=30, offset=20, elapsed=10)):
+            with self.subTest(start_index=lap.start_index):
+                self.assertEqual(_lap_bounds(lap, activity, times, True, 10.0), (20, 31))
+
+    def test_bisect_path_on_resampled_streams(self):
+        # 重采样后每5秒一个点，分圈的下标指向完整分辨率的数据，不能直接使用
+        times = list(range(0, 600, 5))
+        lap = make_lap(start_index=120, end_index=239, offset=120, elapsed=120)
+        activity = SimpleNamespace(start_date=START)
+        start, end = _lap_bounds(lap, activity, times, False, 120.0)
+        self.assertEqual((start, end), (24, 49))
+        self.assertEqual((times[start], times[end - 1]), (120, 240))
+
+    def test_bisect_path_between_samples(self):
+        times = [0, 4, 9, 15, 22, 30]
+        lap = make_lap(offset=5, elapsed=12)
+        self.assertEqual(_lap_bounds(lap, SimpleNamespace(start_date=START), times, False, 12.0), (2, 4))
+
+    def test_missing_start_dates(self):
+        lap = make_lap(elapsed=10)
+        self.assertEqual(_lap_bounds(lap, SimpleNamespace(start_date=START), list(range(50)), False, 10.0), (0, 0))
+        lap = make_lap(offset=0, elapsed=10)
+        self.assertEqual(_lap_bounds(lap, SimpleNamespace(start_date=None), list(range(50)), False, 10.0), (0, 0))
+
+
+class LapStreamStatsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.times = list(range(20))
+        self.heartrates = [100] * 10 + [150] * 10
+        self.altitudes = [10.0, 11.0, 10.5, 12.0, 12.0, 11.0, 13.0, 13.0, 13.0, 13.0] + [13.0] * 10
+
+    def test_full_resolution_laps(self):
+        laps = [
+            make_lap(start_index=0, end_index=9, offset=0, elapsed=9, total_elevation_gain=0),
+            make_lap(start_index=10, end_index=19, offset=10, elapsed=9, total_elevation_gain=7.5),
+        ]
+        activity = SimpleNamespace(id=1, start_date=START, laps=laps)
+        streams = make_streams(self.times, 20, heartrate=self.heartrates, altitude=self.altitudes)
+        first, second = process_laps_with_streams(activity, streams)
+        self.assertEqual(first['average_heartrate'], 100)
+        self.assertEqual(second['max_heartrate'], 150.0)
+        # elevation_difference只来自分圈数据，海拔流数据计算的爬升单独保存
+        self.assertEqual(first['elevation_difference'], 0.0)
+        self.assertEqual(first['elevation_gain'], 4.5)
+        self.assertEqual(second['elevation_difference'], 7.5)
+        self.assertEqual(second['elevation_gain'], 0)
+
+    def test_resampled_laps(self):
+        times = list(range(0, 20, 2))
+        laps = [make_lap(start_index=0, end_index=9, offset=0, elapsed=9),
+                make_lap(start_index=10, end_index=19, offset=10, elapsed=9)]
+        activity = SimpleNamespace(id=1, start_date=START, laps=laps)
+        streams = make_streams(times, 20, heartrate=self.heartrates[::2])
+        first, second = process_laps_with_streams(activity, streams)
+        self.assertEqual((first['average_heartrate'], second['average_heartrate']), (100, 150))
+
+    def test_no_altitude_stream(self):
+        activity = SimpleNamespace(id=1, start_date=START, laps=[
+            make_lap(start_index=0, end_index=19, offset=0, elapsed=19, total_elevation_gain=3.0)])
+        lap, = process_laps_with_streams(activity, make_streams(self.times, 20, heartrate=self.heartrates))
+        self.assertEqual(lap['elevation_difference'], 3.0)
+        self.assertIsNone(lap['elevation_gain'])
+
+    def test_keys_match_process_laps(self):
+        activity = SimpleNamespace(id=1, start_date=START, laps=[
+            make_lap(start_index=0, end_index=19, offset=0, elapsed=19, total_elevation_gain=3.0)])
+        with_streams, = process_laps_with_streams(activity, make_streams(self.times, 20, heartrate=self.heartrates))
+        without_streams, = process_laps(activity)
+        self.assertEqual(list(with_streams), list(without_streams))
+        self.assertIsNone(without_streams['elevation_gain'])
+
+
+class LapStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'activities.db')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def laps(self):
+        activity = SimpleNamespace(id=1, start_date=START, laps=[
+            make_lap(start_index=0, end_index=3, offset=0, elapsed=3, total_elevation_gain=0)])
+        streams = make_streams([0, 1, 2, 3], 4, altitude=[1.0, 2.0, 1.5, 3.0])
+        return process_laps_with_streams(activity, streams)
+
+    def test_round_trip(self):
+        laps = self.laps()
+        store = ActivityStore(self.path)
+        store.upsert_activity(SimpleNamespace(id=1, start_date=START), laps=laps)
+        self.assertEqual(store.load_activity(1).laps, laps)
+        store.close()
+
+    def test_migrates_old_lap_table(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute('CREATE TABLE laps (activity_id INTEGER NOT NULL, lap_number INTEGER NOT NULL, name TEXT, '
+                     'distance REAL, elapsed_time REAL, moving_time REAL, average_speed REAL, pace REAL, '
+                     'average_heartrate REAL, max_heartrate REAL, average_cadence REAL, start_date TEXT, '
+                     'elevation_difference REAL, PRIMARY KEY (activity_id, lap_number))')
+        conn.execute('PRAGMA user_version=2')
+        conn.commit()
+        conn.close()
+        laps = self.laps()
+        store = ActivityStore(self.path)
+        store.upsert_activity(SimpleNamespace(id=1, start_date=START), laps=laps)
+        self.assertEqual(store.load_activity(1).laps[0]['elevation_gain'], 2.5)
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
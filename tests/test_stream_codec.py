@@ -0,0 +1,282 @@
+import json
+import os
+import struct
+import sys
+import unittest
+import zlib
+from unittest import mock
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'scripts'))
+
+import stream_codec  # noqa: E402
+
+# 与src/utils/streamCodec.js共用的样例文件，两边的解码结果都要与stream_codec.json一致
+FIXTURE_STRM = os.path.join(TESTS_DIR, 'fixtures', 'stream_codec.strm')
+FIXTURE_JSON = os.path.join(TESTS_DIR, 'fixtures', 'stream_codec.json')
+
+
+def load_fixture():
+    with open(FIXTURE_JSON, encoding='utf-8') as f:
+        expected = json.load(f)
+    with open(FIXTURE_STRM, 'rb') as f:
+        data = f.read()
+    return expected, data
+
+
+def pure_python():
+    """临时禁用NumPy，使用纯Python的编码和解码"""
+    return mock.patch.object(stream_codec, 'np', None)
+
+
+def decompress_body(data):
+    return zlib.decompress(data[len(stream_codec.MAGIC) + 1:])
+
+
+def channel_infos(data):
+    """读取编码结果中的通道描述"""
+    body = decompress_body(data)
+    length = 0
+    shift = 0
+    offset = 0
+    while True:
+        byte = body[offset]
+        offset += 1
+        length |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            break
+        shift += 7
+    length = stream_codec._unzigzag(length)
+    header = json.loads(body[offset:offset + length].decode('utf-8'))
+    return {info['name']: info for info in header['channels']}
+
+
+class RoundTripTests(unittest.TestCase):
+    """编码后解码应得到与原始数据完全相同的数值和类型"""
+
+    def assert_round_trip(self, channels, meta=None):
+        for use_numpy in (True, False):
+            with self.subTest(numpy=use_numpy):
+                if use_numpy:
+                    data = stream_codec.encode_channels(channels, meta)
+                    decoded_meta, decoded = stream_codec.decode_channels(data)
+                else:
+                    with pure_python():
+                        data = stream_codec.encode_channels(channels, meta)
+                        decoded_meta, decoded = stream_codec.decode_channels(data)
+                self.assertEqual(decoded_meta, meta)
+                self.assertEqual(decoded, channels)
+                for name, values in channels.items():
+                    self.assertEqual([type(v) for v in decoded[name]], [type(v) for v in values], name)
+        return channel_infos(data)
+
+    def test_int_channel(self):
+        infos = self.assert_round_trip({'heartrate': [92, 95, 101, 99, 140]})
+        self.assertEqual(infos['heartrate']['encoding'], 'delta')
+        self.assertFalse(infos['heartrate']['float'])
+
+    def test_float_channel_is_quantized(self):
+        infos = self.assert_round_trip({
+            'distance': [0.0, 2.9, 6.1, 14.8],
+            'velocity_smooth': [0.0, 2.933, 3.101, 2.9],
+            'watts': [100.0, 120.0, 95.0],
+        })
+        self.assertEqual(infos['distance']['encoding'], 'delta')
+        self.assertEqual(infos['distance']['decimals'], 1)
+        self.assertEqual(infos['velocity_smooth']['decimals'], 3)
+        self.assertEqual(infos['watts']['decimals'], 0)
+        self.assertTrue(infos['watts']['float'])
+
+    def test_float64_fallback(self):
+        infos = self.assert_round_trip({'ratio': [0.1 + 0.2, 1.23456789123, 1e-9]})
+        self.assertEqual(infos['ratio']['encoding'], 'float64')
+
+    def test_json_channels(self):
+        infos = self.assert_round_trip({
+            'moving': [False, True, True],
+            'latlng': [[31.2304, 121.4737], [31.2305, 121.4738]],
+            'mixed': [1, True, 2],
+            'missing': [1.5, None, 2.5],
+        })
+        for name in ('moving', 'latlng', 'mixed', 'missing'):
+            self.assertEqual(infos[name]['encoding'], 'json', name)
+
+    def test_non_finite_floats_use_json(self):
+        data = stream_codec.encode_channels({'grade': [1.0, float('inf')]})
+        self.assertEqual(channel_infos(data)['grade']['encoding'], 'json')
+
+    def test_empty_channel(self):
+        infos = self.assert_round_trip({'empty': [], 'time': [0, 1]})
+        self.assertEqual(infos['empty']['count'], 0)
+
+    def test_negative_and_large_deltas(self):
+        self.assert_round_trip({
+            'altitude': [12.4, 12.2, -3.5, -3.6, 0.0, 8.0],
+            'offset': [0, -(1 << 45), 1 << 45, -1, 1, -300],
+            'boundary': [0, 63, 64, -64, -65, 8191, 8192, -(2 ** 53 - 1), 2 ** 53 - 1],
+        })
+
+    def test_iterables_are_accepted(self):
+        _, decoded = stream_codec.decode_channels(stream_codec.encode_channels({'time': range(5)}))
+        self.assertEqual(decoded['time'], [0, 1, 2, 3, 4])
+
+    def test_streams_round_trip(self):
+        raw_streams = {
+            'time': {'data': [0, 1, 2], 'series_type': 'distance', 'original_size': 3, 'resolution': 'high'},
+            'distance': {'data': [0.0, 2.9, 6.1], 'series_type': 'distance', 'original_size': 3, 'resolution': 'high'},
+            'latlng': {'data': [[31.2, 121.4], [31.3, 121.5], [31.4, 121.6]]},
+        }
+        meta, decoded = stream_codec.decode_streams(stream_codec.encode_streams(raw_streams, {'activity_id': 1}))
+        self.assertEqual(meta, {'activity_id': 1})
+        self.assertEqual(decoded, raw_streams)
+
+    def test_stream_list_is_keyed_by_type(self):
+        streams = [{'type': 'time', 'data': [0, 1]}, {'type': 'heartrate', 'data': [90, 91]}]
+        _, decoded = stream_codec.decode_streams(stream_codec.encode_streams(streams))
+        self.assertEqual(decoded, {'time': {'data': [0, 1]}, 'heartrate': {'data': [90, 91]}})
+
+    def test_chart_data_round_trip(self):
+        stream_data = {
+            'heartrate': [{'x': 0.0, 'y': 92}, {'x': 0.5, 'y': 95}],
+            'pace': [{'x': 0.0, 'y': 6.5}, {'x': 0.5, 'y': 5.75}],
+            'cadence': [],
+        }
+        data = stream_codec.encode_chart_data(stream_data)
+        self.assertEqual(stream_codec.decode_chart_data(data), stream_data)
+
+
+class EncoderParityTests(unittest.TestCase):
+    """NumPy和纯Python的实现必须生成相同的字节，并能互相解码"""
+
+    def setUp(self):
+        if stream_codec.np is None:
+            self.skipTest('没有安装NumPy')
+        self.expected, _ = load_fixture()
+
+    def test_same_bytes(self):
+        channels = self.expected['channels']
+        meta = self.expected['meta']
+        with_numpy = stream_codec.encode_channels(channels, meta)
+        with pure_python():
+            without_numpy = stream_codec.encode_channels(channels, meta)
+        self.assertEqual(with_numpy, without_numpy)
+
+    def test_cross_decoding(self):
+        channels = self.expected['channels']
+        with_numpy = stream_codec.encode_channels(channels)
+        with pure_python():
+            without_numpy = stream_codec.encode_channels(channels)
+            self.assertEqual(stream_codec.decode_channels(with_numpy)[1], channels)
+        self.assertEqual(stream_codec.decode_channels(without_numpy)[1], channels)
+
+    def test_varints(self):
+        values = [0, 1, -1, 63, -64, 64, 127, 128, -(1 << 40), (1 << 62) - 1, -(1 << 62)]
+        encoded = stream_codec._encode_varints_numpy(values)
+        self.assertEqual(encoded, stream_codec._encode_varints_python(values))
+        self.assertEqual(stream_codec._decode_varints_numpy(encoded, len(values)).tolist(), values)
+        self.assertEqual(stream_codec._decode_varints_python(encoded, len(values)), values)
+
+
+class FixtureTests(unittest.TestCase):
+    """样例文件固定了二进制格式，格式变化时需要同时更新JS解码器和FORMAT_VERSION"""
+
+    def setUp(self):
+        self.expected, self.data = load_fixture()
+
+    def test_fixture_covers_every_encoding(self):
+        encodings = {info['encoding'] for info in channel_infos(self.data).values()}
+        self.assertEqual(encodings, {'delta', 'float64', 'json'})
+
+    def test_decode_fixture(self):
+        for use_numpy in (True, False):
+            with self.subTest(numpy=use_numpy):
+                if use_numpy:
+                    meta, channels = stream_codec.decode_channels(self.data)
+                else:
+                    with pure_python():
+                        meta, channels = stream_codec.decode_channels(self.data)
+                self.assertEqual(meta, self.expected['meta'])
+                self.assertEqual(channels, self.expected['channels'])
+
+    def test_encoder_reproduces_fixture(self):
+        data = stream_codec.encode_channels(self.expected['channels'], self.expected['meta'])
+        self.assertEqual(data, self.data)
+
+
+class ErrorTests(unittest.TestCase):
+
+    def test_rejects_other_data(self):
+        self.assertFalse(stream_codec.is_encoded(b'{"time": []}'))
+        with self.assertRaises(ValueError):
+            stream_codec.decode_channels(b'{"time": []}')
+
+    def test_rejects_unknown_version(self):
+        data = bytearray(stream_codec.encode_channels({'time': [0]}))
+        data[len(stream_codec.MAGIC)] = stream_codec.FORMAT_VERSION + 1
+        with self.assertRaises(ValueError):
+            stream_codec.decode_channels(bytes(data))
+
+    def test_rejects_truncated_channel(self):
+        for decode in (stream_codec._decode_varints_python, stream_codec._decode_varints_numpy):
+            if decode is stream_codec._decode_varints_numpy and stream_codec.np is None:
+                continue
+            with self.subTest(decode=decode.__name__):
+                with self.assertRaises(ValueError):
+                    decode(stream_codec._encode_varints_python([1, 2, 3]), 4)
+
+    def assert_corrupt(self, data):
+        for use_numpy in (True, False):
+            with self.subTest(numpy=use_numpy):
+                if use_numpy:
+                    if stream_codec.np is None:
+                        continue
+                    with self.assertRaises(ValueError):
+                        stream_codec.decode_channels(data)
+                else:
+                    with pure_python(), self.assertRaises(ValueError):
+                        stream_codec.decode_channels(data)
+
+    def test_rejects_truncated_files(self):
+        data = stream_codec.encode_channels({'time': list(range(100)), 'ratio': [0.1 + 0.2] * 10})
+        prefix = stream_codec.MAGIC + bytes([stream_codec.FORMAT_VERSION])
+        for length in (len(stream_codec.MAGIC), len(prefix), len(prefix) + 5, len(data) - 5):
+            with self.subTest(length=length):
+                self.assert_corrupt(data[:length])
+
+    def test_rejects_truncated_body(self):
+        data = stream_codec.encode_channels({'time': list(range(100)), 'ratio': [0.1 + 0.2] * 10})
+        body = decompress_body(data)
+        prefix = stream_codec.MAGIC + bytes([stream_codec.FORMAT_VERSION])
+        # 空正文、只有文件头长度、文件头不完整、通道数据不完整
+        for length in (0, 1, 10, len(body) - 1, len(body) - 8 * 10 - 1):
+            with self.subTest(length=length):
+                self.assert_corrupt(prefix + zlib.compress(body[:length]))
+
+    def test_rejects_malformed_header(self):
+        prefix = stream_codec.MAGIC + bytes([stream_codec.FORMAT_VERSION])
+
+        def encode(header, payload=b''):
+            text = json.dumps(header).encode('utf-8')
+            return prefix + zlib.compress(stream_codec._encode_varints_python([len(text)]) + text + payload)
+
+        channel = {'name': 'time', 'encoding': 'delta', 'count': 1, 'decimals': 0, 'float': False, 'size': 1}
+        for header in ([], {'meta': None}, {'channels': []}, {'meta': None, 'channels': [{'name': 'time'}]},
+                       {'meta': None, 'channels': [{k: v for k, v in channel.items() if k != 'name'}]},
+                       {'meta': None, 'channels': [{**channel, 'size': -1}]},
+                       {'meta': None, 'channels': [{**channel, 'encoding': 'float64', 'count': 2}]}):
+            with self.subTest(header=header):
+                self.assert_corrupt(encode(header, b'\x02'))
+        # 文件头长度为负数
+        self.assert_corrupt(prefix + zlib.compress(stream_codec._encode_varints_python([-1])))
+
+    def test_decode_streams_requires_meta(self):
+        with self.assertRaises(ValueError):
+            stream_codec.decode_streams(stream_codec.encode_channels({'time': [0]}))
+
+    def test_float64_payload_is_little_endian(self):
+        data = stream_codec.encode_channels({'ratio': [0.1 + 0.2]})
+        self.assertIn(struct.pack('<d', 0.1 + 0.2), decompress_body(data))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+import math
+import os
+import random
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'scripts'))
+
+import stream_processing  # noqa: E402
+
+
+def pure_python():
+    """临时禁用NumPy，使用纯Python的LTTB实现"""
+    return mock.patch.object(stream_processing, 'np', None)
+
+
+def make_series(n, seed=0):
+    """生成带噪声和尖峰的序列，时间间隔不均匀"""
+    rng = random.Random(seed)
+    x = []
+    y = []
+    t = 0
+    for i in range(n):
+        t += rng.choice((1, 1, 1, 2, 5))
+        x.append(t)
+        y.append(140 + 20 * math.sin(i / 50) + rng.gauss(0, 3) + (40 if rng.random() < 0.01 else 0))
+    return x, y
+
+
+def make_streams(n, seed=0):
+    rng = random.Random(seed)
+    x, y = make_series(n, seed)
+    return {
+        'time': SimpleNamespace(data=x),
+        'heartrate': SimpleNamespace(data=[int(v) for v in y]),
+        'velocity_smooth': SimpleNamespace(data=[0.0 if rng.random() < 0.05 else round(2.5 + rng.random(), 3)
+                                                 for _ in range(n)]),
+        'altitude': SimpleNamespace(data=[round(50 + 10 * math.sin(i / 500), 1) for i in range(n)]),
+    }
+
+
+class LttbParityTests(unittest.TestCase):
+    """NumPy和纯Python的LTTB必须选出相同的下标"""
+
+    def setUp(self):
+        if stream_processing.np is None:
+            self.skipTest('没有安装NumPy')
+
+    def test_same_indices(self):
+        for n, budget, seed in ((10, 3, 0), (10, 9, 1), (101, 10, 2), (1000, 200, 3), (5000, 200, 4),
+                                (15846, 200, 5), (15846, 2000, 6), (7, 5, 7)):
+            with self.subTest(n=n, budget=budget):
+                x, y = make_series(n, seed)
+                indices = stream_processing.lttb_indices(x, y, budget)
+                with pure_python():
+                    self.assertEqual(stream_processing.lttb_indices(x, y, budget), indices)
+                self.assertIsInstance(indices, list)
+                self.assertEqual(len(indices), budget)
+
+    def test_same_indices_on_flat_series(self):
+        # 面积全部相等时两个实现都应选每个桶中的第一个点
+        x = list(range(100))
+        y = [5.0] * 100
+        indices = stream_processing.lttb_indices(x, y, 10)
+        with pure_python():
+            self.assertEqual(stream_processing.lttb_indices(x, y, 10), indices)
+
+    def test_same_chart_data(self):
+        streams = make_streams(3000)
+        result = stream_processing.process_stream_data_lttb(streams, 200)
+        with pure_python():
+            self.assertEqual(stream_processing.process_stream_data_lttb(streams, 200), result)
+
+
+class LttbEdgeTests(unittest.TestCase):
+
+    def check(self, func):
+        """在NumPy和纯Python实现上分别运行同一个检查"""
+        func()
+        with pure_python():
+            func()
+
+    def test_budget_not_below_length_keeps_every_point(self):
+        x, y = make_series(50)
+
+        def check():
+            self.assertEqual(stream_processing.lttb_indices(x, y, 50), list(range(50)))
+            self.assertEqual(stream_processing.lttb_indices(x, y, 1000), list(range(50)))
+        self.check(check)
+
+    def test_small_budgets(self):
+        x, y = make_series(50)
+
+        def check():
+            self.assertEqual(stream_processing.lttb_indices(x, y, 0), [])
+            self.assertEqual(stream_processing.lttb_indices(x, y, 1), [0])
+            self.assertEqual(stream_processing.lttb_indices(x, y, 2), [0, 49])
+        self.check(check)
+
+    def test_empty_series(self):
+        self.check(lambda: self.assertEqual(stream_processing.lttb_indices([], [], 200), []))
+
+    def test_endpoints_kept_and_indices_increase(self):
+        x, y = make_series(2000)
+        # 最大值在第一个点、最小值在最后一个点时端点也必须保留
+        y[0] = 1000
+        y[-1] = -1000
+
+        def check():
+            for budget in (3, 4, 17, 200, 1999):
+                indices = stream_processing.lttb_indices(x, y, budget)
+                self.assertEqual(indices[0], 0)
+                self.assertEqual(indices[-1], len(x) - 1)
+                self.assertEqual(len(indices), budget)
+                self.assertTrue(all(a < b for a, b in zip(indices, indices[1:])), budget)
+        self.check(check)
+
+    def test_keeps_spike(self):
+        x = list(range(1000))
+        y = [0.0] * 1000
+        y[537] = 100.0
+        self.check(lambda: self.assertIn(537, stream_processing.lttb_indices(x, y, 20)))
+
+    def test_short_activity_is_not_downsampled(self):
+        streams = make_streams(150)
+        result = stream_processing.process_stream_data_lttb(streams, 200)
+        self.assertEqual([point['x'] for point in result['heartrate_data']], streams['time'].data)
+        self.assertEqual([point['y'] for point in result['elevation_data']], streams['altitude'].data)
+
+    def test_pace_skips_stopped_points(self):
+        streams = make_streams(1000)
+        result = stream_processing.process_stream_data_lttb(streams, 100)
+        stopped = {t for t, v in zip(streams['time'].data, streams['velocity_smooth'].data) if v <= 0}
+        self.assertTrue(stopped)
+        self.assertFalse(stopped & {point['x'] for point in result['pace_data']})
+        self.assertLessEqual(len(result['pace_data']), 100)
+
+
+class MaxPointsOptionTests(unittest.TestCase):
+    """--max-points 0 表示不做LTTB，沿用每10个点取一个的参考实现"""
+
+    def setUp(self):
+        import fetch_strava_data
+        self.fetch_strava_data = fetch_strava_data
+        self.streams = make_streams(3000)
+
+    def process(self, max_points):
+        args = SimpleNamespace(no_segments=True, no_streams=False, no_splits=True, no_laps=True,
+                               max_points=max_points, stream_output='frontmatter', stream_tiers=())
+        activity = SimpleNamespace(id=1)
+        return self.fetch_strava_data.process_activity_data(activity, None, self.streams, args)
+
+    def test_zero_uses_fixed_step(self):
+        record = self.process(0)
+        self.assertEqual(record.stream_data, stream_processing.process_stream_data(self.streams))
+        self.assertEqual(len(record.stream_data['heartrate_data']), 300)
+
+    def test_budget_uses_lttb(self):
+        record = self.process(200)
+        self.assertEqual(record.stream_data, stream_processing.process_stream_data_lttb(self.streams, 200))
+
+    def test_parser_accepts_zero(self):
+        import argparse
+        parser = argparse.ArgumentParser()
+        self.fetch_strava_data.add_processing_arguments(parser)
+        self.assertEqual(parser.parse_args(['--max-points', '0']).max_points, 0)
+        self.assertEqual(parser.parse_args([]).max_points, stream_processing.DEFAULT_MAX_POINTS)
+
+
+if __name__ == '__main__':
+    unittest.main()
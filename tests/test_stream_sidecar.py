@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+import unittest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'scripts'))
+
+from stream_sidecar import build_sidecar, remove_sidecar_files, write_sidecar  # noqa: E402
+
+STREAM_DATA = {'heartrate_data': [{'x': 0, 'y': 90}, {'x': 10, 'y': 95}]}
+TIER_DATA = {'heartrate_data': [{'x': t, 'y': 90 + t % 7} for t in range(20)]}
+
+
+def sidecar(activity_id, *tiers):
+    return build_sidecar(STREAM_DATA, stream_tiers=[(name, 20, TIER_DATA) for name in tiers], activity_id=activity_id)
+
+
+class PruneTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = os.path.join(self.tmp.name, 'streams')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def files(self):
+        return sorted(os.listdir(self.dir))
+
+    def test_stale_tiers_are_removed(self):
+        write_sidecar(self.dir, 1, sidecar(1, 'detail', 'full'))
+        write_sidecar(self.dir, 12, sidecar(12, 'detail', 'full'))
+        self.assertEqual(self.files(), ['1.detail.strm', '1.full.strm', '1.json',
+                                        '12.detail.strm', '12.full.strm', '12.json'])
+        write_sidecar(self.dir, 1, sidecar(1, 'detail'))
+        # 只删除同一活动不再生成的层级，其他活动（包括ID前缀相同的）不受影响
+        self.assertEqual(self.files(), ['1.detail.strm', '1.json', '12.detail.strm', '12.full.strm', '12.json'])
+        write_sidecar(self.dir, 1, sidecar(1))
+        self.assertEqual(self.files(), ['1.json', '12.detail.strm', '12.full.strm', '12.json'])
+
+    def test_remove_all_files_of_an_activity(self):
+        write_sidecar(self.dir, 1, sidecar(1, 'detail'))
+        write_sidecar(self.dir, 2, sidecar(2, 'detail'))
+        self.assertEqual(remove_sidecar_files(self.dir, 1), 2)
+        self.assertEqual(self.files(), ['2.detail.strm', '2.json'])
+
+    def test_missing_directory(self):
+        self.assertEqual(remove_sidecar_files(self.dir, 1), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()